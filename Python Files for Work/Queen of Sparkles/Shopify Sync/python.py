@@ -1,24 +1,18 @@
-import os
-import requests
 from dotenv import load_dotenv
 
-load_dotenv()
+from shared_client import shopify_from_env
 
-SHOPIFY_DOMAIN = os.getenv("SHOPIFY_STORE_DOMAIN")  # shop-queen-of-sparkles.myshopify.com
-SHOPIFY_ACCESS_TOKEN = os.getenv("SHOPIFY_ACCESS_TOKEN")
+load_dotenv()
 
-def get_locations():
-    url = f"https://{SHOPIFY_DOMAIN}/admin/api/2023-07/locations.json"
-    headers = {
-        "X-Shopify-Access-Token": SHOPIFY_ACCESS_TOKEN,
-        "Content-Type": "application/json"
-    }
-    response = requests.get(url, headers=headers)
-    response.raise_for_status()
-    locations = response.json().get("locations", [])
+def get_locations(shopify):
+    locations = shopify.get_json("locations.json").get("locations", [])
     
     for loc in locations:
         print(f"Name: {loc['name']} | ID: {loc['id']}")
     
+def main():
+    # Reads SHOPIFY_STORE_DOMAIN (shop-queen-of-sparkles.myshopify.com) and SHOPIFY_ACCESS_TOKEN
+    get_locations(shopify_from_env())
+
 if __name__ == "__main__":
-    get_locations()
+    main()
@@ -1,24 +1,29 @@
 import os
-import requests
+from functools import lru_cache
 from dotenv import load_dotenv
 from supabase import create_client
 from flask import Flask, request, render_template_string
 from threading import Thread
 
+from shared_client import shopify_from_env
+
 # Load .env credentials
 load_dotenv()
 
 # === Credentials ===
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
-SHOPIFY_DOMAIN = os.getenv("SHOPIFY_STORE_DOMAIN")
-SHOPIFY_ACCESS_TOKEN = os.getenv("SHOPIFY_ACCESS_TOKEN")
 SHOPIFY_LOCATION_ID = int(os.getenv("SHOPIFY_LOCATION_ID"))
 
 # === Setup Supabase + Flask ===
 supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
 app = Flask(__name__)
 
+@lru_cache(maxsize=None)
+def get_shopify():
+    """The Shopify client, built on first use (SHOPIFY_STORE_DOMAIN / SHOPIFY_ACCESS_TOKEN)."""
+    return shopify_from_env()
+
 # === Shared HTML Template ===
 BASE_TEMPLATE = """
 <!DOCTYPE html>
@@ -97,17 +102,12 @@ def render_page(title, content):
 
 # === Shopify Inventory Sync ===
 def update_shopify_inventory(inventory_item_id, location_id, new_quantity):
-    url = f"https://{SHOPIFY_DOMAIN}/admin/api/2023-07/inventory_levels/set.json"
-    headers = {
-        "X-Shopify-Access-Token": SHOPIFY_ACCESS_TOKEN,
-        "Content-Type": "application/json"
-    }
     payload = {
         "location_id": location_id,
         "inventory_item_id": inventory_item_id,
         "available": new_quantity
     }
-    response = requests.post(url, json=payload, headers=headers)
+    response = get_shopify().post("inventory_levels/set.json", json=payload)
     if response.status_code != 200:
         print(f"[SHOPIFY ERROR] {response.status_code}: {response.text}")
     return response.status_code == 200
@@ -0,0 +1,26 @@
+import os
+import sys
+from pathlib import Path
+
+# The one Shopify client in this repo lives with the Analytics App
+# (shopify_client.py: pooled session, retry with backoff, CallLimitBucket and
+# ClientMetrics). This module puts that folder on the import path so the
+# scripts here use the same code. Set ANALYTICS_APP_DIR if the folders move.
+
+ANALYTICS_APP_DIR = Path(
+    os.getenv("ANALYTICS_APP_DIR")
+    or Path(__file__).resolve().parents[3] / "Queens of Sparkles" / "App Development" / "Analytics App"
+)
+
+if not (ANALYTICS_APP_DIR / "shopify_client.py").exists():
+    raise ImportError(f"shopify_client.py not found in {ANALYTICS_APP_DIR}; set ANALYTICS_APP_DIR to the Analytics App folder")
+if str(ANALYTICS_APP_DIR) not in sys.path:
+    # Appended, so this folder's own modules (shopify_sync.py) still win over the app's.
+    sys.path.append(str(ANALYTICS_APP_DIR))
+
+from shopify_client import ShopifyClient  # noqa: E402
+
+
+def shopify_from_env():
+    """Client for SHOPIFY_STORE_DOMAIN (or SHOP_DOMAIN), SHOPIFY_ACCESS_TOKEN and the optional API_VERSION."""
+    return ShopifyClient.from_env(domain_vars=("SHOPIFY_STORE_DOMAIN", "SHOP_DOMAIN"))
@@ -1,34 +1,24 @@
 import os
-import requests
 from dotenv import load_dotenv
 from supabase import create_client
 
+from shared_client import shopify_from_env
+
 # Load credentials from .env
 load_dotenv()
 
-# === Shopify Credentials ===
-SHOPIFY_DOMAIN = os.getenv("SHOPIFY_STORE_DOMAIN")
-SHOPIFY_ACCESS_TOKEN = os.getenv("SHOPIFY_ACCESS_TOKEN")
-
 # === Supabase Credentials ===
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
 supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
 
 # === Pull Products from Shopify ===
-def get_all_products():
-    url = f"https://{SHOPIFY_DOMAIN}/admin/api/2023-07/products.json?limit=50"
-    headers = {
-        "X-Shopify-Access-Token": SHOPIFY_ACCESS_TOKEN,
-        "Content-Type": "application/json"
-    }
-    response = requests.get(url, headers=headers)
-    response.raise_for_status()
-    return response.json().get("products", [])
+def get_all_products(shopify):
+    return shopify.get_json("products.json", params={"limit": 50}).get("products", [])
 
 # === Push to Supabase ===
-def sync_products_to_supabase():
-    products = get_all_products()
+def sync_products_to_supabase(shopify):
+    products = get_all_products(shopify)
     for product in products:
         title = product.get("title", "")
         for variant in product.get("variants", []):
@@ -50,5 +40,9 @@ def sync_products_to_supabase():
 
             supabase.table("inventory").insert(data).execute()
 
+def main():
+    # === Shopify Client (SHOPIFY_STORE_DOMAIN / SHOPIFY_ACCESS_TOKEN) ===
+    sync_products_to_supabase(shopify_from_env())
+
 if __name__ == "__main__":
-    sync_products_to_supabase()
+    main()
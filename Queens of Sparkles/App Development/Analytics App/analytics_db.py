@@ -0,0 +1,264 @@
+from __future__ import annotations
+
+import os
+import sqlite3
+import tempfile
+import threading
+from contextlib import closing
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Iterable, Iterator, Sequence
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from export_io import FILE_MODE
+from marts_io import (
+    MART_NAMES,
+    MART_SCHEMAS,
+    PARTITION_COLUMNS,
+    PARTITIONED_MARTS,
+    UNDATED_PARTITION,
+    mart_files,
+    partition_path,
+)
+
+# SQLite copy of the marts the dashboard queries, so date/vendor filters run
+# in SQL against indexes instead of over the whole history in pandas.
+DB_FILE_NAME = "analytics.sqlite"
+# Bump when the table layout below changes; an older database is then rebuilt.
+DB_VERSION = 2
+INDEXES: dict[str, list[tuple[str, ...]]] = {
+    "fact_order_lines": [("created_at",), ("variant_id", "created_at"), ("order_id",)],
+    "dim_products": [("vendor", "variant_id"), ("variant_id",)],
+    "daily_sales": [("order_date",)],
+    "rollup_daily": [("order_date",), ("vendor", "order_date")],
+    "rollup_weekly": [("week_start",), ("vendor", "week_start")],
+    "rollup_monthly": [("month_start",), ("vendor", "month_start")],
+}
+ROLLUP_COLUMNS = "variant_id, vendor, financial_status, product_name, revenue, units_sold, lines, orders"
+INSERT_BATCH_ROWS = 50_000
+
+
+def db_path(marts_dir: Path) -> Path:
+    return marts_dir / DB_FILE_NAME
+
+
+def _sql_type(arrow_type: pa.DataType) -> str:
+    if pa.types.is_integer(arrow_type) or pa.types.is_timestamp(arrow_type):
+        return "INTEGER"
+    if pa.types.is_floating(arrow_type):
+        return "REAL"
+    return "TEXT"
+
+
+def _micros(moment: date) -> int:
+    if not isinstance(moment, datetime):
+        moment = datetime(moment.year, moment.month, moment.day, tzinfo=timezone.utc)
+    return int(moment.timestamp()) * 1_000_000
+
+
+def _rows(batch: pa.RecordBatch) -> Iterator[tuple[Any, ...]]:
+    # Timestamps become INTEGER microseconds since the epoch (UTC), dates ISO text.
+    columns = []
+    for field, column in zip(batch.schema, batch.columns):
+        if pa.types.is_timestamp(field.type):
+            column = column.cast(pa.int64())
+        elif pa.types.is_date(field.type) or pa.types.is_dictionary(field.type):
+            column = column.cast(pa.string())
+        columns.append(column.to_pylist())
+    return zip(*columns)
+
+
+def _insert_files(connection: sqlite3.Connection, name: str, files: Iterable[Path]) -> None:
+    placeholders = ", ".join("?" for _ in MART_SCHEMAS[name])
+    statement = f"INSERT INTO {name} VALUES ({placeholders})"
+    for file in files:
+        for batch in pq.ParquetFile(file).iter_batches(batch_size=INSERT_BATCH_ROWS):
+            connection.executemany(statement, _rows(batch))
+
+
+def _create_tables(connection: sqlite3.Connection) -> None:
+    for name in MART_NAMES:
+        columns = ", ".join(f"{field.name} {_sql_type(field.type)}" for field in MART_SCHEMAS[name])
+        connection.execute(f"CREATE TABLE {name} ({columns})")
+
+
+def _create_indexes(connection: sqlite3.Connection) -> None:
+    for name, indexes in INDEXES.items():
+        for columns in indexes:
+            connection.execute(f"CREATE INDEX idx_{name}_{'_'.join(columns)} ON {name} ({', '.join(columns)})")
+    connection.execute("ANALYZE")
+
+
+def _is_current(path: Path) -> bool:
+    if not path.exists():
+        return False
+    with closing(sqlite3.connect(path)) as connection:
+        return connection.execute("PRAGMA user_version").fetchone()[0] == DB_VERSION
+
+
+def _replace_partition(connection: sqlite3.Connection, marts_dir: Path, partition: str) -> None:
+    if partition == UNDATED_PARTITION:
+        # Only order lines can lack a date.
+        connection.execute("DELETE FROM fact_order_lines WHERE created_at IS NULL")
+    else:
+        start = datetime.strptime(partition, "%Y-%m").replace(tzinfo=timezone.utc)
+        end = (start + timedelta(days=32)).replace(day=1)
+        for name, column in PARTITION_COLUMNS.items():
+            if name == "fact_order_lines":
+                bounds: tuple[Any, Any] = (_micros(start), _micros(end))
+            else:
+                bounds = (start.date().isoformat(), end.date().isoformat())
+            connection.execute(f"DELETE FROM {name} WHERE {column} >= ? AND {column} < ?", bounds)
+    for name in PARTITIONED_MARTS:
+        path = partition_path(marts_dir, name, partition)
+        _insert_files(connection, name, [path] if path.exists() else [])
+
+
+def publish_marts(marts_dir: Path, partitions: Sequence[str] | None = None) -> Path:
+    """Load the Parquet marts into `marts/analytics.sqlite` for the dashboard.
+
+    With `partitions`, an existing database only has those order months (and
+    the small dimension tables) replaced, in one transaction. Otherwise the
+    database is rebuilt in a temp file and renamed into place, with the indexes
+    created after the bulk load.
+    """
+    path = db_path(marts_dir)
+    if partitions is not None and _is_current(path):
+        with closing(sqlite3.connect(path)) as connection, connection:
+            for partition in partitions:
+                _replace_partition(connection, marts_dir, partition)
+            for name in MART_NAMES:
+                if name not in PARTITIONED_MARTS:
+                    connection.execute(f"DELETE FROM {name}")
+                    _insert_files(connection, name, mart_files(marts_dir, name))
+        return path
+
+    fd, temp_name = tempfile.mkstemp(prefix=f".{path.name}.", suffix=".tmp", dir=marts_dir)
+    os.close(fd)
+    # Not mkstemp's 0600, which the rename would keep.
+    os.chmod(temp_name, FILE_MODE)
+    temp_path = Path(temp_name)
+    try:
+        with closing(sqlite3.connect(temp_path)) as connection:
+            connection.execute("PRAGMA journal_mode = OFF")
+            connection.execute("PRAGMA synchronous = OFF")
+            with connection:
+                _create_tables(connection)
+                for name in MART_NAMES:
+                    _insert_files(connection, name, mart_files(marts_dir, name))
+                _create_indexes(connection)
+            connection.execute(f"PRAGMA user_version = {DB_VERSION}")
+        os.replace(temp_path, path)
+    except BaseException:
+        temp_path.unlink(missing_ok=True)
+        raise
+    return path
+
+
+def connect(marts_dir: Path) -> sqlite3.Connection:
+    """Read-only connection to the analytics database (shareable across Streamlit threads)."""
+    return sqlite3.connect(f"{db_path(marts_dir).as_uri()}?mode=ro", uri=True, check_same_thread=False)
+
+
+class DatabaseReader:
+    """One shared read-only connection, reopened when the database's version (its mtime) changes.
+
+    The previous connection is closed then, so a full rebuild's replaced file
+    is not kept open. Queries hold a lock, so a connection is never closed
+    under a running query.
+    """
+
+    def __init__(self, marts_dir: Path) -> None:
+        self.marts_dir = marts_dir
+        self.version: int | None = None
+        self._connection: sqlite3.Connection | None = None
+        self._lock = threading.Lock()
+
+    def query(self, sql: str, params: Sequence[Any] = (), version: int | None = None) -> pd.DataFrame:
+        with self._lock:
+            if self._connection is None or version != self.version:
+                self._close()
+                self._connection = connect(self.marts_dir)
+                self.version = version
+            return query(self._connection, sql, params)
+
+    def _close(self) -> None:
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def close(self) -> None:
+        with self._lock:
+            self._close()
+
+
+def slice_filter(start: date, end: date, vendors: Sequence[str] = ()) -> tuple[str, list[Any]]:
+    """WHERE clause and parameters selecting fact_order_lines from `start` to `end` (inclusive, UTC).
+
+    With `vendors`, only lines whose variant belongs to one of them are kept.
+    """
+    clause = "fact_order_lines.created_at >= ? AND fact_order_lines.created_at < ?"
+    params: list[Any] = [_micros(start), _micros(end + timedelta(days=1))]
+    if vendors:
+        placeholders = ", ".join("?" for _ in vendors)
+        clause += (
+            " AND fact_order_lines.variant_id IN "
+            f"(SELECT variant_id FROM dim_products WHERE vendor IN ({placeholders}))"
+        )
+        params.extend(vendors)
+    return clause, params
+
+
+def query(connection: sqlite3.Connection, sql: str, params: Sequence[Any] = ()) -> pd.DataFrame:
+    return pd.read_sql_query(sql, connection, params=list(params))
+
+
+def _vendor_clause(table: str, vendors: Sequence[str]) -> tuple[str, list[Any]]:
+    if not vendors:
+        return "", []
+    return f" AND {table}.vendor IN ({', '.join('?' for _ in vendors)})", list(vendors)
+
+
+def rollup_filter(start: date, end: date, vendors: Sequence[str] = ()) -> tuple[str, list[Any]]:
+    """WHERE clause and parameters selecting rollup_daily rows from `start` to `end` (inclusive)."""
+    vendor_clause, vendor_params = _vendor_clause("rollup_daily", vendors)
+    clause = "rollup_daily.order_date >= ? AND rollup_daily.order_date <= ?" + vendor_clause
+    return clause, [start.isoformat(), end.isoformat(), *vendor_params]
+
+
+def rollup_slice(start: date, end: date, vendors: Sequence[str] = ()) -> tuple[str, list[Any]]:
+    """Subquery with the rollup rows covering `start` to `end` (inclusive), for date-less totals.
+
+    Whole calendar months in the range come from rollup_monthly and only the
+    days before and after them from rollup_daily, so a long range reads a few
+    rows per variant and month instead of one per day.
+    """
+    first_month = start if start.day == 1 else (start.replace(day=1) + timedelta(days=32)).replace(day=1)
+    after_months = (end + timedelta(days=1)).replace(day=1)
+    if first_month >= after_months:
+        clause, params = rollup_filter(start, end, vendors)
+        return f"SELECT {ROLLUP_COLUMNS} FROM rollup_daily WHERE {clause}", params
+
+    monthly_vendors, monthly_params = _vendor_clause("rollup_monthly", vendors)
+    daily_vendors, daily_params = _vendor_clause("rollup_daily", vendors)
+    sql = (
+        f"SELECT {ROLLUP_COLUMNS} FROM rollup_monthly"
+        f" WHERE rollup_monthly.month_start >= ? AND rollup_monthly.month_start < ?{monthly_vendors}"
+        f" UNION ALL SELECT {ROLLUP_COLUMNS} FROM rollup_daily"
+        " WHERE ((rollup_daily.order_date >= ? AND rollup_daily.order_date < ?)"
+        f" OR (rollup_daily.order_date >= ? AND rollup_daily.order_date <= ?)){daily_vendors}"
+    )
+    params = [
+        first_month.isoformat(),
+        after_months.isoformat(),
+        *monthly_params,
+        start.isoformat(),
+        first_month.isoformat(),
+        after_months.isoformat(),
+        end.isoformat(),
+        *daily_params,
+    ]
+    return sql, params
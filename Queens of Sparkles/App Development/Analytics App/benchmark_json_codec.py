@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+import argparse
+import gc
+import time
+from pathlib import Path
+from typing import Any, Callable
+
+import json_codec
+from export_io import load_records, resolve_export
+from mock_shopify_server import generate_dataset
+
+
+def _best_of(repeat: int, run: Callable[[], Any]) -> tuple[float, Any]:
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        gc.collect()
+        started = time.perf_counter()
+        result = run()
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def run_benchmark(orders: list[dict[str, Any]], backends: list[str], repeat: int = 3) -> list[dict[str, Any]]:
+    """Time each backend decoding and encoding an orders export the way export_io does."""
+    document = json_codec.dumps(orders, backend="json")
+    lines = [json_codec.dumps(order, backend="json") for order in orders]
+    operations: dict[str, tuple[int, Callable[[str], Callable[[], Any]]]] = {
+        # load_records on a .json export: one document.
+        "decode_json": (len(document), lambda backend: lambda: json_codec.loads(document, backend=backend)),
+        # iter_records on a .ndjson export and bulk operation results: one call per line.
+        "decode_ndjson_lines": (
+            sum(map(len, lines)),
+            lambda backend: lambda: [json_codec.loads(line, backend=backend) for line in lines],
+        ),
+        # ExportWriter.write_page: one call per record.
+        "encode_records": (
+            sum(map(len, lines)),
+            lambda backend: lambda: [json_codec.dumps(order, backend=backend) for order in orders],
+        ),
+    }
+    # The stdlib runs first: it is the baseline the speedups are against.
+    backends = ["json"] + [backend for backend in backends if backend != "json"]
+    report = []
+    for operation, (size, make) in operations.items():
+        baseline = None
+        for backend in backends:
+            wall_s, result = _best_of(repeat, make(backend))
+            if operation.startswith("decode") and result != orders:
+                raise AssertionError(f"{backend} decoded {operation} differently from the stdlib")
+            if backend == "json":
+                baseline = wall_s
+            report.append(
+                {
+                    "operation": operation,
+                    "backend": backend,
+                    "records": len(orders),
+                    "mb": round(size / 1_048_576, 1),
+                    "wall_s": round(wall_s, 3),
+                    "mb_per_s": round(size / 1_048_576 / wall_s, 1) if wall_s else None,
+                    "speedup": round(baseline / wall_s, 2) if baseline and wall_s else None,
+                }
+            )
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare the JSON backends of json_codec on a large orders export.")
+    parser.add_argument("--data-dir", help="Benchmark the orders export in this directory instead of synthetic data")
+    parser.add_argument("--orders", type=int, default=100_000, help="Synthetic orders to generate")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per backend; the fastest is reported")
+    parser.add_argument("--json-out", help="Write the results to this JSON file")
+    args = parser.parse_args()
+
+    if args.data_dir:
+        orders = load_records(resolve_export(Path(args.data_dir), "orders_full"))
+    else:
+        orders = generate_dataset(orders=args.orders, products=500, customers=max(args.orders // 5, 1))["orders"]
+
+    backends = json_codec.available_backends()
+    report = run_benchmark(orders, backends, repeat=args.repeat)
+    print(f"\n=== JSON CODEC BENCHMARK (default backend: {json_codec.BACKEND}; installed: {', '.join(backends)}) ===")
+    for row in report:
+        print(
+            f"{row['operation']:<20} {row['backend']:<8} {row['records']:>9,} orders, {row['mb']:>7.1f} MB: "
+            f"{row['wall_s']:>7.3f}s, {row['mb_per_s']:>7.1f} MB/s ({row['speedup']}x vs json)"
+        )
+    if len(backends) == 1:
+        print("Only the stdlib backend is installed; pip install orjson (or msgspec) to compare.")
+
+    if args.json_out:
+        Path(args.json_out).write_bytes(json_codec.dumps(report, indent=True))
+
+
+if __name__ == "__main__":
+    main()
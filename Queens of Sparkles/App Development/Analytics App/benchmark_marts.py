@@ -0,0 +1,350 @@
+from __future__ import annotations
+
+import argparse
+import copy
+import gc
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable
+
+import pandas as pd
+
+from build_analytics_marts import _flatten_customers, _flatten_order_lines, _flatten_products, build_marts
+from export_io import load_records, resolve_export
+from marts_io import MART_NAMES, compact_frame, read_mart
+from mock_shopify_server import generate_dataset
+
+
+def _loop_order_lines(orders: list[dict[str, Any]]) -> pd.DataFrame:
+    """The original one-dict-per-line flattening, kept as the benchmark baseline."""
+    order_lines_rows: list[dict[str, Any]] = []
+    for order in orders:
+        customer = order.get("customer") or {}
+        for line in order.get("line_items", []):
+            quantity = int(line.get("quantity") or 0)
+            price = float(line.get("price") or 0)
+            order_lines_rows.append(
+                {
+                    "order_id": order.get("id"),
+                    "created_at": order.get("created_at"),
+                    "financial_status": order.get("financial_status"),
+                    "fulfillment_status": order.get("fulfillment_status"),
+                    "customer_id": customer.get("id"),
+                    "customer_email": customer.get("email") or "Guest",
+                    "product_id": line.get("product_id"),
+                    "variant_id": line.get("variant_id"),
+                    "sku": line.get("sku"),
+                    "product_name": line.get("name"),
+                    "variant_name": line.get("variant_title"),
+                    "quantity": quantity,
+                    "unit_price": price,
+                    "line_revenue": quantity * price,
+                }
+            )
+    frame = pd.DataFrame(order_lines_rows)
+    frame["created_at"] = pd.to_datetime(frame["created_at"], errors="coerce", utc=True)
+    return frame
+
+
+def _loop_products(products: list[dict[str, Any]]) -> pd.DataFrame:
+    rows = []
+    for product in products:
+        for variant in product.get("variants", []):
+            rows.append(
+                {
+                    "product_id": product.get("id"),
+                    "product_title": product.get("title"),
+                    "product_type": product.get("product_type"),
+                    "vendor": product.get("vendor"),
+                    "variant_id": variant.get("id"),
+                    "variant_title": variant.get("title"),
+                    "sku": variant.get("sku"),
+                    "price": float(variant.get("price") or 0),
+                    "inventory_quantity": int(variant.get("inventory_quantity") or 0),
+                }
+            )
+    return pd.DataFrame(rows)
+
+
+def _loop_customers(customers: list[dict[str, Any]]) -> pd.DataFrame:
+    rows = [
+        {
+            "customer_id": customer.get("id"),
+            "email": customer.get("email"),
+            "first_name": customer.get("first_name"),
+            "last_name": customer.get("last_name"),
+            "orders_count": customer.get("orders_count"),
+            "total_spent": float(customer.get("total_spent") or 0),
+            "state": customer.get("state"),
+            "created_at": customer.get("created_at"),
+        }
+        for customer in customers
+    ]
+    frame = pd.DataFrame(rows)
+    frame["created_at"] = pd.to_datetime(frame["created_at"], errors="coerce", utc=True)
+    return frame
+
+
+Flattener = Callable[[list[dict[str, Any]]], pd.DataFrame]
+
+MARTS = {"orders": "fact_order_lines", "products": "dim_products", "customers": "dim_customers"}
+
+ENGINES: dict[str, dict[str, Flattener]] = {
+    "loop": {"orders": _loop_order_lines, "products": _loop_products, "customers": _loop_customers},
+    "columnar": {"orders": _flatten_order_lines, "products": _flatten_products, "customers": _flatten_customers},
+}
+
+
+def _time(flatten: Flattener, records: list[dict[str, Any]]) -> tuple[pd.DataFrame, float]:
+    gc.collect()
+    started = time.process_time()
+    frame = flatten(records)
+    return frame, time.process_time() - started
+
+
+def _peak_mb(flatten: Flattener, records: list[dict[str, Any]]) -> float:
+    # Traced separately: tracemalloc slows allocation-heavy code and would skew the CPU numbers.
+    gc.collect()
+    tracemalloc.start()
+    flatten(records)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak / 1_048_576
+
+
+def run_benchmark(datasets: dict[str, list[dict[str, Any]]], repeat: int = 3) -> list[dict[str, Any]]:
+    """Time both flattening engines per resource and check they produce the same frame."""
+    report = []
+    for resource, records in datasets.items():
+        results = {}
+        for engine, flatteners in ENGINES.items():
+            runs = [_time(flatteners[resource], records) for _ in range(repeat)]
+            frame, cpu = min(runs, key=lambda run: run[1])
+            results[engine] = {"frame": frame, "cpu_s": cpu, "peak_mb": _peak_mb(flatteners[resource], records)}
+        # The loop baseline predates the compact dtypes; compare values under the same dtypes.
+        pd.testing.assert_frame_equal(
+            compact_frame(results["loop"]["frame"], MARTS[resource]),
+            results["columnar"]["frame"],
+            check_dtype=False,
+            check_index_type=False,
+        )
+        loop, columnar = results["loop"], results["columnar"]
+        report.append(
+            {
+                "resource": resource,
+                "records": len(records),
+                "rows": len(columnar["frame"]),
+                "loop_cpu_s": round(loop["cpu_s"], 3),
+                "columnar_cpu_s": round(columnar["cpu_s"], 3),
+                "speedup": round(loop["cpu_s"] / columnar["cpu_s"], 2) if columnar["cpu_s"] else None,
+                "loop_peak_mb": round(loop["peak_mb"], 1),
+                "columnar_peak_mb": round(columnar["peak_mb"], 1),
+            }
+        )
+    return report
+
+
+def _plain_frame(frame: pd.DataFrame) -> pd.DataFrame:
+    """The representation before the compact dtypes: object strings, float64 ids where missing."""
+    plain = {}
+    for column in frame.columns:
+        values = frame[column]
+        if isinstance(values.dtype, pd.CategoricalDtype) or pd.api.types.is_string_dtype(values.dtype):
+            plain[column] = values.astype(object)
+        elif pd.api.types.is_integer_dtype(values.dtype):
+            plain[column] = values.astype("float64" if values.isna().any() else "int64")
+        else:
+            plain[column] = values
+    return pd.DataFrame(plain)
+
+
+def memory_report(marts_dir: Path) -> list[dict[str, Any]]:
+    """In-memory bytes per row of each mart, as plain pandas dtypes and as loaded by `read_mart`."""
+    report = []
+    for name in MART_NAMES:
+        frame = read_mart(marts_dir, name)
+        rows = max(len(frame), 1)
+        compact = frame.memory_usage(deep=True, index=False).sum()
+        plain = _plain_frame(frame).memory_usage(deep=True, index=False).sum()
+        report.append(
+            {
+                "mart": name,
+                "rows": len(frame),
+                "plain_bytes_per_row": round(plain / rows, 1),
+                "compact_bytes_per_row": round(compact / rows, 1),
+                "reduction": round(plain / compact, 2) if compact else None,
+            }
+        )
+    return report
+
+
+def run_build_benchmark(
+    datasets: dict[str, list[dict[str, Any]]], workers: list[int], chunk_size: int = 20_000
+) -> list[dict[str, Any]]:
+    """Time full `build_marts` runs over NDJSON exports for each worker count."""
+    report = []
+    with tempfile.TemporaryDirectory() as data_dir:
+        for resource, records in datasets.items():
+            with open(Path(data_dir) / f"{resource}_full.ndjson", "w") as handle:
+                handle.writelines(json.dumps(record) + "\n" for record in records)
+        for count in workers:
+            started = time.perf_counter()
+            counts = build_marts(Path(data_dir), chunk_size=chunk_size, workers=count)
+            wall = time.perf_counter() - started
+            report.append({"workers": count, "wall_s": round(wall, 3), "fact_rows": counts["fact_order_lines"]})
+    baseline = report[0]["wall_s"]
+    for row in report:
+        row["speedup"] = round(baseline / row["wall_s"], 2) if row["wall_s"] else None
+    return report
+
+
+def _canonical(frame: pd.DataFrame) -> pd.DataFrame:
+    """Rows in a fixed order with plain values: an incremental rebuild appends changed orders last."""
+    categories = [column for column in frame.columns if isinstance(frame[column].dtype, pd.CategoricalDtype)]
+    plain = frame.astype({column: object for column in categories})
+    return plain.sort_values(list(plain.columns), ignore_index=True)
+
+
+def run_incremental_check(datasets: dict[str, list[dict[str, Any]]], changed: int = 100) -> list[dict[str, Any]]:
+    """Edit `changed` orders, then check an incremental build matches a full build of the same exports.
+
+    Every other edit is stamped a second after the order's own `updated_at`,
+    older than the newest order of the first build, like an order edited
+    during a sync on a page already fetched. The first order is also removed.
+    """
+    orders = copy.deepcopy(datasets["orders"])
+    latest = max(order["updated_at"] for order in orders)
+    edited_at = (pd.Timestamp(latest) + pd.Timedelta(days=1)).isoformat()
+    for index, order in enumerate(orders[:: max(len(orders) // max(changed, 1), 1)][:changed]):
+        order["line_items"] = order["line_items"][:1]
+        order["line_items"][0]["quantity"] = int(order["line_items"][0].get("quantity") or 0) + 1
+        stamp = (pd.Timestamp(order["updated_at"]) + pd.Timedelta(seconds=1)).isoformat()
+        order["updated_at"] = stamp if index % 2 else edited_at
+    orders = orders[1:]
+    report = []
+    with tempfile.TemporaryDirectory() as incremental_dir, tempfile.TemporaryDirectory() as full_dir:
+        for resource, records in datasets.items():
+            Path(incremental_dir, f"{resource}_full.json").write_text(json.dumps(records))
+        build_marts(Path(incremental_dir))
+        for data_dir in (incremental_dir, full_dir):
+            for resource, records in {**datasets, "orders": orders}.items():
+                Path(data_dir, f"{resource}_full.json").write_text(json.dumps(records))
+        timings = {}
+        for mode, data_dir in (("incremental", incremental_dir), ("full", full_dir)):
+            started = time.perf_counter()
+            build_marts(Path(data_dir), incremental=mode == "incremental")
+            timings[mode] = time.perf_counter() - started
+        for name in MART_NAMES:
+            incremental = read_mart(Path(incremental_dir) / "marts", name)
+            full = read_mart(Path(full_dir) / "marts", name)
+            pd.testing.assert_frame_equal(_canonical(incremental), _canonical(full), check_dtype=False)
+            report.append({"mart": name, "rows": len(full)})
+    for row in report:
+        row.update(
+            changed_orders=changed,
+            incremental_s=round(timings["incremental"], 3),
+            full_s=round(timings["full"], 3),
+        )
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Compare the original loop flattening with the columnar engine in build_analytics_marts."
+    )
+    parser.add_argument("--data-dir", help="Benchmark real exports from this directory instead of synthetic data")
+    parser.add_argument("--orders", type=int, default=100_000, help="Synthetic orders to generate")
+    parser.add_argument("--products", type=int, default=500)
+    parser.add_argument("--customers", type=int, default=20_000)
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per engine; the fastest is reported")
+    parser.add_argument(
+        "--build-workers",
+        type=int,
+        nargs="+",
+        help="Instead of comparing flatteners, time full builds with these worker counts (e.g. 1 2 4)",
+    )
+    parser.add_argument("--chunk-size", type=int, default=20_000, help="Orders per shard for --build-workers")
+    parser.add_argument(
+        "--memory-report",
+        action="store_true",
+        help="Instead, build the marts and report in-memory bytes per row before and after the compact dtypes",
+    )
+    parser.add_argument(
+        "--incremental-check",
+        type=int,
+        metavar="ORDERS",
+        help="Instead, edit this many orders and check an incremental build matches a full build",
+    )
+    parser.add_argument("--json-out", help="Write the results to this JSON file")
+    args = parser.parse_args()
+
+    if args.data_dir:
+        data_dir = Path(args.data_dir)
+        datasets = {
+            resource: load_records(resolve_export(data_dir, f"{resource}_full"))
+            for resource in ("orders", "products", "customers")
+        }
+    else:
+        datasets = generate_dataset(orders=args.orders, products=args.products, customers=args.customers)
+
+    if args.memory_report:
+        with tempfile.TemporaryDirectory() as data_dir:
+            for resource, records in datasets.items():
+                Path(data_dir, f"{resource}_full.json").write_text(json.dumps(records))
+            build_marts(Path(data_dir))
+            report = memory_report(Path(data_dir) / "marts")
+        print("\n=== MART MEMORY (bytes per row, plain -> compact dtypes) ===")
+        for row in report:
+            print(
+                f"{row['mart']:<17} {row['rows']:>9,} rows: "
+                f"{row['plain_bytes_per_row']:>7.1f} -> {row['compact_bytes_per_row']:>6.1f} B/row "
+                f"({row['reduction']}x)"
+            )
+        if args.json_out:
+            Path(args.json_out).write_text(json.dumps(report, indent=2))
+        return
+
+    if args.incremental_check:
+        report = run_incremental_check(datasets, changed=args.incremental_check)
+        print("\n=== INCREMENTAL BUILD CHECK (identical to a full build) ===")
+        print(
+            f"{args.incremental_check} changed orders: incremental {report[0]['incremental_s']:.2f}s, "
+            f"full {report[0]['full_s']:.2f}s"
+        )
+        for row in report:
+            print(f"{row['mart']:<24} {row['rows']:>9,} rows match")
+        if args.json_out:
+            Path(args.json_out).write_text(json.dumps(report, indent=2))
+        return
+
+    if args.build_workers:
+        report = run_build_benchmark(datasets, args.build_workers, chunk_size=args.chunk_size)
+        print(f"\n=== PARALLEL BUILD BENCHMARK ({os.cpu_count()} CPUs) ===")
+        for row in report:
+            print(
+                f"workers={row['workers']:<3} {row['fact_rows']:>9,} fact rows: "
+                f"wall {row['wall_s']:.2f}s ({row['speedup']}x vs {args.build_workers[0]} worker(s))"
+            )
+        if args.json_out:
+            Path(args.json_out).write_text(json.dumps(report, indent=2))
+        return
+
+    report = run_benchmark(datasets, repeat=args.repeat)
+    print("\n=== MART FLATTENING BENCHMARK (identical output verified) ===")
+    for row in report:
+        print(
+            f"{row['resource']:<10} {row['records']:>9,} records -> {row['rows']:>9,} rows: "
+            f"cpu {row['loop_cpu_s']:.3f}s -> {row['columnar_cpu_s']:.3f}s ({row['speedup']}x), "
+            f"peak {row['loop_peak_mb']:.1f} MB -> {row['columnar_peak_mb']:.1f} MB"
+        )
+
+    if args.json_out:
+        Path(args.json_out).write_text(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
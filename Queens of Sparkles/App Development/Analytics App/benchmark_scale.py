@@ -0,0 +1,257 @@
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import multiprocessing
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import closing
+from datetime import timedelta
+from pathlib import Path
+from typing import Any
+
+import pandas as pd
+
+import dashboard_data
+from analytics_db import connect, query
+from build_analytics_marts import build_marts
+from data_quality_check import run_quality_checks
+from export_io import ExportWriter, ParsedExports, iter_records, load_records, resolve_export
+from mock_shopify_server import RESOURCE_KEYS
+from pipeline_profile import Profiler, active, stage
+from synthetic_exports import write_synthetic_exports
+
+TOP_STAGES = ("generate", "checks", "build", "dashboard")
+
+
+def _dashboard_pass(marts_dir: Path) -> None:
+    """Every dashboard query and aggregation, uncached, for its default view and for the whole history."""
+    with closing(connect(marts_dir)) as connection:
+
+        def run(sql: str, params: tuple[Any, ...]) -> pd.DataFrame:
+            return query(connection, sql, params)
+
+        with stage("filters"):
+            first, last = dashboard_data.date_bounds(run)
+            vendors = dashboard_data.vendor_options(run)
+        views = {
+            "last_30_days": dashboard_data.DashboardSlice(max(last - timedelta(days=30), first), last, vendors),
+            "all_history": dashboard_data.DashboardSlice(first, last, vendors),
+        }
+        for view, selection in views.items():
+            with stage(view):
+                for name, load in dashboard_data.SECTIONS.items():
+                    with stage(name):
+                        load(run, selection)
+        with stage("inventory_risk"):
+            # "Now" is the day after the last order, so the 30-day velocity window has sales.
+            now = pd.Timestamp(last, tz="UTC") + pd.Timedelta(days=1)
+            dashboard_data.at_risk_skus(dashboard_data.inventory_risk(run, now))
+
+
+def run_size(size: dict[str, Any], data_dir: str, export_format: str, workers: int) -> dict[str, Any]:
+    """Generate one store size and profile checks, build and dashboard over it. Runs in a fresh process."""
+    data_path = Path(data_dir)
+    profiler = Profiler("benchmark_scale", size)
+    # Shared like in run_local_analytics: the build reuses the records the checks decoded.
+    exports = ParsedExports()
+    with active(profiler):
+        with stage("generate", rows=size["orders"]):
+            write_synthetic_exports(data_path, export_format=export_format, **size)
+        with stage("checks", rows=size["orders"]):
+            run_quality_checks(data_path, check_freshness=False, exports=exports)
+        with stage("build") as build:
+            counts = build_marts(data_path, workers=workers, force=True, exports=exports)
+            build.add_rows(counts["fact_order_lines"])
+        exports.clear()
+        with stage("dashboard"):
+            _dashboard_pass(data_path / "marts")
+    export_bytes = sum(resolve_export(data_path, f"{name}_full").stat().st_size for name in RESOURCE_KEYS)
+    return {
+        "size": size,
+        "export_mb": round(export_bytes / 1_048_576, 1),
+        "fact_rows": counts["fact_order_lines"],
+        "run": profiler.run_log(),
+    }
+
+
+def run_incremental_check(size: dict[str, Any], changed: int = 100) -> list[dict[str, Any]]:
+    """Edit `changed` orders in place, then check incremental quality checks match a full run.
+
+    Each edit blanks a line price and the customer's email and is stamped a
+    second after the order's own `updated_at`: older than the newest order the
+    previous run saw, like an order edited during a sync on a page already fetched.
+    """
+    with tempfile.TemporaryDirectory() as data_dir:
+        data_path = Path(data_dir)
+        write_synthetic_exports(data_path, **size)
+        run_quality_checks(data_path, check_freshness=False, incremental=True)
+        orders_path = resolve_export(data_path, "orders_full")
+        orders = load_records(orders_path)
+        for order in orders[:: max(len(orders) // max(changed, 1), 1)][:changed]:
+            order["line_items"][0]["price"] = None
+            order["customer"] = {**(order.get("customer") or {}), "email": None}
+            order["updated_at"] = (pd.Timestamp(order["updated_at"]) + pd.Timedelta(seconds=1)).isoformat()
+        with ExportWriter(orders_path) as writer:
+            writer.write_page(orders)
+        timings, results = {}, {}
+        for mode in ("incremental", "full"):
+            started = time.perf_counter()
+            results[mode], _ = run_quality_checks(data_path, check_freshness=False, incremental=mode == "incremental")
+            timings[mode] = time.perf_counter() - started
+    report = []
+    for incremental, full in zip(results["incremental"], results["full"]):
+        if (incremental.name, incremental.passed, incremental.details) != (full.name, full.passed, full.details):
+            raise AssertionError(f"{full.name}: incremental gave {incremental.details!r}, full gave {full.details!r}")
+        report.append({"check": full.name, "label": full.label, "details": full.details})
+    for row in report:
+        row.update(
+            changed_orders=changed,
+            incremental_s=round(timings["incremental"], 3),
+            full_s=round(timings["full"], 3),
+        )
+    return report
+
+
+def scaling_exponent(sizes: list[int], seconds: list[float]) -> float | None:
+    """Least-squares slope of log(time) over log(orders): ~1 is linear, >1 grows faster than the data."""
+    points = [(math.log(size), math.log(value)) for size, value in zip(sizes, seconds) if size > 0 and value > 0]
+    if len(points) < 2:
+        return None
+    mean_x = sum(x for x, _ in points) / len(points)
+    mean_y = sum(y for _, y in points) / len(points)
+    spread = sum((x - mean_x) ** 2 for x, _ in points)
+    if not spread:
+        return None
+    return sum((x - mean_x) * (y - mean_y) for x, y in points) / spread
+
+
+def scaling_report(results: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    """Per stage (top level and one below): wall, peak RSS and rows/sec at each size, plus the exponent."""
+    sizes = [result["size"]["orders"] for result in results]
+    names = [entry["name"] for entry in results[-1]["run"]["stages"] if entry["depth"] <= 1]
+    report = []
+    for name in names:
+        entries = [
+            next((entry for entry in result["run"]["stages"] if entry["name"] == name), None) for result in results
+        ]
+        if any(entry is None for entry in entries):
+            continue
+        walls = [entry["wall_s"] for entry in entries]
+        report.append(
+            {
+                "stage": name,
+                "depth": entries[0]["depth"],
+                "wall_s": walls,
+                "peak_rss_mb": [entry["peak_rss_mb"] for entry in entries],
+                "rows_per_s": [entry["rows_per_s"] for entry in entries],
+                "exponent": scaling_exponent(sizes, walls),
+            }
+        )
+    return report
+
+
+def _current_volume(data_dir: Path) -> dict[str, int]:
+    return {name: sum(1 for _ in iter_records(resolve_export(data_dir, f"{name}_full"))) for name in RESOURCE_KEYS}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Time quality checks, mart build and dashboard queries on synthetic stores of growing size."
+    )
+    parser.add_argument(
+        "--orders", type=int, nargs="+", default=[10_000, 50_000, 100_000], help="Store sizes to run, in orders"
+    )
+    parser.add_argument(
+        "--from-data-dir",
+        help="Size the runs as --scales multiples of the orders and customers in these exports instead",
+    )
+    parser.add_argument("--scales", type=float, nargs="+", default=[1, 10, 100], help="Multiples for --from-data-dir")
+    parser.add_argument("--customers-per-order", type=float, default=0.2, help="Customers generated per order")
+    parser.add_argument("--products", type=int, default=500, help="Products (x3 SKUs); kept fixed across sizes")
+    parser.add_argument("--max-lines-per-order", type=int, default=4)
+    parser.add_argument("--days", type=int, default=700, help="Days of order history")
+    parser.add_argument("--skew", type=float, default=1.0, help="Zipf exponent for SKU/customer popularity")
+    parser.add_argument("--format", choices=("json", "ndjson"), default="json", help="Export format to generate")
+    parser.add_argument("--workers", type=int, default=1, help="build_marts worker processes")
+    parser.add_argument("--work-dir", help="Generate the stores here (one folder per size) and keep them")
+    parser.add_argument("--json-out", help="Write every run log and the scaling report to this JSON file")
+    parser.add_argument(
+        "--incremental-check",
+        type=int,
+        metavar="ORDERS",
+        help="Instead, edit this many orders of the first size and check incremental quality checks match full ones",
+    )
+    args = parser.parse_args()
+
+    if args.from_data_dir:
+        current = _current_volume(Path(args.from_data_dir))
+        print(f"Current volume in {args.from_data_dir}: {current}")
+        sizes = [
+            {
+                "orders": round(current["orders"] * scale),
+                "customers": round(current["customers"] * scale),
+                "products": current["products"],
+            }
+            for scale in args.scales
+        ]
+    else:
+        sizes = [
+            {"orders": orders, "customers": round(orders * args.customers_per_order), "products": args.products}
+            for orders in args.orders
+        ]
+    for size in sizes:
+        size.update(max_lines_per_order=args.max_lines_per_order, days=args.days, skew=args.skew)
+
+    if args.incremental_check is not None:
+        report = run_incremental_check(sizes[0], args.incremental_check)
+        print("\n=== INCREMENTAL QUALITY CHECK (identical to a full run) ===")
+        print(
+            f"{args.incremental_check} changed orders: incremental {report[0]['incremental_s']:.2f}s, "
+            f"full {report[0]['full_s']:.2f}s"
+        )
+        for row in report:
+            print(f"{row['check']:<32} {row['label']:<5} {row['details']}")
+        if args.json_out:
+            Path(args.json_out).write_text(json.dumps(report, indent=2))
+        return
+
+    work_dir = Path(args.work_dir or tempfile.mkdtemp(prefix="qos-scale-"))
+    results = []
+    try:
+        for size in sizes:
+            data_dir = work_dir / f"orders-{size['orders']}"
+            print(f"Running {size['orders']:,} orders...", flush=True)
+            # A fresh process per size, so peak RSS is not carried over from the previous one.
+            with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+                results.append(pool.submit(run_size, size, str(data_dir), args.format, args.workers).result())
+    finally:
+        if not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = scaling_report(results)
+    header = "".join(f"{result['size']['orders']:>12,}" for result in results)
+    print("\n=== SCALE BENCHMARK: wall seconds by orders (exponent ~1 = linear) ===")
+    print(f"{'stage':<28}{header}{'exponent':>10}")
+    for row in report:
+        label = "  " * row["depth"] + row["stage"].rsplit("/", 1)[-1]
+        cells = "".join(f"{value:>12.3f}" for value in row["wall_s"])
+        exponent = f"{row['exponent']:.2f}" if row["exponent"] is not None else "-"
+        print(f"{label:<28.28}{cells}{exponent:>10}")
+    print("\n=== Peak RSS (MB) ===")
+    print(f"{'stage':<28}{header}")
+    for row in report:
+        if row["stage"] in TOP_STAGES:
+            print(f"{row['stage']:<28}" + "".join(f"{value:>12.1f}" for value in row["peak_rss_mb"]))
+    print(f"{'exports (MB on disk)':<28}" + "".join(f"{result['export_mb']:>12.1f}" for result in results))
+    print(f"{'fact_order_lines rows':<28}" + "".join(f"{result['fact_rows']:>12,}" for result in results))
+
+    if args.json_out:
+        Path(args.json_out).write_text(json.dumps({"runs": results, "scaling": report}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+from __future__ import annotations
+
+import argparse
+import json
+import multiprocessing
+import resource
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any
+
+import requests
+
+from export_io import COMPRESSIONS
+from mock_shopify_server import MockShopify, generate_dataset
+from shopify_client import CallLimitBucket, ShopifyClient
+from shopify_sync import EXPORT_FORMATS, FIELD_PROFILES, SYNC_ENGINES, sync_shopify_data
+
+
+def _serve_mock(ready: Any, dataset_size: dict[str, int], mock_options: dict[str, Any]) -> None:
+    mock = MockShopify(generate_dataset(**dataset_size), **mock_options)
+    ready.send(mock.base_url)
+    mock._server.serve_forever()
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_benchmark(
+    orders: int,
+    products: int,
+    customers: int,
+    engine: str = "rest",
+    export_format: str = "json",
+    compression: str = "none",
+    field_profile: str = "full",
+    bucket_size: int = 40,
+    leak_rate: float = 2.0,
+    latency_ms: float = 0.0,
+    fail_every: int = 0,
+    order_windows: int = 0,
+    backfill_workers: int = 4,
+    trace_memory: bool = False,
+) -> dict[str, Any]:
+    """Run one sync against a mock store in a separate process and measure it."""
+    receiver, sender = multiprocessing.Pipe(duplex=False)
+    server = multiprocessing.Process(
+        target=_serve_mock,
+        args=(
+            sender,
+            {"orders": orders, "products": products, "customers": customers},
+            {
+                "bucket_size": bucket_size,
+                "leak_rate": leak_rate,
+                "latency_ms": latency_ms,
+                "fail_every": fail_every,
+                "retry_after": 1.0,
+                "bulk_polls": 2,
+            },
+        ),
+        daemon=True,
+    )
+    server.start()
+    base_url = receiver.recv()
+    stats_url = base_url.split("/admin/api/", 1)[0] + "/_mock/stats"
+
+    try:
+        with tempfile.TemporaryDirectory() as output_dir, ShopifyClient(
+            base_url=base_url,
+            access_token="mock",
+            limiter=CallLimitBucket(bucket_size, leak_rate),
+        ) as client:
+            rss_before = _peak_rss_mb()
+            if trace_memory:
+                tracemalloc.start()
+            started = time.perf_counter()
+            counts = sync_shopify_data(
+                Path(output_dir),
+                full_refresh=True,
+                client=client,
+                export_format=export_format,
+                engine=engine,
+                bulk_poll_seconds=0.1,
+                compression=compression,
+                field_profile=field_profile,
+                order_windows=order_windows,
+                backfill_workers=backfill_workers,
+            )
+            wall = time.perf_counter() - started
+            traced_peak = tracemalloc.get_traced_memory()[1] if trace_memory else None
+            if trace_memory:
+                tracemalloc.stop()
+            disk_bytes = sum(path.stat().st_size for path in Path(output_dir).iterdir() if path.is_file())
+        mock_stats = requests.get(stats_url, timeout=10).json()
+    finally:
+        server.terminate()
+        server.join()
+
+    records = sum(counts.values())
+    pages = mock_stats["requests"] - mock_stats["throttled"]
+    return {
+        "engine": engine,
+        "format": f"{export_format}{COMPRESSIONS[compression]}",
+        "field_profile": field_profile,
+        "order_windows": order_windows,
+        "records": records,
+        "pages": pages,
+        "throttled": mock_stats["throttled"],
+        "wall_s": round(wall, 3),
+        "pages_per_s": round(pages / wall, 2) if wall else 0.0,
+        "records_per_s": round(records / wall, 1) if wall else 0.0,
+        "bytes_received": mock_stats["bytes_sent"],
+        "bytes_on_disk": disk_bytes,
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+        "peak_rss_growth_mb": round(_peak_rss_mb() - rss_before, 1),
+        "peak_traced_mb": round(traced_peak / 1_048_576, 1) if traced_peak is not None else None,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Benchmark sync_shopify_data against the local mock Shopify Admin API."
+    )
+    parser.add_argument("--orders", type=int, nargs="+", default=[5000], help="One or more order counts to run")
+    parser.add_argument("--products", type=int, default=200)
+    parser.add_argument("--customers", type=int, default=2000)
+    parser.add_argument("--engine", choices=SYNC_ENGINES, default="rest")
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default="json")
+    parser.add_argument("--compress", choices=tuple(COMPRESSIONS), default="none")
+    parser.add_argument("--field-profile", choices=tuple(FIELD_PROFILES), default="full")
+    parser.add_argument("--bucket-size", type=int, default=40)
+    parser.add_argument("--leak-rate", type=float, default=2.0, help="Allowed calls per second")
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="Simulated per-request latency")
+    parser.add_argument("--fail-every", type=int, default=0, help="Inject a 429 every Nth request")
+    parser.add_argument("--order-windows", type=int, default=0, help="Parallel created_at windows for orders")
+    parser.add_argument("--backfill-workers", type=int, default=4)
+    parser.add_argument("--trace-memory", action="store_true", help="Also report tracemalloc peak (slower)")
+    parser.add_argument("--json-out", help="Write the results to this JSON file")
+    args = parser.parse_args()
+
+    results = []
+    for orders in args.orders:
+        result = run_benchmark(
+            orders=orders,
+            products=args.products,
+            customers=args.customers,
+            engine=args.engine,
+            export_format=args.format,
+            compression=args.compress,
+            field_profile=args.field_profile,
+            bucket_size=args.bucket_size,
+            leak_rate=args.leak_rate,
+            latency_ms=args.latency_ms,
+            fail_every=args.fail_every,
+            order_windows=args.order_windows,
+            backfill_workers=args.backfill_workers,
+            trace_memory=args.trace_memory,
+        )
+        results.append({"orders": orders, **result})
+
+    print("\n=== SYNC BENCHMARK ===")
+    for row in results:
+        print(
+            f"orders={row['orders']:<8} {row['engine']}/{row['format']:<12} "
+            f"wall={row['wall_s']:.2f}s pages={row['pages']} ({row['pages_per_s']}/s) "
+            f"records/s={row['records_per_s']:,.0f} received={row['bytes_received'] / 1_048_576:.1f}MB "
+            f"disk={row['bytes_on_disk'] / 1_048_576:.1f}MB peak_rss={row['peak_rss_mb']}MB "
+            f"throttled={row['throttled']}"
+            + (f" traced_peak={row['peak_traced_mb']}MB" if row["peak_traced_mb"] is not None else "")
+        )
+
+    if args.json_out:
+        Path(args.json_out).write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,135 +1,693 @@
 from __future__ import annotations
 
 import argparse
-import json
+import hashlib
+import shutil
+import tempfile
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from datetime import datetime, timezone
 from pathlib import Path
-from typing import Any
+from typing import Any, Callable, Iterable
 
+import numpy as np
 import pandas as pd
+import pyarrow.parquet as pq
 
+from analytics_db import db_path, publish_marts
+from export_io import ParsedExports, decode_ndjson, is_ndjson, iter_ndjson_blocks, resolve_export
+from marts_io import (
+    MART_NAMES,
+    PARTITIONED_MARTS,
+    MartWriter,
+    empty_mart,
+    export_csv,
+    list_partitions,
+    load_metadata,
+    mart_exists,
+    compact_frame,
+    mart_row_count,
+    mart_table,
+    month_partition,
+    read_mart,
+    read_partition,
+    remove_partition,
+    save_metadata,
+    write_mart,
+    write_partition,
+)
+from pipeline_profile import profile_iter, stage
+from sketches import hash_values
 
-def _read_json(path: Path) -> list[dict[str, Any]]:
-    return json.loads(path.read_text())
+# Bump when the mart layout or schemas change; older marts are then rebuilt in full.
+MARTS_LAYOUT_VERSION = 4
+# Exports a build reads, and the modules whose code goes into the builder version.
+INPUT_STEMS = ("orders_full", "products_full", "customers_full")
+BUILDER_MODULES = ("build_analytics_marts.py", "marts_io.py", "analytics_db.py", "export_io.py")
+HASH_BLOCK_SIZE = 1 << 20
+# Orders/customers parsed and flattened at a time during a full build.
+DEFAULT_CHUNK_SIZE = 20_000
+# fact_order_lines columns daily_sales is computed from.
+DAILY_COLUMNS = ["created_at", "order_id", "customer_email", "quantity", "line_revenue"]
+# fact_order_lines columns the rollups are computed from, and the rollup grain below the period.
+ROLLUP_SOURCE_COLUMNS = [
+    "created_at",
+    "order_id",
+    "variant_id",
+    "financial_status",
+    "product_name",
+    "quantity",
+    "line_revenue",
+]
+ROLLUP_KEYS = ["variant_id", "vendor", "financial_status", "product_name"]
+ROLLUP_MEASURES = ["revenue", "units_sold", "lines", "orders"]
 
 
-def build_marts(data_dir: Path) -> dict[str, int]:
-    orders = _read_json(data_dir / "orders_full.json")
-    products = _read_json(data_dir / "products_full.json")
-    customers = _read_json(data_dir / "customers_full.json")
+def _numbers(values: list[Any]) -> pd.Series:
+    """Parse Shopify's numeric strings in one vectorized pass; missing and blank become 0."""
+    series = pd.Series(values, dtype=object)
+    return pd.to_numeric(series.where(series != ""), errors="raise").fillna(0)
 
-    marts_dir = data_dir / "marts"
-    marts_dir.mkdir(parents=True, exist_ok=True)
 
-    order_lines_rows: list[dict[str, Any]] = []
-    for order in orders:
-        order_id = order.get("id")
-        created_at = order.get("created_at")
-        financial_status = order.get("financial_status")
-        fulfillment_status = order.get("fulfillment_status")
-        customer = order.get("customer") or {}
-        customer_id = customer.get("id")
-        customer_email = customer.get("email") or "Guest"
-
-        for line in order.get("line_items", []):
-            quantity = int(line.get("quantity") or 0)
-            price = float(line.get("price") or 0)
-            order_lines_rows.append(
-                {
-                    "order_id": order_id,
-                    "created_at": created_at,
-                    "financial_status": financial_status,
-                    "fulfillment_status": fulfillment_status,
-                    "customer_id": customer_id,
-                    "customer_email": customer_email,
-                    "product_id": line.get("product_id"),
-                    "variant_id": line.get("variant_id"),
-                    "sku": line.get("sku"),
-                    "product_name": line.get("name"),
-                    "variant_name": line.get("variant_title"),
-                    "quantity": quantity,
-                    "unit_price": price,
-                    "line_revenue": quantity * price,
-                }
-            )
+def _flatten_order_lines(orders: Iterable[dict[str, Any]]) -> pd.DataFrame:
+    """Flatten orders into one row per line item, building each column in one pass.
 
-    fact_order_lines = pd.DataFrame(order_lines_rows)
-    if not fact_order_lines.empty:
-        fact_order_lines["created_at"] = pd.to_datetime(fact_order_lines["created_at"], errors="coerce", utc=True)
-
-    products_rows: list[dict[str, Any]] = []
-    for product in products:
-        for variant in product.get("variants", []):
-            products_rows.append(
-                {
-                    "product_id": product.get("id"),
-                    "product_title": product.get("title"),
-                    "product_type": product.get("product_type"),
-                    "vendor": product.get("vendor"),
-                    "variant_id": variant.get("id"),
-                    "variant_title": variant.get("title"),
-                    "sku": variant.get("sku"),
-                    "price": float(variant.get("price") or 0),
-                    "inventory_quantity": int(variant.get("inventory_quantity") or 0),
-                }
-            )
+    Order-level columns are built once per order (timestamps parsed there, not
+    per line) and repeated by each order's line count.
+    """
+    orders = orders if isinstance(orders, list) else list(orders)
+    line_items = [order.get("line_items") or [] for order in orders]
+    lines = [line for items in line_items for line in items]
+    if not lines:
+        return empty_mart("fact_order_lines")
 
-    dim_products = pd.DataFrame(products_rows)
-
-    customer_rows = []
-    for customer in customers:
-        customer_rows.append(
-            {
-                "customer_id": customer.get("id"),
-                "email": customer.get("email"),
-                "first_name": customer.get("first_name"),
-                "last_name": customer.get("last_name"),
-                "orders_count": customer.get("orders_count"),
-                "total_spent": float(customer.get("total_spent") or 0),
-                "state": customer.get("state"),
-                "created_at": customer.get("created_at"),
-            }
-        )
+    customers = [order.get("customer") or {} for order in orders]
+    order_columns = pd.DataFrame(
+        {
+            "order_id": [order.get("id") for order in orders],
+            "created_at": pd.to_datetime(
+                pd.Series([order.get("created_at") for order in orders], dtype=object), errors="coerce", utc=True
+            ),
+            "financial_status": [order.get("financial_status") for order in orders],
+            "fulfillment_status": [order.get("fulfillment_status") for order in orders],
+            "customer_id": [customer.get("id") for customer in customers],
+            "customer_email": [customer.get("email") or "Guest" for customer in customers],
+        }
+    )
+    order_columns = order_columns.loc[order_columns.index.repeat([len(items) for items in line_items])]
 
-    dim_customers = pd.DataFrame(customer_rows)
-    if not dim_customers.empty:
-        dim_customers["created_at"] = pd.to_datetime(dim_customers["created_at"], errors="coerce", utc=True)
-
-    if not fact_order_lines.empty:
-        daily_sales = (
-            fact_order_lines.assign(order_date=fact_order_lines["created_at"].dt.date)
-            .groupby("order_date", as_index=False)
-            .agg(
-                revenue=("line_revenue", "sum"),
-                units_sold=("quantity", "sum"),
-                orders=("order_id", "nunique"),
-                active_customers=("customer_email", "nunique"),
-            )
+    quantity = _numbers([line.get("quantity") for line in lines]).astype("int64")
+    price = _numbers([line.get("price") for line in lines]).astype("float64")
+    line_columns = pd.DataFrame(
+        {
+            "product_id": [line.get("product_id") for line in lines],
+            "variant_id": [line.get("variant_id") for line in lines],
+            "sku": [line.get("sku") for line in lines],
+            "product_name": [line.get("name") for line in lines],
+            "variant_name": [line.get("variant_title") for line in lines],
+            "quantity": quantity,
+            "unit_price": price,
+            "line_revenue": quantity * price,
+        }
+    )
+    frame = pd.concat([order_columns.reset_index(drop=True), line_columns], axis=1)
+    return compact_frame(frame, "fact_order_lines")
+
+
+def _flatten_products(products: Iterable[dict[str, Any]]) -> pd.DataFrame:
+    products = products if isinstance(products, list) else list(products)
+    variants = [variant for product in products for variant in product.get("variants") or []]
+    if not variants:
+        return empty_mart("dim_products")
+
+    product_columns = pd.DataFrame(
+        {
+            "product_id": [product.get("id") for product in products],
+            "product_title": [product.get("title") for product in products],
+            "product_type": [product.get("product_type") for product in products],
+            "vendor": [product.get("vendor") for product in products],
+        }
+    )
+    product_columns = product_columns.loc[
+        product_columns.index.repeat([len(product.get("variants") or []) for product in products])
+    ]
+    variant_columns = pd.DataFrame(
+        {
+            "variant_id": [variant.get("id") for variant in variants],
+            "variant_title": [variant.get("title") for variant in variants],
+            "sku": [variant.get("sku") for variant in variants],
+            "price": _numbers([variant.get("price") for variant in variants]).astype("float64"),
+            "inventory_quantity": _numbers([variant.get("inventory_quantity") for variant in variants]).astype(
+                "int64"
+            ),
+        }
+    )
+    return compact_frame(pd.concat([product_columns.reset_index(drop=True), variant_columns], axis=1), "dim_products")
+
+
+def _flatten_customers(customers: Iterable[dict[str, Any]]) -> pd.DataFrame:
+    customers = customers if isinstance(customers, list) else list(customers)
+    if not customers:
+        return empty_mart("dim_customers")
+
+    frame = pd.DataFrame(
+        {
+            "customer_id": [customer.get("id") for customer in customers],
+            "email": [customer.get("email") for customer in customers],
+            "first_name": [customer.get("first_name") for customer in customers],
+            "last_name": [customer.get("last_name") for customer in customers],
+            "orders_count": [customer.get("orders_count") for customer in customers],
+            "total_spent": _numbers([customer.get("total_spent") for customer in customers]).astype("float64"),
+            "state": [customer.get("state") for customer in customers],
+            "created_at": pd.to_datetime(
+                pd.Series([customer.get("created_at") for customer in customers], dtype=object),
+                errors="coerce",
+                utc=True,
+            ),
+        }
+    )
+    return compact_frame(frame, "dim_customers")
+
+
+def _daily_sales(fact_order_lines: pd.DataFrame) -> pd.DataFrame:
+    if fact_order_lines.empty:
+        return empty_mart("daily_sales")
+    return (
+        fact_order_lines.assign(order_date=fact_order_lines["created_at"].dt.date)
+        .groupby("order_date", as_index=False)
+        .agg(
+            revenue=("line_revenue", "sum"),
+            units_sold=("quantity", "sum"),
+            orders=("order_id", "nunique"),
+            active_customers=("customer_email", "nunique"),
         )
+    )
+
+
+def _daily_partial(fact_order_lines: pd.DataFrame) -> pd.DataFrame:
+    """daily_sales at (order_date, customer_email) grain, so shard partials can be combined.
+
+    Each order lives in exactly one shard, so per-shard distinct order counts
+    add up; distinct customers are recovered by counting emails after the merge.
+    """
+    return (
+        fact_order_lines.assign(order_date=fact_order_lines["created_at"].dt.date)
+        .groupby(["order_date", "customer_email"], as_index=False, observed=True)
+        .agg(revenue=("line_revenue", "sum"), units_sold=("quantity", "sum"), orders=("order_id", "nunique"))
+    )
+
+
+def _combine_daily_partials(partials: list[pd.DataFrame]) -> pd.DataFrame:
+    if not partials:
+        return empty_mart("daily_sales")
+    merged = (
+        pd.concat(partials, ignore_index=True)
+        .groupby(["order_date", "customer_email"], as_index=False, observed=True)[["revenue", "units_sold", "orders"]]
+        .sum()
+    )
+    return merged.groupby("order_date", as_index=False).agg(
+        revenue=("revenue", "sum"),
+        units_sold=("units_sold", "sum"),
+        orders=("orders", "sum"),
+        active_customers=("customer_email", "nunique"),
+    )
+
+
+def _variant_vendors(marts_dir: Path) -> pd.Series:
+    products = read_mart(marts_dir, "dim_products", ["variant_id", "vendor"]).dropna(subset=["variant_id"])
+    vendors = products.drop_duplicates("variant_id").set_index("variant_id")["vendor"].astype(object)
+    return vendors.sort_index()
+
+
+def _vendors_digest(vendors: pd.Series) -> str:
+    return hashlib.sha256(pd.util.hash_pandas_object(vendors).to_numpy().tobytes()).hexdigest()
+
+
+def _daily_rollup(fact_order_lines: pd.DataFrame, vendors: pd.Series) -> pd.DataFrame:
+    """rollup_daily for a set of order lines; undated lines are left out."""
+    lines = fact_order_lines[fact_order_lines["created_at"].notna()]
+    if lines.empty:
+        return empty_mart("rollup_daily")
+    keyed = pd.DataFrame(
+        {
+            "order_date": lines["created_at"].dt.tz_localize(None).dt.floor("D"),
+            "variant_id": lines["variant_id"],
+            "vendor": lines["variant_id"].map(vendors),
+            "financial_status": lines["financial_status"].astype(object),
+            "product_name": lines["product_name"],
+            "order_id": lines["order_id"],
+            "quantity": lines["quantity"],
+            "line_revenue": lines["line_revenue"],
+        }
+    )
+    grouped = keyed.groupby(["order_date", *ROLLUP_KEYS], dropna=False, sort=False, as_index=False, observed=True)
+    return grouped.agg(
+        revenue=("line_revenue", "sum"),
+        units_sold=("quantity", "sum"),
+        lines=("order_id", "size"),
+        orders=("order_id", "nunique"),
+    )
+
+
+def _coarser_rollup(daily: pd.DataFrame, name: str) -> pd.DataFrame:
+    """Sum rollup_daily up to `rollup_weekly` (weeks start on Monday) or `rollup_monthly`."""
+    if daily.empty:
+        return empty_mart(name)
+    dates = pd.to_datetime(daily["order_date"])
+    if name == "rollup_weekly":
+        period_column, offset = "week_start", dates.dt.weekday
+    else:
+        period_column, offset = "month_start", dates.dt.day - 1
+    keyed = daily[ROLLUP_KEYS + ROLLUP_MEASURES].astype({"vendor": object, "financial_status": object})
+    return (
+        keyed.assign(**{period_column: dates - pd.to_timedelta(offset, unit="D")})
+        .groupby([period_column, *ROLLUP_KEYS], dropna=False, sort=False, as_index=False, observed=True)[
+            ROLLUP_MEASURES
+        ]
+        .sum()
+    )
+
+
+def _timestamps(records: Iterable[dict[str, Any]], key: str) -> pd.Series:
+    values = pd.Series([record.get(key) for record in records], dtype=object)
+    return pd.to_datetime(values, errors="coerce", utc=True)
+
+
+def _month_digests(
+    orders: list[dict[str, Any]], digests: dict[str, list[int]] | None = None
+) -> dict[str, list[int]]:
+    """Add `orders` to per-month [sum of (id, updated_at) hashes mod 2**64, order count] digests.
+
+    A month's digest changes when one of its orders is added, removed or gets a
+    new `updated_at`, whatever that timestamp is, so edits stamped before the
+    last build's newest order are not missed.
+    """
+    digests = {} if digests is None else digests
+    if not orders:
+        return digests
+    months = month_partition(_timestamps(orders, "created_at"))
+    keys = np.array([f"{order.get('id')}\x1f{order.get('updated_at')}" for order in orders], dtype=object)
+    codes, labels = pd.factorize(months)
+    sums = np.zeros(len(labels), dtype=np.uint64)
+    np.add.at(sums, codes, hash_values(keys))
+    for label, total, count in zip(labels, sums, np.bincount(codes, minlength=len(labels))):
+        entry = digests.setdefault(label, [0, 0])
+        entry[0] = (entry[0] + int(total)) % 2**64
+        entry[1] += int(count)
+    return digests
+
+
+def _merge_digests(digests: dict[str, list[int]], other: dict[str, list[int]]) -> dict[str, list[int]]:
+    for label, (total, count) in other.items():
+        entry = digests.setdefault(label, [0, 0])
+        entry[0] = (entry[0] + total) % 2**64
+        entry[1] += count
+    return digests
+
+
+def _format_digests(digests: dict[str, list[int]]) -> dict[str, str]:
+    return {label: f"{total:016x}.{count}" for label, (total, count) in sorted(digests.items())}
+
+
+def _changed_months(
+    orders_path: Path, previous: dict[str, str], chunk_size: int, exports: ParsedExports
+) -> tuple[list[str], dict[str, str]]:
+    """Months whose order digest differs from `previous` (added and emptied months included), and the new digests."""
+    digests: dict[str, list[int]] = {}
+    for chunk in exports.iter_chunks(orders_path, chunk_size):
+        _month_digests(chunk, digests)
+    current = _format_digests(digests)
+    changed = [label for label in current.keys() | previous.keys() if current.get(label) != previous.get(label)]
+    return sorted(changed), current
+
+
+def _rebuild_partitions(
+    orders_path: Path, marts_dir: Path, partitions: list[str], chunk_size: int, exports: ParsedExports
+) -> int:
+    """Rebuild fact_order_lines and daily_sales for `partitions` from all their orders; returns the order count.
+
+    Emptied months lose their partitions. Only the orders of these months are
+    kept in memory.
+    """
+    wanted = set(partitions)
+    orders = []
+    for chunk in exports.iter_chunks(orders_path, chunk_size):
+        months = month_partition(_timestamps(chunk, "created_at"))
+        orders.extend(order for order, month in zip(chunk, months) if month in wanted)
+    lines = _flatten_order_lines(orders)
+    line_months = month_partition(lines["created_at"])
+    for partition in partitions:
+        part = lines[line_months == partition]
+        if part.empty:
+            for name in PARTITIONED_MARTS:
+                remove_partition(marts_dir, name, partition)
+            continue
+        part = part.reset_index(drop=True)
+        write_partition(part, "fact_order_lines", marts_dir, partition)
+        write_partition(_daily_sales(part), "daily_sales", marts_dir, partition)
+    return len(orders)
+
+
+def _build_order_marts(
+    orders_path: Path, marts_dir: Path, chunk_size: int, exports: ParsedExports
+) -> tuple[list[str], dict[str, list[int]]]:
+    """Full build of fact_order_lines and daily_sales, streaming orders `chunk_size` at a time.
+
+    Each chunk is flattened and appended to its month partitions, so at most a
+    chunk of orders is in memory. daily_sales is then computed per month from
+    the few fact columns it needs.
+    """
+    digests: dict[str, list[int]] = {}
+    with MartWriter(marts_dir, "fact_order_lines") as fact_writer:
+        for chunk in profile_iter("parse", exports.iter_chunks(orders_path, chunk_size), rows=len):
+            with stage("flatten") as flattened:
+                lines = _flatten_order_lines(chunk)
+                _month_digests(chunk, digests)
+                flattened.add_rows(len(lines))
+            with stage("write", rows=len(lines)):
+                fact_writer.write(lines)
+
+    with stage("daily_sales"), MartWriter(marts_dir, "daily_sales") as daily_writer:
+        for partition in list_partitions(marts_dir, "fact_order_lines"):
+            lines = read_partition(marts_dir, "fact_order_lines", partition, DAILY_COLUMNS)
+            daily_writer.write(_daily_sales(lines))
+    return list_partitions(marts_dir, "fact_order_lines"), digests
+
+
+def _flatten_shard(shard: int, payload: bytes | list[dict[str, Any]], shard_dir: str) -> dict[str, list[int]]:
+    """Map step of a parallel build: flatten one block of orders into per-month shard files.
+
+    Runs in a worker process. NDJSON blocks arrive undecoded so parsing happens
+    here too. Writes `<month>/fact-<shard>.parquet` plus a daily_sales partial
+    next to it, and returns the block's month digests.
+    """
+    orders = decode_ndjson(payload) if isinstance(payload, bytes) else payload
+    lines = _flatten_order_lines(orders)
+    for month, part in lines.groupby(month_partition(lines["created_at"]), sort=False):
+        month_dir = Path(shard_dir) / str(month)
+        month_dir.mkdir(exist_ok=True)
+        pq.write_table(mart_table(part, "fact_order_lines"), month_dir / f"fact-{shard:06d}.parquet")
+        _daily_partial(part).to_parquet(month_dir / f"daily-{shard:06d}.parquet", index=False)
+    return _month_digests(orders)
+
+
+def _build_order_marts_parallel(
+    orders_path: Path, marts_dir: Path, chunk_size: int, workers: int, exports: ParsedExports
+) -> tuple[list[str], dict[str, list[int]]]:
+    """Full build of fact_order_lines and daily_sales sharded across `workers` processes.
+
+    Orders are cut into blocks of `chunk_size` and flattened in a process pool
+    into intermediate Parquet shards (map). Each month's shards are then
+    appended to its partition in shard order, and the daily_sales partials are
+    combined (reduce). At most two blocks per worker are in flight.
+    """
+    if is_ndjson(orders_path) and exports.cached(orders_path) is None:
+        payloads: Iterable[bytes | list[dict[str, Any]]] = iter_ndjson_blocks(orders_path, chunk_size)
+    else:
+        # Already decoded, or a JSON array that must be decoded to find record boundaries.
+        payloads = exports.iter_chunks(orders_path, chunk_size)
+
+    shard_dir = Path(tempfile.mkdtemp(prefix=".shards-", dir=marts_dir))
+    digests: dict[str, list[int]] = {}
+    try:
+        with stage("map"), ProcessPoolExecutor(max_workers=workers) as pool:
+            in_flight: set[Future[dict[str, list[int]]]] = set()
+            for shard, payload in enumerate(profile_iter("read", payloads)):
+                in_flight.add(pool.submit(_flatten_shard, shard, payload, str(shard_dir)))
+                if len(in_flight) >= workers * 2:
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        _merge_digests(digests, future.result())
+            for future in in_flight:
+                _merge_digests(digests, future.result())
+
+        with stage("reduce"), MartWriter(marts_dir, "fact_order_lines") as fact_writer, MartWriter(
+            marts_dir, "daily_sales"
+        ) as daily_writer:
+            for month_dir in sorted(shard_dir.iterdir()):
+                for shard_file in sorted(month_dir.glob("fact-*.parquet")):
+                    fact_writer.write_table(pq.read_table(shard_file), month_dir.name)
+                partials = [pd.read_parquet(path) for path in sorted(month_dir.glob("daily-*.parquet"))]
+                daily_writer.write(_combine_daily_partials(partials))
+            partitions = sorted(month_dir.name for month_dir in shard_dir.iterdir())
+    finally:
+        shutil.rmtree(shard_dir, ignore_errors=True)
+    return partitions, digests
+
+
+def _build_dimension(
+    path: Path,
+    marts_dir: Path,
+    name: str,
+    flatten: Callable[[list[dict[str, Any]]], pd.DataFrame],
+    chunk_size: int,
+    exports: ParsedExports,
+) -> None:
+    with MartWriter(marts_dir, name) as writer:
+        for chunk in profile_iter("parse", exports.iter_chunks(path, chunk_size), rows=len):
+            with stage("flatten", rows=len(chunk)):
+                writer.write(flatten(chunk))
+
+
+def _build_rollups(marts_dir: Path, vendors: pd.Series, partitions: list[str] | None) -> None:
+    """Rebuild the rollups for `partitions` (every month when None) from fact_order_lines.
+
+    rollup_weekly is not partitioned (weeks cross months) and is always re-summed
+    from the whole of rollup_daily, which is far smaller than the order lines.
+    """
+    if partitions is None:
+        with MartWriter(marts_dir, "rollup_daily") as daily_writer, MartWriter(
+            marts_dir, "rollup_monthly"
+        ) as monthly_writer:
+            for partition in list_partitions(marts_dir, "fact_order_lines"):
+                lines = read_partition(marts_dir, "fact_order_lines", partition, ROLLUP_SOURCE_COLUMNS)
+                daily = _daily_rollup(lines, vendors)
+                daily_writer.write(daily)
+                monthly_writer.write(_coarser_rollup(daily, "rollup_monthly"))
     else:
-        daily_sales = pd.DataFrame(columns=["order_date", "revenue", "units_sold", "orders", "active_customers"])
+        for partition in partitions:
+            lines = read_partition(marts_dir, "fact_order_lines", partition, ROLLUP_SOURCE_COLUMNS)
+            daily = _daily_rollup(lines, vendors)
+            if daily.empty:
+                for name in ("rollup_daily", "rollup_monthly"):
+                    remove_partition(marts_dir, name, partition)
+                continue
+            write_partition(daily, "rollup_daily", marts_dir, partition)
+            write_partition(_coarser_rollup(daily, "rollup_monthly"), "rollup_monthly", marts_dir, partition)
+    weekly = _coarser_rollup(read_mart(marts_dir, "rollup_daily"), "rollup_weekly")
+    write_mart(weekly, "rollup_weekly", marts_dir)
+
+
+def _file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as handle:
+        while block := handle.read(HASH_BLOCK_SIZE):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _builder_version() -> str:
+    """Layout version plus a hash of the builder code, so any code change invalidates the cache."""
+    digest = hashlib.sha256()
+    for module in BUILDER_MODULES:
+        digest.update((Path(__file__).parent / module).read_bytes())
+    return f"{MARTS_LAYOUT_VERSION}.{digest.hexdigest()[:12]}"
+
+
+def _fingerprint_inputs(data_dir: Path, previous: dict[str, Any]) -> dict[str, dict[str, Any]]:
+    """Name, size, mtime and SHA-256 of each export.
+
+    The hash recorded last time is reused while name, size and mtime are
+    unchanged, so checking an untouched data folder costs three `stat` calls.
+    """
+    inputs = {}
+    for stem in INPUT_STEMS:
+        path = resolve_export(data_dir, stem)
+        stat = path.stat()
+        entry: dict[str, Any] = {"path": path.name, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+        known = previous.get(stem, {})
+        unchanged = "sha256" in known and all(known.get(key) == value for key, value in entry.items())
+        entry["sha256"] = known["sha256"] if unchanged else _file_sha256(path)
+        inputs[stem] = entry
+    return inputs
+
+
+def _is_up_to_date(
+    marts_dir: Path, metadata: dict[str, Any], inputs: dict[str, dict[str, Any]], write_csv: bool
+) -> bool:
+    def contents(entries: dict[str, Any]) -> dict[str, tuple[Any, Any]]:
+        return {stem: (entry.get("path"), entry.get("sha256")) for stem, entry in entries.items()}
+
+    return (
+        metadata.get("builder_version") == _builder_version()
+        and contents(metadata.get("inputs", {})) == contents(inputs)
+        and (metadata.get("csv", False) or not write_csv)
+        and "row_counts" in metadata
+        and all(mart_exists(marts_dir, name) for name in MART_NAMES)
+        and db_path(marts_dir).exists()
+    )
+
+
+def build_marts(
+    data_dir: Path,
+    write_csv: bool = False,
+    incremental: bool = False,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    workers: int = 1,
+    force: bool = False,
+    exports: ParsedExports | None = None,
+) -> dict[str, int]:
+    """Build the marts in `data_dir/marts`.
+
+    `fact_order_lines` and `daily_sales` are stored as one Parquet file per order
+    month. With `incremental=True`, only the months whose orders were added,
+    removed or given a new `updated_at` since the last build are rebuilt; the
+    rest stay on disk untouched. Each month's digest of (id, updated_at) lives
+    in `marts/_metadata.json`. Without stored digests the build is full.
+    Exports are streamed `chunk_size` records at a time, which bounds peak memory.
+    The marts are then published to `marts/analytics.sqlite` for the dashboard.
+    `workers > 1` shards a full orders build across that many processes.
+    Rollups at day/week/month x variant x vendor x financial_status are rebuilt
+    for the same months, or for every month when a variant's vendor changed.
+
+    The build is skipped when the exports' content hashes and the builder
+    version match the ones recorded by the last build, unless `force=True`.
+    Exports already decoded into `exports` (by the quality checks) are read
+    from memory instead of being parsed again.
+    """
+    exports = exports or ParsedExports()
+    orders_path = resolve_export(data_dir, "orders_full")
+    marts_dir = data_dir / "marts"
+    marts_dir.mkdir(parents=True, exist_ok=True)
+    metadata = load_metadata(marts_dir)
+    with stage("fingerprint"):
+        inputs = _fingerprint_inputs(data_dir, metadata.get("inputs", {}))
+    if not force and _is_up_to_date(marts_dir, metadata, inputs, write_csv):
+        if inputs != metadata["inputs"]:
+            # Touched but identical exports: remember the new mtimes so the next check skips hashing.
+            save_metadata(marts_dir, {**metadata, "inputs": inputs})
+        print("Marts are up to date with the exports; skipping the build (use --force to rebuild).")
+        return {**metadata["row_counts"], "partitions_rebuilt": 0}
+
+    previous_months = metadata.get("order_months")
+    can_increment = (
+        incremental
+        and previous_months is not None
+        and metadata.get("layout_version") == MARTS_LAYOUT_VERSION
+        and all((marts_dir / name).is_dir() for name in PARTITIONED_MARTS)
+    )
+
+    with stage("orders"):
+        if can_increment:
+            with stage("changed_months"):
+                partitions_rebuilt, order_months = _changed_months(orders_path, previous_months, chunk_size, exports)
+            with stage("rebuild_partitions") as rebuilt:
+                rebuilt_orders = (
+                    _rebuild_partitions(orders_path, marts_dir, partitions_rebuilt, chunk_size, exports)
+                    if partitions_rebuilt
+                    else 0
+                )
+                rebuilt.add_rows(rebuilt_orders)
+            print(
+                f"Incremental build: {len(partitions_rebuilt)} changed month partitions rebuilt "
+                f"from {rebuilt_orders} orders"
+            )
+        else:
+            if workers > 1:
+                partitions_rebuilt, digests = _build_order_marts_parallel(
+                    orders_path, marts_dir, chunk_size, workers, exports
+                )
+            else:
+                partitions_rebuilt, digests = _build_order_marts(orders_path, marts_dir, chunk_size, exports)
+            order_months = _format_digests(digests)
+
+    for stem, name, flatten in (
+        ("products_full", "dim_products", _flatten_products),
+        ("customers_full", "dim_customers", _flatten_customers),
+    ):
+        with stage(name):
+            _build_dimension(resolve_export(data_dir, stem), marts_dir, name, flatten, chunk_size, exports)
+    vendors = _variant_vendors(marts_dir)
+    vendors_digest = _vendors_digest(vendors)
+    # Rollups carry each variant's vendor, so a vendor change rebuilds all of them.
+    rollup_partitions = (
+        partitions_rebuilt if can_increment and metadata.get("vendors_digest") == vendors_digest else None
+    )
+    with stage("rollups"):
+        _build_rollups(marts_dir, vendors, rollup_partitions)
+    if write_csv:
+        with stage("csv") as exported:
+            for name in MART_NAMES:
+                export_csv(marts_dir, name)
+                exported.add_rows(mart_row_count(marts_dir, name))
+    with stage("publish"):
+        publish_marts(marts_dir, rollup_partitions)
 
-    fact_order_lines.to_csv(marts_dir / "fact_order_lines.csv", index=False)
-    dim_products.to_csv(marts_dir / "dim_products.csv", index=False)
-    dim_customers.to_csv(marts_dir / "dim_customers.csv", index=False)
-    daily_sales.to_csv(marts_dir / "daily_sales.csv", index=False)
+    row_counts = {name: mart_row_count(marts_dir, name) for name in MART_NAMES}
+    # The updated_at watermark of older builds, replaced by the month digests.
+    metadata.pop("orders_updated_at", None)
+    save_metadata(
+        marts_dir,
+        {
+            **metadata,
+            "layout_version": MARTS_LAYOUT_VERSION,
+            "builder_version": _builder_version(),
+            "inputs": inputs,
+            "csv": write_csv,
+            "row_counts": row_counts,
+            "order_months": order_months,
+            "built_at": datetime.now(timezone.utc).isoformat(),
+            "build_mode": "incremental" if can_increment else "full",
+            "vendors_digest": vendors_digest,
+        },
+    )
 
     return {
-        "fact_order_lines": len(fact_order_lines),
-        "dim_products": len(dim_products),
-        "dim_customers": len(dim_customers),
-        "daily_sales": len(daily_sales),
+        **row_counts,
+        "partitions_rebuilt": len(partitions_rebuilt),
     }
 
 
 def main() -> None:
     parser = argparse.ArgumentParser(description="Build analysis-ready marts from Shopify JSON.")
-    parser.add_argument("--data-dir", default="data", help="Directory containing Shopify JSON exports")
+    parser.add_argument("--data-dir", default="data", help="Directory containing Shopify JSON/NDJSON exports")
+    parser.add_argument("--csv", action="store_true", help="Also write each mart as CSV next to the Parquet file")
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=DEFAULT_CHUNK_SIZE,
+        help=f"Records parsed and flattened at a time; bounds peak memory. Default: {DEFAULT_CHUNK_SIZE}",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Processes for a full orders build (NDJSON exports parse in parallel too). Default: 1",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Only rebuild the order-month partitions touched by orders updated since the last build",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Build even if the exports and builder are unchanged since the last build",
+    )
     args = parser.parse_args()
 
-    stats = build_marts(Path(args.data_dir))
+    stats = build_marts(
+        Path(args.data_dir),
+        write_csv=args.csv,
+        incremental=args.incremental,
+        chunk_size=args.chunk_size,
+        workers=args.workers,
+        force=args.force,
+    )
+    partitions_rebuilt = stats.pop("partitions_rebuilt")
     print("Built analytics marts:")
     for name, row_count in stats.items():
         print(f"- {name}: {row_count} rows")
+    print(f"- order-month partitions rebuilt: {partitions_rebuilt}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,95 @@
+from __future__ import annotations
+
+import argparse
+import time
+from pathlib import Path
+from typing import Any
+
+from export_io import COMPRESSIONS, ExportWriter, load_records, resolve_export
+from shopify_sync import EXPORT_FORMATS, FIELD_PROFILES, RESOURCES, project_record
+
+
+def _timed_load(path: Path) -> tuple[list[dict[str, Any]], float]:
+    started = time.perf_counter()
+    records = load_records(path)
+    return records, time.perf_counter() - started
+
+
+def compact_exports(
+    data_dir: Path,
+    export_format: str = "ndjson",
+    compression: str = "gzip",
+    field_profile: str = "analytics",
+) -> list[dict[str, Any]]:
+    """Rewrite the existing exports projected and compressed, and measure what it saved."""
+    suffix = f".{export_format}{COMPRESSIONS[compression]}"
+    report: list[dict[str, Any]] = []
+    for resource, (_, stem) in RESOURCES.items():
+        source = resolve_export(data_dir, stem)
+        if not source.exists():
+            print(f"Skipping {resource}: {source.name} not found")
+            continue
+
+        bytes_before = source.stat().st_size
+        records, parse_before = _timed_load(source)
+        target = data_dir / f"{stem}{suffix}"
+        with ExportWriter(target) as writer:
+            writer.write_page(project_record(resource, record, field_profile) for record in records)
+        del records
+
+        _, parse_after = _timed_load(target)
+        bytes_after = target.stat().st_size
+        report.append(
+            {
+                "resource": resource,
+                "before": source.name,
+                "after": target.name,
+                "bytes_before": bytes_before,
+                "bytes_after": bytes_after,
+                "bytes_saved": bytes_before - bytes_after,
+                "parse_s_before": round(parse_before, 3),
+                "parse_s_after": round(parse_after, 3),
+                "parse_s_saved": round(parse_before - parse_after, 3),
+            }
+        )
+    return report
+
+
+def _mb(value: int) -> str:
+    return f"{value / 1_048_576:,.1f} MB"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Project and compress existing Shopify exports, reporting bytes and parse time saved."
+    )
+    parser.add_argument("--data-dir", default="data", help="Directory containing Shopify JSON/NDJSON exports")
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default="ndjson")
+    parser.add_argument("--compress", choices=tuple(COMPRESSIONS), default="gzip")
+    parser.add_argument("--field-profile", choices=tuple(FIELD_PROFILES), default="analytics")
+    args = parser.parse_args()
+
+    report = compact_exports(
+        Path(args.data_dir),
+        export_format=args.format,
+        compression=args.compress,
+        field_profile=args.field_profile,
+    )
+
+    print("\n=== EXPORT STORAGE REPORT ===")
+    for row in report:
+        ratio = row["bytes_after"] / row["bytes_before"] if row["bytes_before"] else 0
+        print(
+            f"{row['resource']:<10} {row['before']} -> {row['after']}: "
+            f"{_mb(row['bytes_before'])} -> {_mb(row['bytes_after'])} ({ratio:.0%}), "
+            f"parse {row['parse_s_before']:.3f}s -> {row['parse_s_after']:.3f}s"
+        )
+    if report:
+        print(
+            f"Total saved: {_mb(sum(row['bytes_saved'] for row in report))}, "
+            f"{sum(row['parse_s_saved'] for row in report):.3f}s parse time per full read"
+        )
+
+
+if __name__ == "__main__":
+    main()
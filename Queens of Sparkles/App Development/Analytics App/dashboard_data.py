@@ -0,0 +1,265 @@
+from __future__ import annotations
+
+from datetime import date
+from typing import Any, Callable, Sequence
+
+import pandas as pd
+
+from analytics_db import rollup_filter, rollup_slice, slice_filter
+
+# The dashboard's queries and aggregations, kept free of Streamlit so they can be
+# benchmarked (benchmark_scale.py). `run` executes SQL with parameters; the
+# dashboard passes its cached runner, benchmarks a plain `analytics_db.query`.
+Runner = Callable[[str, tuple[Any, ...]], pd.DataFrame]
+
+WEEKDAYS = ["Sunday", "Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday"]
+WEEKDAY_ORDER = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+
+def date_bounds(run: Runner) -> tuple[date, date] | None:
+    """First and last order date (UTC), or None when there are no order lines."""
+    bounds = run(
+        # Two subqueries so SQLite answers each from the created_at index without a scan.
+        "SELECT (SELECT MIN(created_at) FROM fact_order_lines) AS first_at,"
+        " (SELECT MAX(created_at) FROM fact_order_lines) AS last_at",
+        (),
+    ).iloc[0]
+    if pd.isna(bounds["first_at"]):
+        return None
+    return (
+        pd.Timestamp(int(bounds["first_at"]), unit="us", tz="UTC").date(),
+        pd.Timestamp(int(bounds["last_at"]), unit="us", tz="UTC").date(),
+    )
+
+
+def vendor_options(run: Runner) -> list[str]:
+    return run(
+        "SELECT DISTINCT vendor FROM dim_products WHERE vendor IS NOT NULL AND vendor <> '' ORDER BY vendor",
+        (),
+    )["vendor"].tolist()
+
+
+class DashboardSlice:
+    """SQL filters for one date range and vendor selection.
+
+    Sums come from the pre-aggregated rollups; only distinct counts (orders,
+    customers) still read order lines.
+    """
+
+    def __init__(self, start: date, end: date, vendors: Sequence[str]) -> None:
+        where, where_params = slice_filter(start, end, vendors)
+        self.where, self.params = where, tuple(where_params)
+        rollup_where, rollup_where_params = rollup_filter(start, end, vendors)
+        self.rollup_where, self.rollup_params = rollup_where, tuple(rollup_where_params)
+        rollups, rollups_params = rollup_slice(start, end, vendors)
+        self.rollups, self.rollups_params = rollups, tuple(rollups_params)
+        self.customer_orders_sql = f"""
+    SELECT customer_email, COUNT(DISTINCT order_id) AS orders
+    FROM fact_order_lines WHERE {where} AND customer_email IS NOT NULL
+    GROUP BY customer_email
+"""
+
+
+def kpis(run: Runner, selection: DashboardSlice) -> dict[str, Any] | None:
+    """Headline figures and the status mix, or None when the slice has no order lines."""
+    totals = run(
+        f"""
+    SELECT COALESCE(SUM(lines), 0) AS line_count,
+           COALESCE(SUM(revenue), 0) AS revenue,
+           COALESCE(SUM(units_sold), 0) AS units
+    FROM ({selection.rollups})
+    """,
+        selection.rollups_params,
+    ).iloc[0]
+    if not totals["line_count"]:
+        return None
+    counts = run(
+        f"""
+    SELECT COUNT(DISTINCT order_id) AS orders, COUNT(DISTINCT customer_email) AS active_customers
+    FROM fact_order_lines WHERE {selection.where}
+    """,
+        selection.params,
+    ).iloc[0]
+
+    revenue = totals["revenue"]
+    orders = int(counts["orders"])
+    repeat = run(
+        "SELECT COUNT(*) AS customers, COALESCE(SUM(orders >= 2), 0) AS repeat_customers "
+        f"FROM ({selection.customer_orders_sql})",
+        selection.params,
+    ).iloc[0]
+    status_mix = run(
+        f"""
+    SELECT financial_status, COUNT(DISTINCT order_id) AS order_id
+    FROM fact_order_lines WHERE {selection.where} AND financial_status IS NOT NULL
+    GROUP BY financial_status ORDER BY order_id DESC
+    """,
+        selection.params,
+    )
+    return {
+        "revenue": revenue,
+        "orders": orders,
+        "units": totals["units"],
+        "active_customers": int(counts["active_customers"]),
+        "aov": revenue / orders if orders else 0,
+        "repeat_customer_rate": repeat["repeat_customers"] / repeat["customers"] if repeat["customers"] else 0,
+        "paid_ratio": (
+            status_mix.loc[status_mix["financial_status"] == "paid", "order_id"].sum()
+            / status_mix["order_id"].sum()
+            if status_mix["order_id"].sum()
+            else 0
+        ),
+        "status_mix": status_mix,
+    }
+
+
+def daily_revenue(run: Runner, selection: DashboardSlice) -> pd.DataFrame:
+    daily = run(
+        f"""
+        SELECT order_date, SUM(revenue) AS line_revenue
+        FROM rollup_daily WHERE {selection.rollup_where}
+        GROUP BY order_date ORDER BY order_date
+        """,
+        selection.rollup_params,
+    )
+    daily["order_date"] = pd.to_datetime(daily["order_date"])
+    return daily
+
+
+def weekday_revenue(run: Runner, selection: DashboardSlice) -> pd.DataFrame:
+    weekday_agg = run(
+        f"""
+            SELECT CAST(strftime('%w', order_date) AS INTEGER) AS weekday, SUM(revenue) AS line_revenue
+            FROM rollup_daily WHERE {selection.rollup_where}
+            GROUP BY weekday
+            """,
+        selection.rollup_params,
+    )
+    weekday_agg["weekday"] = weekday_agg["weekday"].map(lambda day: WEEKDAYS[day])
+    weekday_agg["weekday"] = pd.Categorical(weekday_agg["weekday"], categories=WEEKDAY_ORDER, ordered=True)
+    return weekday_agg.sort_values("weekday")
+
+
+def top_products(run: Runner, selection: DashboardSlice) -> pd.DataFrame:
+    top = run(
+        f"""
+        SELECT product_name, SUM(revenue) AS revenue, SUM(units_sold) AS units
+        FROM ({selection.rollups}) WHERE product_name IS NOT NULL
+        GROUP BY product_name ORDER BY revenue DESC, product_name LIMIT 20
+        """,
+        selection.rollups_params,
+    )
+    # Distinct orders per product need the order lines, but only for these 20 names.
+    names = tuple(top["product_name"])
+    product_orders = run(
+        f"""
+        SELECT product_name, COUNT(DISTINCT order_id) AS orders
+        FROM fact_order_lines WHERE {selection.where} AND product_name IN ({", ".join("?" for _ in names)})
+        GROUP BY product_name
+        """,
+        selection.params + names,
+    )
+    return top.merge(product_orders, on="product_name", how="left")
+
+
+def vendor_performance(run: Runner, selection: DashboardSlice) -> pd.DataFrame:
+    vendor_perf = run(
+        f"""
+        SELECT vendor, SUM(revenue) AS revenue, SUM(units_sold) AS units
+        FROM ({selection.rollups}) WHERE vendor IS NOT NULL
+        GROUP BY vendor ORDER BY revenue DESC
+        """,
+        selection.rollups_params,
+    )
+    vendor_orders = run(
+        f"""
+        SELECT dim_products.vendor AS vendor, COUNT(DISTINCT order_id) AS orders
+        FROM fact_order_lines
+        JOIN dim_products ON dim_products.variant_id = fact_order_lines.variant_id
+        WHERE {selection.where} AND dim_products.vendor IS NOT NULL
+        GROUP BY dim_products.vendor
+        """,
+        selection.params,
+    )
+    return vendor_perf.merge(vendor_orders, on="vendor", how="left")
+
+
+def inventory_risk(run: Runner, now: pd.Timestamp) -> pd.DataFrame:
+    """30-day velocity, days of cover and risk score per variant."""
+    # Floored to the minute so reruns within a minute reuse the cached result.
+    recent_cutoff = (now - pd.Timedelta(days=30)).floor("min")
+    risk = run(
+        """
+        SELECT dim_products.variant_id, product_title, variant_title, sku, inventory_quantity,
+               COALESCE(velocity.units_30d, 0) AS units_30d,
+               COALESCE(velocity.revenue_30d, 0) AS revenue_30d
+        FROM dim_products
+        LEFT JOIN (
+            SELECT variant_id, SUM(quantity) AS units_30d, SUM(line_revenue) AS revenue_30d
+            FROM fact_order_lines WHERE created_at >= ? AND variant_id IS NOT NULL
+            GROUP BY variant_id
+        ) AS velocity ON velocity.variant_id = dim_products.variant_id
+        """,
+        (recent_cutoff.value // 1000,),
+    )
+    risk["days_of_cover"] = risk.apply(
+        lambda row: (row["inventory_quantity"] / (row["units_30d"] / 30)) if row["units_30d"] > 0 else 999,
+        axis=1,
+    )
+    risk["risk_score"] = risk.apply(
+        lambda row: row["units_30d"] * 2 - max(row["inventory_quantity"], 0), axis=1
+    )
+    return risk
+
+
+def at_risk_skus(risk: pd.DataFrame) -> pd.DataFrame:
+    return (
+        risk[(risk["units_30d"] > 0) & (risk["inventory_quantity"] <= (risk["units_30d"] * 0.6))]
+        .sort_values(["risk_score", "units_30d"], ascending=False)
+        .head(20)
+    )
+
+
+def customer_performance(run: Runner, selection: DashboardSlice) -> pd.DataFrame:
+    customer_perf = run(
+        f"""
+        SELECT customer_email, SUM(line_revenue) AS revenue, COUNT(DISTINCT order_id) AS orders,
+               SUM(quantity) AS units
+        FROM fact_order_lines WHERE {selection.where} AND customer_email IS NOT NULL
+        GROUP BY customer_email ORDER BY revenue DESC, customer_email LIMIT 50
+        """,
+        selection.params,
+    )
+    customer_perf["segment"] = pd.cut(
+        customer_perf["orders"],
+        bins=[0, 1, 3, 999],
+        labels=["One-time", "Repeat", "Loyal"],
+    )
+    return customer_perf
+
+
+def customer_segments(run: Runner, selection: DashboardSlice) -> pd.DataFrame:
+    # Same bins as customer_performance, counted over every customer in the slice.
+    return run(
+        f"""
+        SELECT segment, COUNT(*) AS customers FROM (
+            SELECT CASE WHEN orders <= 1 THEN 'One-time' WHEN orders <= 3 THEN 'Repeat'
+                        WHEN orders <= 999 THEN 'Loyal' END AS segment
+            FROM ({selection.customer_orders_sql})
+        )
+        WHERE segment IS NOT NULL GROUP BY segment
+        """,
+        selection.params,
+    )
+
+
+# Section name -> loader, in the order the dashboard renders them.
+SECTIONS: dict[str, Callable[[Runner, DashboardSlice], Any]] = {
+    "kpis": kpis,
+    "daily_revenue": daily_revenue,
+    "weekday_revenue": weekday_revenue,
+    "top_products": top_products,
+    "vendor_performance": vendor_performance,
+    "customer_performance": customer_performance,
+    "customer_segments": customer_segments,
+}
@@ -1,11 +1,53 @@
 from __future__ import annotations
 
 import argparse
-import json
+import hashlib
+import heapq
+import inspect
+import os
+import tempfile
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
+from functools import lru_cache
 from datetime import datetime, timedelta, timezone
 from pathlib import Path
-from typing import Any
+from typing import Any, Callable, Iterable
+
+import numpy as np
+import pandas as pd
+
+import json_codec
+from export_io import ParsedExports, resolve_export
+from pipeline_profile import stage
+from sketches import BloomFilter, HyperLogLog, hash_values
+
+EXPORT_STEMS = {"orders": "orders_full", "products": "products_full", "customers": "customers_full"}
+# Tables the checks read besides the exports: one row per nested child record.
+NESTED_TABLES = {"order_lines": ("orders", "line_items"), "variants": ("products", "variants")}
+DEFAULT_CHECK_WORKERS = min(4, os.cpu_count() or 1)
+DEFAULT_SKETCH_ERROR = 0.01
+DEFAULT_SKETCH_MEMORY_MB = 8
+# Ids are converted to strings and hashed this many at a time in sketch mode.
+SKETCH_BATCH_ROWS = 65_536
+# Rough size of one id in the set of flagged ids; it caps that set at the sketch memory.
+FLAGGED_ID_BYTES = 128
+# Per-month counts of the count checks for incremental runs, kept in the data folder.
+QUALITY_STATE_FILE = "_quality_state.json"
+QUALITY_STATE_VERSION = 2
+# The next incremental run recounts months with records updated since this long
+# before the current run, in case the store's clock is ahead of ours.
+QUALITY_WATERMARK_MARGIN = timedelta(minutes=5)
+
+# Data contract (ROADMAP Phase 1): the highest share of missing values each
+# field may have before its null-rate check warns.
+NULL_RATE_LIMITS = {
+    "orders.customer.email": 0.5,
+    "order_lines.variant_id": 0.05,
+    "order_lines.price": 0.0,
+    "variants.inventory_quantity": 0.05,
+    "customers.email": 0.2,
+}
 
 
 @dataclass
@@ -13,10 +55,90 @@ class CheckResult:
     name: str
     passed: bool
     details: str
+    # "error" results decide whether the run passes; "warn" results are only reported.
+    severity: str = "error"
+
+    @property
+    def label(self) -> str:
+        if self.passed:
+            return "PASS"
+        return "FAIL" if self.severity == "error" else "WARN"
+
+
+@dataclass(frozen=True)
+class CheckOptions:
+    max_stale_days: int
+    now: datetime
+    # Set to check duplicate ids with fixed-size sketches instead of exact sets.
+    sketch_error: float | None = None
+    sketch_max_bytes: int = DEFAULT_SKETCH_MEMORY_MB * 1_048_576
+
+
+@dataclass(frozen=True)
+class Check:
+    name: str
+    # "<table>.<column>" inputs; nested keys use dots (`orders.customer.email`).
+    columns: tuple[str, ...]
+    run: Callable[[dict[str, pd.DataFrame], CheckOptions], tuple[bool, str]]
+    severity: str = "error"
+    # Count checks only (register_count_check): totals that add up over any split
+    # of the records, how they are judged, and the columns read in full on every call.
+    count: Callable[[dict[str, pd.DataFrame]], dict[str, int]] | None = None
+    judge: Callable[[dict[str, int]], tuple[bool, str]] | None = None
+    references: tuple[str, ...] = ()
+
+    @property
+    def inputs(self) -> tuple[str, ...]:
+        return self.columns + self.references
+
+
+CHECKS: dict[str, Check] = {}
+
+
+def register_check(
+    name: str, columns: Iterable[str], severity: str = "error"
+) -> Callable[[Callable[..., tuple[bool, str]]], Callable[..., tuple[bool, str]]]:
+    """Add a check to the registry.
+
+    The check receives one DataFrame per table it names, holding only the
+    columns it declared, and returns `(passed, details)`.
+    """
+
+    def decorator(func: Callable[..., tuple[bool, str]]) -> Callable[..., tuple[bool, str]]:
+        CHECKS[name] = Check(name, tuple(columns), func, severity)
+        return func
 
+    return decorator
 
-def _load_json(path: Path) -> list[dict[str, Any]]:
-    return json.loads(path.read_text())
+
+def _all_zero(counts: dict[str, int]) -> tuple[bool, str]:
+    return not any(counts.values()), " ".join(f"{name}={count}" for name, count in counts.items())
+
+
+def register_count_check(
+    name: str,
+    columns: Iterable[str],
+    severity: str = "error",
+    references: Iterable[str] = (),
+    judge: Callable[[dict[str, int]], tuple[bool, str]] = _all_zero,
+) -> Callable[[Callable[..., dict[str, int]]], Callable[..., dict[str, int]]]:
+    """Add a check that is a sum of per-record counts.
+
+    The decorated function returns named counts over the rows it is given;
+    `judge` turns their totals into `(passed, details)` and by default wants
+    every count at 0. Because totals add up, incremental runs only count the
+    records that changed. `references` (e.g. the known variant ids) are always
+    passed in full and are not split.
+    """
+
+    def decorator(count: Callable[..., dict[str, int]]) -> Callable[..., dict[str, int]]:
+        def run(tables: dict[str, pd.DataFrame], options: CheckOptions) -> tuple[bool, str]:
+            return judge(count(tables))
+
+        CHECKS[name] = Check(name, tuple(columns), run, severity, count, judge, tuple(references))
+        return count
+
+    return decorator
 
 
 def _parse_datetime(value: str | None) -> datetime | None:
@@ -28,109 +150,591 @@ def _parse_datetime(value: str | None) -> datetime | None:
         return None
 
 
+def _column(records: list[dict[str, Any]], path: str) -> pd.Series:
+    """One value per record for a dotted key path; missing and blank values become None."""
+    first, *rest = path.split(".")
+    values = [record.get(first) for record in records]
+    for key in rest:
+        values = [value.get(key) if isinstance(value, dict) else None for value in values]
+    return pd.Series([None if value == "" else value for value in values], dtype=object)
+
+
+def _build_table(table: str, columns: set[str], loaded: dict[str, list[dict[str, Any]]]) -> pd.DataFrame:
+    """The declared columns of one table, each built in one pass over the records."""
+    if table in NESTED_TABLES:
+        parent, child_key = NESTED_TABLES[table]
+        records = [child for record in loaded[parent] for child in record.get(child_key) or []]
+    else:
+        records = loaded[table]
+    return pd.DataFrame({column: _column(records, column) for column in columns}, index=pd.RangeIndex(len(records)))
+
+
+def _duplicates(ids: pd.Series) -> int:
+    return int(ids.dropna().astype(str).duplicated().sum())
+
+
+def _id_batches(ids: pd.Series) -> Iterable[np.ndarray]:
+    for start in range(0, len(ids), SKETCH_BATCH_ROWS):
+        # Plain str objects: much cheaper to build than a pandas string column.
+        yield np.array([str(value) for value in ids.iloc[start : start + SKETCH_BATCH_ROWS].dropna()], dtype=object)
+
+
+def _sorted_run_duplicates(ids: pd.Series) -> int:
+    """Exact duplicate count from sorted runs on disk: one batch of ids in memory at a time."""
+    with tempfile.TemporaryDirectory(prefix=".duplicate_ids.") as temp_dir:
+        runs = []
+        for index, batch in enumerate(_id_batches(ids)):
+            run = Path(temp_dir) / f"run_{index:05d}.ndjson"
+            run.write_bytes(b"".join(json_codec.dumps(value) + b"\n" for value in sorted(batch)))
+            runs.append(run.open("rb"))
+        try:
+            duplicates, previous = 0, None
+            for value in heapq.merge(*((json_codec.loads(line) for line in run) for run in runs)):
+                if value == previous:
+                    duplicates += 1
+                previous = value
+        finally:
+            for run in runs:
+                run.close()
+    return duplicates
+
+
+def _sketch_duplicates(ids: pd.Series, options: CheckOptions) -> tuple[int, int, int, int, bool]:
+    """Exact duplicate count without a set of every id.
+
+    A Bloom filter flags ids that may have been seen before; only those are
+    counted exactly in a second pass, so false positives cost time, not
+    accuracy. The flagged ids are kept up to `sketch_max_bytes`; past that the
+    filter is saturated and the ids are counted from sorted runs on disk
+    instead. Returns (duplicates, estimated distinct ids, flagged rows, sketch
+    bytes, saturated).
+    """
+    bloom = BloomFilter(len(ids), options.sketch_error, options.sketch_max_bytes)
+    distinct = HyperLogLog(options.sketch_error)
+    max_flagged = max(options.sketch_max_bytes // FLAGGED_ID_BYTES, 1)
+    flagged: set[str] | None = set()
+    flagged_rows = 0
+    for batch in _id_batches(ids):
+        hashes = hash_values(batch)
+        distinct.add(hashes)
+        maybe_seen = batch[bloom.add(hashes)]
+        flagged_rows += len(maybe_seen)
+        if flagged is not None:
+            flagged.update(maybe_seen)
+            if len(flagged) > max_flagged:
+                flagged = None
+    nbytes = bloom.nbytes + distinct.nbytes
+    if flagged is None:
+        return _sorted_run_duplicates(ids), distinct.count(), flagged_rows, nbytes, True
+    counts: Counter[str] = Counter()
+    if flagged:
+        for batch in _id_batches(ids):
+            counts.update(value for value in batch if value in flagged)
+    duplicates = sum(count - 1 for count in counts.values())
+    return duplicates, distinct.count(), flagged_rows, nbytes, False
+
+
+def _duplicate_ids(ids: pd.Series, label: str, options: CheckOptions) -> tuple[bool, str]:
+    if options.sketch_error is None:
+        count = _duplicates(ids)
+        return count == 0, f"duplicate_{label}_ids={count}"
+    count, distinct, flagged, nbytes, saturated = _sketch_duplicates(ids, options)
+    return count == 0, (
+        f"duplicate_{label}_ids={count} distinct_{label}_ids~{distinct} "
+        f"possible_duplicates={flagged} sketch_kb={nbytes // 1024}" + (" counted_by=sorted_runs" if saturated else "")
+    )
+
+
+def _register_row_count(resource: str) -> None:
+    @register_check(f"{resource}_row_count", [f"{resource}.id"])
+    def row_count(tables: dict[str, pd.DataFrame], options: CheckOptions) -> tuple[bool, str]:
+        rows = len(tables[resource])
+        return rows > 0, f"{resource} rows={rows}"
+
+
+for _resource in EXPORT_STEMS:
+    _register_row_count(_resource)
+
+
+@register_check("orders_duplicate_ids", ["orders.id"])
+def orders_duplicate_ids(tables: dict[str, pd.DataFrame], options: CheckOptions) -> tuple[bool, str]:
+    return _duplicate_ids(tables["orders"]["id"], "order", options)
+
+
+@register_check("customers_duplicate_ids", ["customers.id"])
+def customers_duplicate_ids(tables: dict[str, pd.DataFrame], options: CheckOptions) -> tuple[bool, str]:
+    return _duplicate_ids(tables["customers"]["id"], "customer", options)
+
+
+@register_check("orders_data_freshness", ["orders.created_at"])
+def orders_data_freshness(tables: dict[str, pd.DataFrame], options: CheckOptions) -> tuple[bool, str]:
+    # fromisoformat per value beats pd.to_datetime on timestamps with mixed UTC offsets.
+    created_at = (_parse_datetime(value) for value in tables["orders"]["created_at"].dropna())
+    latest = max((value for value in created_at if value), default=None)
+    if latest is None:
+        return False, "No parseable order created_at timestamps"
+    threshold = options.now - timedelta(days=options.max_stale_days)
+    return latest >= threshold, f"latest_order={latest.isoformat()} threshold={threshold.isoformat()}"
+
+
+def _required(table: str, fields: list[str]) -> Callable[[dict[str, pd.DataFrame]], dict[str, int]]:
+    def count(tables: dict[str, pd.DataFrame]) -> dict[str, int]:
+        frame = tables[table]
+        return {f"missing_{field}": int(frame[field].isna().sum()) for field in fields}
+
+    return count
+
+
+REQUIRED_FIELDS = {
+    "orders": ["id", "created_at", "line_items"],
+    "products": ["id"],
+    "variants": ["id", "product_id"],
+    "customers": ["id"],
+}
+for _table, _fields in REQUIRED_FIELDS.items():
+    register_count_check(f"{_table}_required_fields", [f"{_table}.{field}" for field in _fields])(
+        _required(_table, _fields)
+    )
+
+
+def _null_rates_within_limits(counts: dict[str, int]) -> tuple[bool, str]:
+    over = []
+    for column, limit in NULL_RATE_LIMITS.items():
+        rows = counts[f"rows:{column.split('.', 1)[0]}"]
+        rate = counts[f"nulls:{column}"] / rows if rows else 0.0
+        if rate > limit:
+            over.append(f"{column}={rate:.1%}>{limit:.0%}")
+    return not over, " ".join(over) or f"{len(NULL_RATE_LIMITS)} fields within limits"
+
+
+@register_count_check("null_rates", list(NULL_RATE_LIMITS), severity="warn", judge=_null_rates_within_limits)
+def null_rates(tables: dict[str, pd.DataFrame]) -> dict[str, int]:
+    counts = {f"rows:{table}": len(frame) for table, frame in tables.items()}
+    for column in NULL_RATE_LIMITS:
+        table, field = column.split(".", 1)
+        counts[f"nulls:{column}"] = int(tables[table][field].isna().sum())
+    return counts
+
+
+@register_count_check("order_lines_prices", ["order_lines.price"])
+def order_lines_prices(tables: dict[str, pd.DataFrame]) -> dict[str, int]:
+    # The mart build cannot parse these; blank prices count as 0 there.
+    prices = tables["order_lines"]["price"]
+    given = prices.notna()
+    parsed = pd.to_numeric(prices.where(given), errors="coerce")
+    return {"unparseable_prices": int((given & parsed.isna()).sum()), "negative_prices": int((parsed < 0).sum())}
+
+
+@register_count_check(
+    "order_lines_integrity",
+    ["orders.line_items", "order_lines.quantity", "order_lines.variant_id"],
+    severity="warn",
+    references=["variants.id"],
+)
+def order_lines_integrity(tables: dict[str, pd.DataFrame]) -> dict[str, int]:
+    lines = tables["order_lines"]
+    quantity = pd.to_numeric(lines["quantity"], errors="coerce")
+    known = pd.to_numeric(tables["variants"]["id"], errors="coerce").dropna().unique()
+    variant_ids = pd.to_numeric(lines["variant_id"], errors="coerce").dropna()
+    return {
+        "orders_without_lines": int((tables["orders"]["line_items"].str.len().fillna(0) == 0).sum()),
+        "non_positive_quantities": int((quantity.isna() | (quantity <= 0)).sum()),
+        "unknown_variants": int((~variant_ids.isin(known)).sum()),
+    }
+
+
+def _fields_by_table(columns: Iterable[str]) -> dict[str, set[str]]:
+    fields: dict[str, set[str]] = {}
+    for column in columns:
+        table, field = column.split(".", 1)
+        fields.setdefault(table, set()).add(field)
+    return fields
+
+
+def _columns_by_table(checks: Iterable[Check]) -> dict[str, set[str]]:
+    return _fields_by_table(column for check in checks for column in check.inputs)
+
+
+def _run_check(check: Check, tables: dict[str, pd.DataFrame], options: CheckOptions) -> CheckResult:
+    needed = _columns_by_table([check])
+    inputs = {table: tables[table][sorted(fields)] for table, fields in needed.items()}
+    passed, details = check.run(inputs, options)
+    return CheckResult(check.name, bool(passed), details, check.severity)
+
+
+def _table_export(table: str) -> str:
+    return NESTED_TABLES[table][0] if table in NESTED_TABLES else table
+
+
+def _updated_at(value: Any) -> datetime | None:
+    parsed = _parse_datetime(value) if isinstance(value, str) else None
+    if parsed is not None and parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+class _ExportBuckets:
+    """An export's records grouped by the month of their `created_at`, as written in the export.
+
+    Each bucket's digest is the sum of the hashes of its records' (id,
+    updated_at) pairs plus its row count, so an added, removed or replaced
+    record changes it, and so does an edit with a new `updated_at` of any age.
+    """
+
+    def __init__(self, records: list[dict[str, Any]]) -> None:
+        created_at = (record.get("created_at") for record in records)
+        self.labels = np.array([value[:7] if isinstance(value, str) else "" for value in created_at], dtype=object)
+        updated_at = (record.get("updated_at") for record in records)
+        self.updated_at = np.fromiter(updated_at, dtype=object, count=len(records))
+        # Day of ISO-formatted `updated_at` values, "" for anything else.
+        self.days = np.array(
+            [value[:10] if isinstance(value, str) and value[4:5] == "-" else "" for value in self.updated_at],
+            dtype=object,
+        )
+
+        codes, uniques = pd.factorize(self.labels)
+        keys = [f"{record.get('id')}\x1f{value}" for record, value in zip(records, self.updated_at)]
+        hashes = hash_values(np.array(keys, dtype=object))
+        sums = np.zeros(len(uniques), dtype=np.uint64)
+        np.add.at(sums, codes, hashes)
+        rows = np.bincount(codes, minlength=len(uniques))
+        self.digests = {label: f"{int(total):016x}.{int(count)}" for label, total, count in zip(uniques, sums, rows)}
+
+    def _parsed_from(self, day: str) -> list[tuple[str, datetime | None]]:
+        """(bucket, parsed `updated_at`) of the records not dated before `day`.
+
+        ISO timestamps are compared by their day first: one dated two days before
+        `day` is older whatever its UTC offset, so only recent ones are parsed.
+        """
+        recent = ~((self.days != "") & (self.days < day))
+        return [
+            (label, _updated_at(value))
+            for label, value in zip(self.labels[recent], self.updated_at[recent])
+        ]
+
+    def changed_since(self, watermark: str) -> set[str]:
+        """Buckets holding records updated at or after `watermark`, or without a usable `updated_at`."""
+        floor = datetime.fromisoformat(watermark)
+        stamps = self._parsed_from((floor - timedelta(days=2)).date().isoformat())
+        return {label for label, updated_at in stamps if updated_at is None or updated_at >= floor}
+
+
+@lru_cache(maxsize=None)
+def _source_digest(path: str) -> str:
+    return hashlib.sha256(Path(path).read_bytes()).hexdigest()
+
+
+def _check_version(check: Check) -> str:
+    """Changes when the check's code or inputs change, which drops its stored counts."""
+    source = _source_digest(inspect.getsourcefile(check.count))
+    return hashlib.sha256(repr((QUALITY_STATE_VERSION, source, check.inputs)).encode()).hexdigest()[:16]
+
+
+def _references_digest(check: Check, tables: dict[str, pd.DataFrame]) -> str:
+    digest = hashlib.sha256()
+    for column in check.references:
+        table, field = column.split(".", 1)
+        digest.update(column.encode())
+        digest.update(hash_values(np.array([str(value) for value in tables[table][field]], dtype=object)).tobytes())
+    return digest.hexdigest()[:16]
+
+
+def load_quality_state(data_dir: Path) -> dict[str, Any]:
+    path = data_dir / QUALITY_STATE_FILE
+    state = json_codec.loads(path.read_bytes()) if path.exists() else {}
+    return state if state.get("version") == QUALITY_STATE_VERSION else {"version": QUALITY_STATE_VERSION, "checks": {}}
+
+
+def save_quality_state(data_dir: Path, state: dict[str, Any]) -> None:
+    path = data_dir / QUALITY_STATE_FILE
+    temp_path = path.with_name(f"{path.name}.tmp")
+    temp_path.write_bytes(json_codec.dumps(state, indent=True))
+    temp_path.replace(path)
+
+
+def _count_bucket(
+    check: Check,
+    export: str,
+    label: str,
+    frames: dict[str, pd.DataFrame],
+    positions: dict[str, dict[str, np.ndarray]],
+    references: dict[str, pd.DataFrame],
+) -> dict[str, int]:
+    """The check's counts over one bucket: its export's rows in that month, no rows of other exports."""
+    inputs = {}
+    for table, frame in frames.items():
+        rows = positions[table].get(label, []) if _table_export(table) == export else []
+        inputs[table] = frame.iloc[rows] if len(rows) else frame.iloc[:0]
+    inputs.update(references)
+    return check.count(inputs)
+
+
+def _run_count_check(
+    check: Check,
+    entry: dict[str, Any],
+    dirty: dict[str, set[str]],
+    buckets: dict[str, _ExportBuckets],
+    references_digest: str,
+    tables: dict[str, pd.DataFrame],
+    positions: dict[str, dict[str, np.ndarray]],
+    reference_tables: dict[str, pd.DataFrame],
+    watermark: str,
+) -> tuple[CheckResult, dict[str, Any]]:
+    """Count the dirty buckets, reuse the stored counts of the rest, and judge the totals."""
+    frames = {table: tables[table][sorted(fields)] for table, fields in _fields_by_table(check.columns).items()}
+    references = {
+        table: reference_tables[table][sorted(fields)]
+        for table, fields in _fields_by_table(check.references).items()
+    }
+    stored = entry.get("buckets", {})
+    counted = {}
+    for export, export_buckets in buckets.items():
+        for label, digest in export_buckets.digests.items():
+            key = f"{export}:{label}"
+            if label in dirty[export]:
+                counts = _count_bucket(check, export, label, frames, positions, references)
+            else:
+                counts = stored[key]["counts"]
+            counted[key] = {"digest": digest, "counts": counts}
+    # Counting no rows gives every count's name at 0, in the order the check reports them.
+    totals = _count_bucket(check, "", "", frames, positions, references)
+    for bucket in counted.values():
+        for name, count in bucket["counts"].items():
+            totals[name] = totals.get(name, 0) + count
+    passed, details = check.judge(totals)
+    new_entry = {
+        "version": _check_version(check),
+        "references": references_digest,
+        "watermarks": {export: watermark for export in buckets},
+        "buckets": counted,
+    }
+    return CheckResult(check.name, bool(passed), details, check.severity), new_entry
+
+
+def _bucket_positions(
+    table: str, records: dict[str, list[dict[str, Any]]], labels: dict[str, list[str]]
+) -> dict[str, np.ndarray]:
+    """Row positions of each bucket in a table built from `records`."""
+    export = _table_export(table)
+    if table in NESTED_TABLES:
+        child_key = NESTED_TABLES[table][1]
+        row_labels = [
+            label for record, label in zip(records[export], labels[export]) for _ in record.get(child_key) or []
+        ]
+    else:
+        row_labels = labels[export]
+    return pd.Series(row_labels, dtype=object).groupby(np.asarray(row_labels, dtype=object), sort=False).indices
+
+
+def _run_incremental(
+    checks: list[Check],
+    loaded: dict[str, list[dict[str, Any]]],
+    data_dir: Path,
+    pool: ThreadPoolExecutor,
+    now: datetime,
+) -> dict[str, CheckResult]:
+    """Run count checks over the months with new, changed or removed records only.
+
+    A month is recounted when its (id, updated_at) digest differs, when it holds
+    records updated since the check's last run started (its watermark, less
+    `QUALITY_WATERMARK_MARGIN`), or when the check's code
+    or references changed. Other months reuse the counts in
+    `data_dir/_quality_state.json`.
+    """
+    state = load_quality_state(data_dir)
+    watermark = (now - QUALITY_WATERMARK_MARGIN).isoformat()
+    exports = sorted({_table_export(table) for check in checks for table in _fields_by_table(check.columns)})
+    with stage("buckets", rows=sum(len(loaded[export]) for export in exports)):
+        buckets = {export: _ExportBuckets(loaded[export]) for export in exports}
+        reference_tables = {
+            table: _build_table(table, fields, loaded)
+            for table, fields in _fields_by_table(column for check in checks for column in check.references).items()
+        }
+
+    plans = {}
+    needed: dict[str, set[str]] = {export: set() for export in exports}
+    changed: dict[tuple[str, str], set[str]] = {}
+    for check in checks:
+        entry = state["checks"].get(check.name, {})
+        references_digest = _references_digest(check, reference_tables)
+        reuse = entry.get("version") == _check_version(check) and entry.get("references") == references_digest
+        check_exports = sorted({_table_export(table) for table in _fields_by_table(check.columns)})
+        check_buckets = {export: buckets[export] for export in check_exports}
+        dirty = {}
+        for export, export_buckets in check_buckets.items():
+            previous = entry.get("watermarks", {}).get(export) if reuse else None
+            if previous is None:
+                dirty[export] = set(export_buckets.digests)
+                continue
+            if (export, previous) not in changed:
+                changed[export, previous] = export_buckets.changed_since(previous)
+            stored = entry["buckets"]
+            dirty[export] = changed[export, previous] | {
+                label
+                for label, digest in export_buckets.digests.items()
+                if stored.get(f"{export}:{label}", {}).get("digest") != digest
+            }
+        for export in dirty:
+            needed[export] |= dirty[export]
+        plans[check.name] = (check, entry, dirty, check_buckets, references_digest)
+
+    records = {
+        export: [record for record, label in zip(loaded[export], buckets[export].labels) if label in needed[export]]
+        for export in exports
+    }
+    labels = {export: [label for label in buckets[export].labels if label in needed[export]] for export in exports}
+    with stage("columns") as built:
+        fields = _fields_by_table(column for check in checks for column in check.columns)
+        futures = {table: pool.submit(_build_table, table, fields[table], records) for table in fields}
+        tables = {table: future.result() for table, future in futures.items()}
+        positions = {table: _bucket_positions(table, records, labels) for table in fields}
+        built.add_rows(sum(len(frame) for frame in tables.values()))
+    with stage("count", rows=sum(len(export_records) for export_records in records.values())):
+        outcomes = {
+            name: pool.submit(_run_count_check, *plan, tables, positions, reference_tables, watermark)
+            for name, plan in plans.items()
+        }
+        results = {}
+        for name, outcome in outcomes.items():
+            results[name], state["checks"][name] = outcome.result()
+    save_quality_state(data_dir, state)
+    return results
+
+
 def run_quality_checks(
     data_dir: Path,
     max_stale_days: int = 3,
     check_freshness: bool = True,
+    exports: ParsedExports | None = None,
+    checks: Iterable[str] | None = None,
+    workers: int = DEFAULT_CHECK_WORKERS,
+    sketch_error: float | None = None,
+    sketch_memory_mb: float = DEFAULT_SKETCH_MEMORY_MB,
+    incremental: bool = False,
 ) -> tuple[list[CheckResult], bool]:
-    files = {
-        "orders": data_dir / "orders_full.json",
-        "products": data_dir / "products_full.json",
-        "customers": data_dir / "customers_full.json",
-    }
+    """Run the registered checks (or only `checks`) over the exports in `data_dir`.
+
+    Each table is built once with the union of the columns the selected checks
+    declare, so a new check adds at most a column, not a pass over the data.
+    Tables are built and checks run on `workers` threads. Pass a shared
+    `exports` to keep the decoded records for the next step of the run (the
+    mart build) instead of parsing the files again. Only "error" results
+    decide the returned pass flag. With `sketch_error`, duplicate ids are
+    found with a Bloom filter of at most `sketch_memory_mb` (see
+    `_sketch_duplicates`), and distinct ids are estimated with HyperLogLog.
 
+    With `incremental=True`, count checks (see `register_count_check`) only
+    count the months with records added or changed since the last run and
+    add the counts stored for the others (`_run_incremental`). The other
+    checks (row counts, duplicate ids, freshness) still run over every record.
+    The results are the same as a full run.
+    """
+    exports = exports or ParsedExports()
     results: list[CheckResult] = []
     loaded: dict[str, list[dict[str, Any]]] = {}
 
-    for key, path in files.items():
+    for key, stem in EXPORT_STEMS.items():
+        path = resolve_export(data_dir, stem)
         if not path.exists():
             results.append(CheckResult(f"{key}_file_exists", False, f"Missing file: {path}"))
             continue
-        loaded[key] = _load_json(path)
+        with stage(f"load_{key}") as record:
+            loaded[key] = exports.load(path)
+            record.add_rows(len(loaded[key]))
         results.append(CheckResult(f"{key}_file_exists", True, f"Found {path.name}"))
 
-    if len(loaded) != len(files):
+    if len(loaded) != len(EXPORT_STEMS):
         return results, False
 
-    for key, rows in loaded.items():
-        results.append(
-            CheckResult(
-                f"{key}_row_count",
-                len(rows) > 0,
-                f"{key} rows={len(rows)}",
-            )
-        )
-
-    order_ids = [str(order.get("id")) for order in loaded["orders"] if order.get("id")]
-    dup_order_count = len(order_ids) - len(set(order_ids))
-    results.append(
-        CheckResult(
-            "orders_duplicate_ids",
-            dup_order_count == 0,
-            f"duplicate_order_ids={dup_order_count}",
-        )
+    selected = [CHECKS[name] for name in (checks if checks is not None else CHECKS)]
+    skipped = set() if check_freshness else {"orders_data_freshness"}
+    to_run = [check for check in selected if check.name not in skipped]
+    options = CheckOptions(
+        max_stale_days, datetime.now(timezone.utc), sketch_error, round(sketch_memory_mb * 1_048_576)
     )
 
-    customer_ids = [str(customer.get("id")) for customer in loaded["customers"] if customer.get("id")]
-    dup_customer_count = len(customer_ids) - len(set(customer_ids))
-    results.append(
-        CheckResult(
-            "customers_duplicate_ids",
-            dup_customer_count == 0,
-            f"duplicate_customer_ids={dup_customer_count}",
-        )
-    )
+    counted = [check for check in to_run if incremental and check.count is not None]
+    full = [check for check in to_run if not (incremental and check.count is not None)]
+
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as pool:
+        with stage("columns") as built:
+            futures = {
+                table: pool.submit(_build_table, table, fields, loaded)
+                for table, fields in _columns_by_table(full).items()
+            }
+            tables = {table: future.result() for table, future in futures.items()}
+            built.add_rows(sum(len(frame) for frame in tables.values()))
+        with stage("run_checks", rows=len(full)):
+            outcomes = {check.name: pool.submit(_run_check, check, tables, options) for check in full}
+            finished = {name: outcome.result() for name, outcome in outcomes.items()}
+        if counted:
+            with stage("incremental"):
+                finished.update(_run_incremental(counted, loaded, data_dir, pool, options.now))
 
-    if check_freshness:
-        created_dates = [_parse_datetime(order.get("created_at")) for order in loaded["orders"]]
-        created_dates = [date for date in created_dates if date]
-        if created_dates:
-            max_created_at = max(created_dates)
-            stale_threshold = datetime.now(timezone.utc) - timedelta(days=max_stale_days)
-            is_fresh = max_created_at >= stale_threshold
-            results.append(
-                CheckResult(
-                    "orders_data_freshness",
-                    is_fresh,
-                    f"latest_order={max_created_at.isoformat()} threshold={stale_threshold.isoformat()}",
-                )
-            )
+    for check in selected:
+        if check.name in skipped:
+            results.append(CheckResult(check.name, True, "Freshness check skipped"))
         else:
-            results.append(CheckResult("orders_data_freshness", False, "No parseable order created_at timestamps"))
-    else:
-        results.append(
-            CheckResult(
-                "orders_data_freshness",
-                True,
-                "Freshness check skipped",
-            )
-        )
+            results.append(finished[check.name])
 
-    all_passed = all(result.passed for result in results)
+    all_passed = all(result.passed for result in results if result.severity == "error")
     return results, all_passed
 
 
 def main() -> None:
     parser = argparse.ArgumentParser(description="Data quality gate for local Shopify analytics JSON.")
-    parser.add_argument("--data-dir", default="data", help="Directory containing Shopify JSON exports")
+    parser.add_argument("--data-dir", default="data", help="Directory containing Shopify JSON/NDJSON exports")
     parser.add_argument("--max-stale-days", type=int, default=3, help="Allowed staleness window for latest order")
     parser.add_argument(
         "--skip-freshness-check",
         action="store_true",
         help="Skip order freshness validation when using intentionally static local datasets.",
     )
+    parser.add_argument("--checks", nargs="+", choices=tuple(CHECKS), help="Run only these checks")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=DEFAULT_CHECK_WORKERS,
+        help=f"Threads for building columns and running checks. Default: {DEFAULT_CHECK_WORKERS}",
+    )
+    parser.add_argument(
+        "--sketch",
+        action="store_true",
+        help="Find duplicate ids with a fixed-size Bloom filter (confirmed exactly) and estimate distinct ids",
+    )
+    parser.add_argument(
+        "--sketch-error",
+        type=float,
+        default=DEFAULT_SKETCH_ERROR,
+        help=f"Bloom false-positive rate and HyperLogLog error for --sketch. Default: {DEFAULT_SKETCH_ERROR}",
+    )
+    parser.add_argument(
+        "--sketch-memory-mb",
+        type=float,
+        default=DEFAULT_SKETCH_MEMORY_MB,
+        help=f"Largest Bloom filter per id column for --sketch. Default: {DEFAULT_SKETCH_MEMORY_MB}",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help=f"Only count records added or changed since the last run; the counts are kept in {QUALITY_STATE_FILE}",
+    )
     args = parser.parse_args()
 
     results, all_passed = run_quality_checks(
         Path(args.data_dir),
         max_stale_days=args.max_stale_days,
         check_freshness=not args.skip_freshness_check,
+        checks=args.checks,
+        workers=args.workers,
+        sketch_error=args.sketch_error if args.sketch else None,
+        sketch_memory_mb=args.sketch_memory_mb,
+        incremental=args.incremental,
     )
 
     print("\n=== DATA QUALITY REPORT ===")
     for result in results:
-        status = "PASS" if result.passed else "FAIL"
-        print(f"[{status}] {result.name}: {result.details}")
+        print(f"[{result.label}] {result.name}: {result.details}")
 
     if not all_passed:
         raise SystemExit("\nData quality checks failed. Fix data inputs before launching dashboard.")
@@ -0,0 +1,311 @@
+from __future__ import annotations
+
+import gzip
+import io
+import itertools
+import json
+import os
+import re
+import shutil
+import tempfile
+from pathlib import Path
+from typing import IO, Any, Iterable, Iterator
+
+import json_codec
+
+try:
+    import zstandard
+except ImportError:  # optional: only needed for .zst exports
+    zstandard = None
+
+COMPRESSIONS = {"none": "", "gzip": ".gz", "zstd": ".zst"}
+
+
+def _default_file_mode() -> int:
+    # os.umask can only be read by setting it, so this runs once at import, before any threads.
+    umask = os.umask(0)
+    os.umask(umask)
+    return 0o666 & ~umask
+
+
+# The mode open() gives a new file. mkstemp creates 0600 temp files, and the
+# rename would carry that over to files that used to be world-readable.
+FILE_MODE = _default_file_mode()
+
+# Bytes of text read at a time when streaming a JSON array export.
+JSON_READ_SIZE = 1 << 20
+_ARRAY_SEPARATOR = re.compile(r"[\s,]*")
+
+# Formats an export can be stored in, in resolution order.
+EXPORT_SUFFIXES = tuple(
+    f"{fmt}{suffix}" for suffix in COMPRESSIONS.values() for fmt in (".ndjson", ".json")
+)
+
+
+def split_export_name(name: str) -> tuple[str, str]:
+    """Split `orders_full.ndjson.gz` into (`orders_full`, `.ndjson.gz`)."""
+    for suffix in sorted(EXPORT_SUFFIXES, key=len, reverse=True):
+        if name.endswith(suffix):
+            return name[: -len(suffix)], suffix
+    raise ValueError(f"Not an export file name: {name}")
+
+
+def sibling_exports(data_dir: Path, stem: str) -> list[Path]:
+    return [data_dir / f"{stem}{suffix}" for suffix in EXPORT_SUFFIXES]
+
+
+def resolve_export(data_dir: Path, stem: str) -> Path:
+    """Return the export for `stem` (e.g. `orders_full`) in whichever format exists.
+
+    Falls back to the legacy `<stem>.json` path when nothing exists yet, so
+    callers can report a sensible missing-file path.
+    """
+    existing = [path for path in sibling_exports(data_dir, stem) if path.exists()]
+    if not existing:
+        return data_dir / f"{stem}.json"
+    return max(existing, key=lambda path: path.stat().st_mtime_ns)
+
+
+def is_ndjson(path: Path) -> bool:
+    return ".ndjson" in path.suffixes
+
+
+def _require_zstandard() -> Any:
+    if zstandard is None:
+        raise RuntimeError("zstd exports need the optional `zstandard` package (pip install zstandard)")
+    return zstandard
+
+
+def open_export(path: Path) -> IO[bytes]:
+    """Open an export for binary reading, decompressing .gz/.zst transparently."""
+    if path.suffix == ".gz":
+        return gzip.open(path, "rb")
+    if path.suffix == ".zst":
+        return _require_zstandard().ZstdDecompressor().stream_reader(path.open("rb"), closefd=True)
+    return path.open("rb")
+
+
+def _iter_json_array(handle: IO[str], read_size: int = JSON_READ_SIZE) -> Iterator[Any]:
+    """Decode the elements of a top-level JSON array one at a time.
+
+    Only a `read_size` window of text (plus the element being decoded) is held
+    in memory, instead of the whole file and its full object graph.
+    """
+    decoder = json.JSONDecoder()
+    buffer, eof = "", False
+    while not buffer and not eof:
+        chunk = handle.read(read_size)
+        buffer, eof = chunk.lstrip(), not chunk
+    if not buffer.startswith("["):
+        raise ValueError("Expected a JSON array export")
+    position = 1
+    while True:
+        position = _ARRAY_SEPARATOR.match(buffer, position).end()
+        if position < len(buffer) and buffer[position] == "]":
+            return
+        try:
+            if position == len(buffer):
+                raise json.JSONDecodeError("Need more data", buffer, position)
+            record, end = decoder.raw_decode(buffer, position)
+            # A number cut at the window edge can decode early (`1.5` of `1.5e10`),
+            # so an element only counts once the separator after it is visible.
+            complete = eof or (end < len(buffer) and buffer[end] in ", \t\r\n]")
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            complete = False
+        if complete:
+            yield record
+            position = end
+            continue
+        more = handle.read(read_size)
+        eof = not more
+        buffer = buffer[position:] + more
+        position = 0
+
+
+def iter_records(path: Path) -> Iterator[dict[str, Any]]:
+    """Stream records from an export without loading the whole file."""
+    with open_export(path) as raw:
+        if is_ndjson(path):
+            for line in raw:
+                if line.strip():
+                    yield json_codec.loads(line)
+        else:
+            # The stdlib decoder is kept here: it is the one that can decode an element mid-buffer.
+            with io.TextIOWrapper(raw, encoding="utf-8") as handle:
+                yield from _iter_json_array(handle)
+
+
+def iter_record_chunks(path: Path, chunk_size: int) -> Iterator[list[dict[str, Any]]]:
+    """Stream records from an export in lists of at most `chunk_size`."""
+    records = iter_records(path)
+    while chunk := list(itertools.islice(records, chunk_size)):
+        yield chunk
+
+
+def decode_ndjson(data: bytes) -> list[dict[str, Any]]:
+    # One decoder call over the joined lines beats a json.loads per line.
+    return json_codec.loads(b"[" + b",".join(line for line in data.splitlines() if line.strip()) + b"]")
+
+
+def iter_ndjson_blocks(path: Path, lines: int) -> Iterator[bytes]:
+    """Yield an NDJSON export as undecoded blocks of `lines` lines.
+
+    Decoding is left to the consumer, so blocks can be parsed in other processes.
+    """
+    with open_export(path) as handle:
+        while block := b"".join(itertools.islice(handle, lines)):
+            yield block
+
+
+def load_records(path: Path) -> list[dict[str, Any]]:
+    with open_export(path) as handle:
+        data = handle.read()
+    if is_ndjson(path):
+        return decode_ndjson(data)
+    return json_codec.loads(data)
+
+
+class ParsedExports:
+    """Exports decoded once per pipeline run and shared by its steps.
+
+    `load()` decodes an export and keeps the records, keyed by the file's
+    path, size and mtime, so an export rewritten in the meantime is decoded
+    again. The `iter_*` methods serve kept records from memory and stream any
+    other export from disk without keeping it, so a step run on its own stays
+    memory-bounded.
+    """
+
+    def __init__(self) -> None:
+        self._records: dict[Path, tuple[tuple[int, int], list[dict[str, Any]]]] = {}
+
+    @staticmethod
+    def _fingerprint(path: Path) -> tuple[int, int]:
+        stat = path.stat()
+        return stat.st_size, stat.st_mtime_ns
+
+    def load(self, path: Path) -> list[dict[str, Any]]:
+        records = self.cached(path)
+        if records is None:
+            records = load_records(path)
+            self._records[path.resolve()] = (self._fingerprint(path), records)
+        return records
+
+    def cached(self, path: Path) -> list[dict[str, Any]] | None:
+        entry = self._records.get(path.resolve())
+        if entry is None or not path.exists() or entry[0] != self._fingerprint(path):
+            return None
+        return entry[1]
+
+    def iter_records(self, path: Path) -> Iterator[dict[str, Any]]:
+        records = self.cached(path)
+        return iter(records) if records is not None else iter_records(path)
+
+    def iter_chunks(self, path: Path, chunk_size: int) -> Iterator[list[dict[str, Any]]]:
+        records = self.cached(path)
+        if records is None:
+            yield from iter_record_chunks(path, chunk_size)
+            return
+        for start in range(0, len(records), chunk_size):
+            yield records[start : start + chunk_size]
+
+    def clear(self) -> None:
+        self._records.clear()
+
+
+def _compress_file(source: Path, target: Path) -> None:
+    if target.suffix == ".gz":
+        with source.open("rb") as src, gzip.open(target, "wb", compresslevel=6) as dst:
+            shutil.copyfileobj(src, dst, 1 << 20)
+    else:
+        compressor = _require_zstandard().ZstdCompressor(level=10)
+        with source.open("rb") as src, target.open("wb") as dst:
+            compressor.copy_stream(src, dst)
+
+
+class ExportWriter:
+    """Append records to an export page by page through a temp file.
+
+    The temp file lives next to the target and is renamed over it on
+    `commit()`, so readers never see a half-written export. `.ndjson` targets
+    get one record per line; `.json` targets get a JSON array written
+    incrementally. Other-format siblings of the target are removed on commit.
+    For `.gz`/`.zst` targets the temp file stays uncompressed (so checkpoints
+    stay byte-addressable) and is compressed once on commit.
+
+    With `keep_partial=True` a failed write keeps the temp file, and
+    `checkpoint()` returns what `ExportWriter.resume()` needs to continue it.
+    """
+
+    def __init__(self, path: Path, keep_partial: bool = False, _resume: dict[str, Any] | None = None) -> None:
+        self.path = path
+        self.keep_partial = keep_partial
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if _resume is None:
+            fd, temp_name = tempfile.mkstemp(prefix=f".{path.name}.", suffix=".tmp", dir=path.parent)
+            self.temp_path = Path(temp_name)
+            self.records_written = 0
+            self._handle = os.fdopen(fd, "wb")
+            if not is_ndjson(path):
+                self._handle.write(b"[")
+        else:
+            self.temp_path = Path(_resume["temp_path"])
+            self.records_written = _resume["records"]
+            self._handle = self.temp_path.open("r+b")
+            self._handle.truncate(_resume["offset"])
+            self._handle.seek(_resume["offset"])
+
+    @classmethod
+    def resume(cls, path: Path, checkpoint: dict[str, Any]) -> "ExportWriter":
+        return cls(path, keep_partial=True, _resume=checkpoint)
+
+    def write_page(self, records: Iterable[dict[str, Any]]) -> None:
+        for record in records:
+            if is_ndjson(self.path):
+                self._handle.write(json_codec.dumps(record))
+                self._handle.write(b"\n")
+            else:
+                self._handle.write(b",\n" if self.records_written else b"\n")
+                self._handle.write(json_codec.dumps(record))
+            self.records_written += 1
+
+    def checkpoint(self) -> dict[str, Any]:
+        """Flush to disk and describe the durable prefix of the temp file."""
+        self._handle.flush()
+        os.fsync(self._handle.fileno())
+        return {"temp_path": str(self.temp_path), "offset": self._handle.tell(), "records": self.records_written}
+
+    def commit(self) -> Path:
+        if not is_ndjson(self.path):
+            self._handle.write(b"\n]\n")
+        self._handle.flush()
+        os.fsync(self._handle.fileno())
+        self._handle.close()
+        if self.path.suffix in {".gz", ".zst"}:
+            compressed = self.temp_path.with_name(f"{self.temp_path.name}{self.path.suffix}")
+            _compress_file(self.temp_path, compressed)
+            self.temp_path.unlink()
+            self.temp_path = compressed
+        os.chmod(self.temp_path, FILE_MODE)
+        os.replace(self.temp_path, self.path)
+        stem, _ = split_export_name(self.path.name)
+        for sibling in sibling_exports(self.path.parent, stem):
+            if sibling != self.path and sibling.exists():
+                sibling.unlink()
+        return self.path
+
+    def abort(self) -> None:
+        if not self._handle.closed:
+            self._handle.close()
+        if not self.keep_partial:
+            self.temp_path.unlink(missing_ok=True)
+
+    def __enter__(self) -> "ExportWriter":
+        return self
+
+    def __exit__(self, exc_type: object, *exc: object) -> None:
+        if exc_type is None:
+            self.commit()
+        else:
+            self.abort()
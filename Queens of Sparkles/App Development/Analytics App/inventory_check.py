@@ -1,11 +1,11 @@
-import json
+from pathlib import Path
 
-# Load data
-with open("products_full.json") as f:
-    products_data = json.load(f)
+from export_io import load_records, resolve_export
 
-with open("orders_full.json") as f:
-    orders_data = json.load(f)
+# Load data (orders_full.json or orders_full.ndjson, etc.)
+products_data = load_records(resolve_export(Path("."), "products_full"))
+
+orders_data = load_records(resolve_export(Path("."), "orders_full"))
 
 
 # Build variant inventory lookup
@@ -0,0 +1,55 @@
+from __future__ import annotations
+
+import json
+from typing import Any
+
+try:
+    import orjson
+except ImportError:  # optional: the fastest backend
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:  # optional: used when orjson is missing
+    msgspec = None
+
+# One JSON codec for exports, API responses and state files. It uses orjson or
+# msgspec when installed (pip install orjson) and the stdlib otherwise. Output
+# is equivalent JSON either way, but only the stdlib adds spaces after
+# separators and escapes non-ASCII, so exact bytes depend on the backend.
+
+BACKENDS = ("orjson", "msgspec", "json")
+
+if orjson is not None:
+    BACKEND = "orjson"
+elif msgspec is not None:
+    BACKEND = "msgspec"
+else:
+    BACKEND = "json"
+
+_ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY if orjson is not None else 0
+_msgspec_encoder = msgspec.json.Encoder() if msgspec is not None else None
+_msgspec_decoder = msgspec.json.Decoder() if msgspec is not None else None
+
+
+def loads(data: bytes | str, backend: str = BACKEND) -> Any:
+    """Decode a JSON document. `backend` is only overridden by the benchmark."""
+    if backend == "orjson":
+        return orjson.loads(data)
+    if backend == "msgspec":
+        return _msgspec_decoder.decode(data)
+    return json.loads(data)
+
+
+def dumps(value: Any, indent: bool = False, backend: str = BACKEND) -> bytes:
+    """Encode `value` as UTF-8 JSON; `indent` pretty-prints with two spaces for files people read."""
+    if backend == "orjson":
+        return orjson.dumps(value, option=_ORJSON_OPTIONS | (orjson.OPT_INDENT_2 if indent else 0))
+    if backend == "msgspec":
+        encoded = _msgspec_encoder.encode(value)
+        return msgspec.json.format(encoded, indent=2) if indent else encoded
+    return json.dumps(value, indent=2 if indent else None).encode("utf-8")
+
+
+def available_backends() -> list[str]:
+    return [name for name, module in zip(BACKENDS, (orjson, msgspec, json)) if module is not None]
@@ -0,0 +1,393 @@
+from __future__ import annotations
+
+import os
+import tempfile
+from pathlib import Path
+from typing import Any, Iterator, Sequence
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import json_codec
+from export_io import FILE_MODE
+
+# Compact representation policy: strings repeated across rows are dictionary-encoded
+# (pandas categoricals), ids are int64 that read back as nullable Int64 instead of
+# float64, and counts that cannot overflow are int32. Money stays float64 because
+# it is summed and multiplied; float32 would lose cents.
+_CATEGORY = pa.dictionary(pa.int32(), pa.string())
+_TIMESTAMP = pa.timestamp("us", tz="UTC")
+
+
+def _rollup_schema(period_column: str) -> pa.Schema:
+    """Revenue/units pre-aggregated at <period> x variant x vendor x financial_status.
+
+    product_name rides along for the dashboard's product chart. `orders` counts
+    distinct orders per row and adds up over periods, since an order has one date.
+    """
+    return pa.schema(
+        [
+            (period_column, pa.date32()),
+            ("variant_id", pa.int64()),
+            ("vendor", _CATEGORY),
+            ("financial_status", _CATEGORY),
+            ("product_name", _CATEGORY),
+            ("revenue", pa.float64()),
+            ("units_sold", pa.int64()),
+            ("lines", pa.int64()),
+            ("orders", pa.int64()),
+        ]
+    )
+
+
+MART_SCHEMAS: dict[str, pa.Schema] = {
+    "fact_order_lines": pa.schema(
+        [
+            ("order_id", pa.int64()),
+            ("created_at", _TIMESTAMP),
+            ("financial_status", _CATEGORY),
+            ("fulfillment_status", _CATEGORY),
+            ("customer_id", pa.int64()),
+            ("customer_email", _CATEGORY),
+            ("product_id", pa.int64()),
+            ("variant_id", pa.int64()),
+            ("sku", _CATEGORY),
+            ("product_name", _CATEGORY),
+            ("variant_name", _CATEGORY),
+            ("quantity", pa.int32()),
+            ("unit_price", pa.float64()),
+            ("line_revenue", pa.float64()),
+        ]
+    ),
+    "dim_products": pa.schema(
+        [
+            ("product_id", pa.int64()),
+            ("product_title", _CATEGORY),
+            ("product_type", _CATEGORY),
+            ("vendor", _CATEGORY),
+            ("variant_id", pa.int64()),
+            ("variant_title", _CATEGORY),
+            ("sku", pa.string()),
+            ("price", pa.float64()),
+            ("inventory_quantity", pa.int32()),
+        ]
+    ),
+    "dim_customers": pa.schema(
+        [
+            ("customer_id", pa.int64()),
+            ("email", pa.string()),
+            ("first_name", _CATEGORY),
+            ("last_name", _CATEGORY),
+            ("orders_count", pa.int32()),
+            ("total_spent", pa.float64()),
+            ("state", _CATEGORY),
+            ("created_at", _TIMESTAMP),
+        ]
+    ),
+    "daily_sales": pa.schema(
+        [
+            ("order_date", pa.date32()),
+            ("revenue", pa.float64()),
+            ("units_sold", pa.int64()),
+            ("orders", pa.int64()),
+            ("active_customers", pa.int64()),
+        ]
+    ),
+    "rollup_daily": _rollup_schema("order_date"),
+    "rollup_weekly": _rollup_schema("week_start"),
+    "rollup_monthly": _rollup_schema("month_start"),
+}
+MART_NAMES = tuple(MART_SCHEMAS)
+
+# These marts are stored as one file per order month under `marts/<name>/`,
+# split on the date column given here.
+PARTITION_COLUMNS = {
+    "fact_order_lines": "created_at",
+    "daily_sales": "order_date",
+    "rollup_daily": "order_date",
+    "rollup_monthly": "month_start",
+}
+PARTITIONED_MARTS = tuple(PARTITION_COLUMNS)
+UNDATED_PARTITION = "undated"
+METADATA_FILE_NAME = "_metadata.json"
+# Rows a MartWriter buffers before appending them to its Parquet files.
+DEFAULT_FLUSH_ROWS = 200_000
+
+
+def mart_path(marts_dir: Path, name: str) -> Path:
+    if name in PARTITIONED_MARTS:
+        return marts_dir / name
+    return marts_dir / f"{name}.parquet"
+
+
+def partition_path(marts_dir: Path, name: str, partition: str) -> Path:
+    return marts_dir / name / f"{partition}.parquet"
+
+
+def list_partitions(marts_dir: Path, name: str) -> list[str]:
+    directory = mart_path(marts_dir, name)
+    return sorted(path.stem for path in directory.glob("*.parquet")) if directory.is_dir() else []
+
+
+def mart_files(marts_dir: Path, name: str) -> list[Path]:
+    """The Parquet files holding a mart: its partitions, or the single file."""
+    path = mart_path(marts_dir, name)
+    if path.is_dir():
+        return sorted(path.glob("*.parquet"))
+    legacy = marts_dir / f"{name}.parquet"
+    return [legacy] if legacy.exists() else []
+
+
+def month_partition(created_at: pd.Series) -> pd.Series:
+    """Partition key (`YYYY-MM`, UTC) for each timestamp; missing dates go to `undated`."""
+    # year * 100 + month, labelled once per distinct month: much cheaper than strftime per row.
+    months = created_at.dt.year * 100 + created_at.dt.month
+    labels = {value: f"{int(value) // 100:04d}-{int(value) % 100:02d}" for value in months.dropna().unique()}
+    return months.map(labels).fillna(UNDATED_PARTITION)
+
+
+_NULLABLE_INTEGERS = {
+    pa.int8(): pd.Int8Dtype(),
+    pa.int16(): pd.Int16Dtype(),
+    pa.int32(): pd.Int32Dtype(),
+    pa.int64(): pd.Int64Dtype(),
+}
+
+
+def _to_pandas(table: pa.Table) -> pd.DataFrame:
+    return table.to_pandas(types_mapper=_NULLABLE_INTEGERS.get)
+
+
+def pandas_dtypes(name: str) -> dict[str, Any]:
+    """The in-memory dtype of each mart column under the compact policy (dates stay objects)."""
+    dtypes: dict[str, Any] = {}
+    for field in MART_SCHEMAS[name]:
+        if pa.types.is_dictionary(field.type):
+            dtypes[field.name] = "category"
+        elif field.type in _NULLABLE_INTEGERS:
+            dtypes[field.name] = _NULLABLE_INTEGERS[field.type]
+        elif pa.types.is_floating(field.type):
+            dtypes[field.name] = field.type.to_pandas_dtype()
+    return dtypes
+
+
+def compact_frame(frame: pd.DataFrame, name: str) -> pd.DataFrame:
+    """Cast a freshly built frame to the mart's compact in-memory dtypes."""
+    return frame.astype({column: dtype for column, dtype in pandas_dtypes(name).items() if column in frame})
+
+
+def empty_mart(name: str) -> pd.DataFrame:
+    return _to_pandas(MART_SCHEMAS[name].empty_table())
+
+
+def mart_table(frame: pd.DataFrame, name: str) -> pa.Table:
+    schema = MART_SCHEMAS[name]
+    return pa.Table.from_pandas(frame[schema.names], schema=schema, preserve_index=False)
+
+
+def _partition_frames(frame: pd.DataFrame, name: str) -> Iterator[tuple[str, pd.DataFrame]]:
+    if name not in PARTITIONED_MARTS:
+        yield "", frame
+        return
+    keys = month_partition(pd.to_datetime(frame[PARTITION_COLUMNS[name]], utc=True))
+    for partition, part in frame.groupby(keys, sort=True):
+        yield str(partition), part
+
+
+def _temp_file(path: Path) -> Path:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, temp_name = tempfile.mkstemp(prefix=f".{path.name}.", suffix=".tmp", dir=path.parent)
+    os.close(fd)
+    # Not mkstemp's 0600, which the rename would keep.
+    os.chmod(temp_name, FILE_MODE)
+    return Path(temp_name)
+
+
+def _write_parquet(frame: pd.DataFrame, name: str, path: Path) -> Path:
+    """Write `frame` with the mart's declared schema through a temp file + rename.
+
+    The rename means the dashboard never reads a half-written file.
+    """
+    table = mart_table(frame, name)
+    temp_path = _temp_file(path)
+    try:
+        pq.write_table(table, temp_path, compression="zstd")
+        os.replace(temp_path, path)
+    except BaseException:
+        temp_path.unlink(missing_ok=True)
+        raise
+    return path
+
+
+class MartWriter:
+    """Write a whole mart chunk by chunk, replacing the previous build on `commit()`.
+
+    Each `write()` appends a frame; partitioned marts are split by order month.
+    Rows are buffered until `flush_rows` is reached and then appended as row
+    groups to one temp Parquet file per output file, so memory stays bounded
+    by the chunk and buffer size. `commit()` renames every temp file into
+    place and, for partitioned marts, removes months that were not written.
+    """
+
+    def __init__(self, marts_dir: Path, name: str, flush_rows: int = DEFAULT_FLUSH_ROWS) -> None:
+        self.marts_dir = marts_dir
+        self.name = name
+        self.flush_rows = flush_rows
+        self.rows_written = 0
+        self._pending: dict[str, list[pa.Table]] = {}
+        self._pending_rows = 0
+        self._writers: dict[str, tuple[pq.ParquetWriter, Path]] = {}
+
+    def _target(self, partition: str) -> Path:
+        if self.name in PARTITIONED_MARTS:
+            return partition_path(self.marts_dir, self.name, partition)
+        return mart_path(self.marts_dir, self.name)
+
+    def write(self, frame: pd.DataFrame) -> None:
+        for partition, part in _partition_frames(frame, self.name):
+            self.write_table(mart_table(part, self.name), partition)
+
+    def write_table(self, table: pa.Table, partition: str = "") -> None:
+        """Append an Arrow table (already in the mart's schema) to one partition."""
+        self._pending.setdefault(partition, []).append(table)
+        self._pending_rows += table.num_rows
+        if self._pending_rows >= self.flush_rows:
+            self.flush()
+
+    def flush(self) -> None:
+        for partition, tables in self._pending.items():
+            if partition not in self._writers:
+                temp_path = _temp_file(self._target(partition))
+                writer = pq.ParquetWriter(temp_path, MART_SCHEMAS[self.name], compression="zstd")
+                self._writers[partition] = (writer, temp_path)
+            table = pa.concat_tables(tables)
+            self._writers[partition][0].write_table(table)
+            self.rows_written += table.num_rows
+        self._pending.clear()
+        self._pending_rows = 0
+
+    def commit(self) -> list[str]:
+        """Publish the written files and return the partitions (months) they cover."""
+        self.flush()
+        if not self._writers and self.name not in PARTITIONED_MARTS:
+            # An empty non-partitioned mart still gets a file with its schema.
+            self._pending[""] = [MART_SCHEMAS[self.name].empty_table()]
+            self.flush()
+        for partition, (writer, temp_path) in self._writers.items():
+            writer.close()
+            os.replace(temp_path, self._target(partition))
+        written = sorted(self._writers)
+        if self.name in PARTITIONED_MARTS:
+            for partition in set(list_partitions(self.marts_dir, self.name)) - set(written):
+                remove_partition(self.marts_dir, self.name, partition)
+            # Drop the single-file copy an older build left behind.
+            (self.marts_dir / f"{self.name}.parquet").unlink(missing_ok=True)
+            mart_path(self.marts_dir, self.name).mkdir(parents=True, exist_ok=True)
+        self._writers.clear()
+        return written
+
+    def abort(self) -> None:
+        for writer, temp_path in self._writers.values():
+            writer.close()
+            temp_path.unlink(missing_ok=True)
+        self._writers.clear()
+        self._pending.clear()
+
+    def __enter__(self) -> "MartWriter":
+        return self
+
+    def __exit__(self, exc_type: object, *exc: object) -> None:
+        if exc_type is None:
+            self.commit()
+        else:
+            self.abort()
+
+
+def write_mart(frame: pd.DataFrame, name: str, marts_dir: Path) -> Path:
+    """Write a whole mart from one frame; partitioned marts are split by order month."""
+    with MartWriter(marts_dir, name) as writer:
+        writer.write(frame)
+    return mart_path(marts_dir, name)
+
+
+def export_csv(marts_dir: Path, name: str) -> Path:
+    """Write `<name>.csv` from the Parquet mart, one file or partition at a time."""
+    files = mart_files(marts_dir, name)
+    csv_path = marts_dir / f"{name}.csv"
+    header = True
+    with csv_path.open("w", newline="") as handle:
+        for file in files:
+            _to_pandas(pq.read_table(file)).to_csv(handle, index=False, header=header)
+            header = False
+        if header:
+            empty_mart(name).to_csv(handle, index=False)
+    return csv_path
+
+
+def write_partition(frame: pd.DataFrame, name: str, marts_dir: Path, partition: str) -> Path:
+    return _write_parquet(frame, name, partition_path(marts_dir, name, partition))
+
+
+def remove_partition(marts_dir: Path, name: str, partition: str) -> None:
+    partition_path(marts_dir, name, partition).unlink(missing_ok=True)
+
+
+def read_partition(
+    marts_dir: Path, name: str, partition: str, columns: Sequence[str] | None = None
+) -> pd.DataFrame:
+    path = partition_path(marts_dir, name, partition)
+    if path.exists():
+        return _to_pandas(pq.read_table(path, columns=list(columns) if columns else None))
+    frame = empty_mart(name)
+    return frame[list(columns)] if columns else frame
+
+
+def mart_exists(marts_dir: Path, name: str) -> bool:
+    return (
+        mart_path(marts_dir, name).exists()
+        or (marts_dir / f"{name}.parquet").exists()
+        or (marts_dir / f"{name}.csv").exists()
+    )
+
+
+def mart_row_count(marts_dir: Path, name: str) -> int:
+    return sum(pq.ParquetFile(file).metadata.num_rows for file in mart_files(marts_dir, name))
+
+
+def read_mart(marts_dir: Path, name: str, columns: Sequence[str] | None = None) -> pd.DataFrame:
+    """Load a mart (all partitions), reading only `columns` when given.
+
+    Falls back to the single-file Parquet or `<name>.csv` an older build left,
+    with timestamp columns parsed the same way.
+    """
+    selected = list(columns) if columns else None
+    path = mart_path(marts_dir, name)
+    if path.is_dir():
+        files = sorted(path.glob("*.parquet"))
+        if not files:
+            frame = empty_mart(name)
+            return frame[selected] if selected else frame
+        tables = [pq.read_table(file, columns=selected) for file in files]
+        return _to_pandas(pa.concat_tables(tables, promote_options="permissive"))
+    legacy = marts_dir / f"{name}.parquet"
+    if legacy.exists():
+        return _to_pandas(pq.read_table(legacy, columns=selected))
+
+    frame = pd.read_csv(marts_dir / f"{name}.csv", usecols=selected)
+    for field in MART_SCHEMAS[name]:
+        if field.name in frame.columns and pa.types.is_timestamp(field.type):
+            frame[field.name] = pd.to_datetime(frame[field.name], errors="coerce", utc=True)
+    return compact_frame(frame, name)
+
+
+def load_metadata(marts_dir: Path) -> dict[str, Any]:
+    path = marts_dir / METADATA_FILE_NAME
+    return json_codec.loads(path.read_bytes()) if path.exists() else {}
+
+
+def save_metadata(marts_dir: Path, metadata: dict[str, Any]) -> None:
+    path = marts_dir / METADATA_FILE_NAME
+    temp_path = path.with_name(f"{path.name}.tmp")
+    temp_path.write_bytes(json_codec.dumps(metadata, indent=True))
+    temp_path.replace(path)
@@ -0,0 +1,530 @@
+from __future__ import annotations
+
+import argparse
+import base64
+import json
+import random
+import re
+import threading
+import time
+from bisect import bisect
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from itertools import accumulate
+from typing import Any, Iterator
+from urllib.parse import parse_qs, urlencode, urlparse
+
+RESOURCE_KEYS = ("orders", "products", "customers")
+_BULK_RESOURCE = re.compile(r"\b(orders|products|customers)\s*[({]")
+
+
+def _iso(value: datetime) -> str:
+    return value.astimezone(timezone.utc).isoformat(timespec="seconds")
+
+
+def _parse_iso(value: str) -> datetime:
+    return datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+
+def _popularity(count: int, skew: float) -> list[float] | None:
+    """Cumulative Zipf weights (rank ** -skew), or None for a uniform pick."""
+    if skew <= 0 or count == 0:
+        return None
+    return list(accumulate((rank + 1) ** -skew for rank in range(count)))
+
+
+def _pick_index(rng: random.Random, count: int, weights: list[float] | None) -> int:
+    if weights is None:
+        return rng.randrange(count)
+    return min(bisect(weights, rng.random() * weights[-1]), count - 1)
+
+
+def iter_dataset(
+    orders: int = 500,
+    products: int = 50,
+    customers: int = 200,
+    seed: int = 7,
+    max_lines_per_order: int = 4,
+    days: int = 700,
+    skew: float = 0.0,
+) -> Iterator[tuple[str, dict[str, Any]]]:
+    """Yield `(resource, record)` for a deterministic store: products, then customers, then orders.
+
+    Records are generated lazily and only the products are kept in memory, so
+    exports far larger than RAM can be streamed to disk. Orders spread over
+    `days` days and have 1 to `max_lines_per_order` lines (3 sizes per product
+    are the SKUs). With `skew > 0`, variants and customers are picked with Zipf
+    weights (rank ** -skew), so a few bestsellers and regulars dominate.
+    """
+    rng = random.Random(seed)
+    start = datetime(2023, 1, 1, tzinfo=timezone.utc)
+
+    variants: list[tuple[dict[str, Any], dict[str, Any]]] = []
+    for index in range(products):
+        product = {
+            "id": 7_000_000 + index,
+            "title": f"Sparkle Dress {index}",
+            "product_type": rng.choice(["Dress", "Top", "Skirt", "Accessory"]),
+            "vendor": rng.choice(["Queen of Sparkles", "Glitter Co", "Sequin Studio"]),
+            "updated_at": _iso(start + timedelta(days=rng.randint(0, days))),
+            "variants": [],
+        }
+        for size_index, size in enumerate(["S", "M", "L"]):
+            variant = {
+                "id": 40_000_000 + index * 10 + size_index,
+                "product_id": product["id"],
+                "title": size,
+                "sku": f"QOS-{index:05d}-{size}",
+                "price": f"{rng.choice([48, 64, 88, 128])}.00",
+                "inventory_quantity": rng.randint(-2, 40),
+                "inventory_item_id": 50_000_000 + index * 10 + size_index,
+            }
+            product["variants"].append(variant)
+            variants.append((product, variant))
+        yield "products", product
+
+    for index in range(customers):
+        created = start + timedelta(days=rng.randint(0, days * 6 // 7))
+        yield "customers", {
+            "id": 6_000_000 + index,
+            "email": f"customer{index}@example.com",
+            "first_name": f"First{index}",
+            "last_name": f"Last{index}",
+            "orders_count": 0,
+            "total_spent": "0.00",
+            "state": "enabled",
+            "created_at": _iso(created),
+            "updated_at": _iso(created + timedelta(days=rng.randint(0, 60))),
+        }
+
+    variant_weights = _popularity(len(variants), skew)
+    customer_weights = _popularity(customers, skew)
+    for index in range(orders):
+        created = start + timedelta(minutes=rng.randint(0, days * 24 * 60))
+        customer = _pick_index(rng, customers, customer_weights) if customers and rng.random() > 0.1 else None
+        line_items = []
+        for _ in range(rng.randint(1, max_lines_per_order)):
+            product, variant = variants[_pick_index(rng, len(variants), variant_weights)]
+            line_items.append(
+                {
+                    "id": 90_000_000 + index * 10 + len(line_items),
+                    "product_id": product["id"],
+                    "variant_id": variant["id"],
+                    "sku": variant["sku"],
+                    "name": f"{product['title']} - {variant['title']}",
+                    "variant_title": variant["title"],
+                    "quantity": rng.randint(1, 3),
+                    "price": variant["price"],
+                }
+            )
+        yield "orders", {
+            "id": 5_000_000 + index,
+            "created_at": _iso(created),
+            "updated_at": _iso(created + timedelta(hours=rng.randint(0, 72))),
+            "financial_status": rng.choice(["paid", "paid", "paid", "refunded", "pending"]),
+            "fulfillment_status": rng.choice(["fulfilled", None]),
+            "customer": {"id": 6_000_000 + customer, "email": f"customer{customer}@example.com"}
+            if customer is not None
+            else None,
+            "line_items": line_items,
+        }
+
+
+def generate_dataset(
+    orders: int = 500,
+    products: int = 50,
+    customers: int = 200,
+    seed: int = 7,
+    **shape: Any,
+) -> dict[str, list[dict[str, Any]]]:
+    """Build a deterministic store with REST-shaped orders, products and customers.
+
+    `shape` takes `iter_dataset`'s max_lines_per_order, days and skew.
+    """
+    dataset: dict[str, list[dict[str, Any]]] = {"orders": [], "products": [], "customers": []}
+    for resource, record in iter_dataset(orders, products, customers, seed, **shape):
+        dataset[resource].append(record)
+    return dataset
+
+
+def _gid(kind: str, value: Any) -> str | None:
+    return f"gid://shopify/{kind}/{value}" if value is not None else None
+
+
+def to_bulk_rows(resource: str, record: dict[str, Any]) -> list[dict[str, Any]]:
+    """Render a REST-shaped record as the JSONL rows a GraphQL bulk operation returns."""
+    if resource == "orders":
+        order_gid = _gid("Order", record["id"])
+        customer = record.get("customer")
+        fulfillment = record.get("fulfillment_status")
+        rows = [
+            {
+                "id": order_gid,
+                "createdAt": record["created_at"],
+                "updatedAt": record["updated_at"],
+                "displayFinancialStatus": (record.get("financial_status") or "").upper() or None,
+                "displayFulfillmentStatus": {"partial": "PARTIALLY_FULFILLED"}.get(
+                    fulfillment, (fulfillment or "unfulfilled").upper()
+                ),
+                "customer": {"id": _gid("Customer", customer["id"]), "email": customer["email"]}
+                if customer
+                else None,
+            }
+        ]
+        for line in record["line_items"]:
+            rows.append(
+                {
+                    "id": _gid("LineItem", line["id"]),
+                    "sku": line["sku"],
+                    "name": line["name"],
+                    "variantTitle": line["variant_title"],
+                    "quantity": line["quantity"],
+                    "originalUnitPriceSet": {"shopMoney": {"amount": line["price"]}},
+                    "product": {"id": _gid("Product", line["product_id"])},
+                    "variant": {"id": _gid("ProductVariant", line["variant_id"])},
+                    "__parentId": order_gid,
+                }
+            )
+        return rows
+    if resource == "products":
+        product_gid = _gid("Product", record["id"])
+        rows = [
+            {
+                "id": product_gid,
+                "title": record["title"],
+                "productType": record["product_type"],
+                "vendor": record["vendor"],
+                "updatedAt": record["updated_at"],
+            }
+        ]
+        for variant in record["variants"]:
+            rows.append(
+                {
+                    "id": _gid("ProductVariant", variant["id"]),
+                    "title": variant["title"],
+                    "sku": variant["sku"],
+                    "price": variant["price"],
+                    "inventoryQuantity": variant["inventory_quantity"],
+                    "inventoryItem": {"id": _gid("InventoryItem", variant["inventory_item_id"])},
+                    "__parentId": product_gid,
+                }
+            )
+        return rows
+    return [
+        {
+            "id": _gid("Customer", record["id"]),
+            "email": record["email"],
+            "firstName": record["first_name"],
+            "lastName": record["last_name"],
+            "numberOfOrders": str(record["orders_count"]),
+            "amountSpent": {"amount": record["total_spent"]},
+            "state": (record.get("state") or "").upper(),
+            "createdAt": record["created_at"],
+            "updatedAt": record["updated_at"],
+        }
+    ]
+
+
+class _Bucket:
+    def __init__(self, capacity: int, leak_rate: float) -> None:
+        self.capacity = capacity
+        self.leak_rate = leak_rate
+        self.used = 0.0
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self) -> tuple[bool, int]:
+        with self.lock:
+            now = time.monotonic()
+            self.used = max(0.0, self.used - (now - self.updated) * self.leak_rate)
+            self.updated = now
+            if self.used + 1 > self.capacity:
+                return False, int(self.used)
+            self.used += 1
+            return True, int(round(self.used))
+
+
+class MockShopify:
+    """Local stand-in for the Shopify Admin API endpoints used by shopify_sync.py.
+
+    Serves `orders.json`, `products.json` and `customers.json` with cursor
+    (`page_info`) pagination via the `Link` header, `updated_at_min` and
+    `created_at_min`/`created_at_max` filtering, `order=<field> asc|desc` sorting,
+    `fields` projection, the `X-Shopify-Shop-Api-Call-Limit` header and 429 +
+    `Retry-After` when the simulated bucket overflows or every `fail_every`-th
+    request. Every response is delayed by `latency_ms` (± `jitter_ms`), and
+    `/_mock/stats` reports request, throttle and byte counters.
+
+    `graphql.json` accepts `bulkOperationRunQuery`, reports the operation as
+    RUNNING for `bulk_polls` status queries and then serves the canned JSONL
+    result for the same dataset under `/bulk/<operation>.jsonl`.
+    """
+
+    def __init__(
+        self,
+        dataset: dict[str, list[dict[str, Any]]] | None = None,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        api_version: str = "2024-10",
+        bucket_size: int = 40,
+        leak_rate: float = 2.0,
+        fail_every: int = 0,
+        retry_after: float = 1.0,
+        bulk_polls: int = 2,
+        latency_ms: float = 0.0,
+        jitter_ms: float = 0.0,
+    ) -> None:
+        self.dataset = dataset if dataset is not None else generate_dataset()
+        self.api_version = api_version
+        self.bucket = _Bucket(bucket_size, leak_rate)
+        self.fail_every = fail_every
+        self.retry_after = retry_after
+        self.bulk_polls = bulk_polls
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.request_count = 0
+        self.throttled_count = 0
+        self.bytes_sent = 0
+        self._count_lock = threading.Lock()
+        self._bulk_operations: dict[str, dict[str, Any]] = {}
+        self._current_bulk: str | None = None
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._thread: threading.Thread | None = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/admin/api/{self.api_version}"
+
+    def start(self) -> "MockShopify":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "MockShopify":
+        return self.start()
+
+    def __exit__(self, *exc: object) -> None:
+        self.stop()
+
+    def _select(self, resource: str, params: dict[str, str]) -> list[dict[str, Any]]:
+        rows = self.dataset[resource]
+        if "updated_at_min" in params:
+            floor = _parse_iso(params["updated_at_min"])
+            rows = [row for row in rows if _parse_iso(row["updated_at"]) >= floor]
+        if "created_at_min" in params:
+            floor = _parse_iso(params["created_at_min"])
+            rows = [row for row in rows if _parse_iso(row["created_at"]) >= floor]
+        if "created_at_max" in params:
+            ceiling = _parse_iso(params["created_at_max"])
+            rows = [row for row in rows if _parse_iso(row["created_at"]) <= ceiling]
+        if "order" in params:
+            field, _, direction = params["order"].partition(" ")
+            rows = sorted(rows, key=lambda row: row[field], reverse=direction.lower() == "desc")
+        return rows
+
+    def _page(self, resource: str, query: dict[str, str]) -> tuple[list[dict[str, Any]], str | None]:
+        limit = min(int(query.get("limit", 50)), 250)
+        if "page_info" in query:
+            cursor = json.loads(base64.urlsafe_b64decode(query["page_info"]))
+            params, offset = cursor["params"], cursor["offset"]
+        else:
+            params = {key: value for key, value in query.items() if key not in {"limit", "status", "fields"}}
+            offset = 0
+
+        rows = self._select(resource, params)
+        page = rows[offset : offset + limit]
+        if "fields" in query:
+            fields = query["fields"].split(",")
+            page = [{key: row[key] for key in fields if key in row} for row in page]
+        if offset + limit >= len(rows):
+            return page, None
+        token = base64.urlsafe_b64encode(
+            json.dumps({"params": params, "offset": offset + limit}).encode()
+        ).decode()
+        return page, urlencode({"limit": limit, "page_info": token})
+
+    def _graphql(self, query: str, host: str) -> dict[str, Any]:
+        with self._count_lock:
+            if "bulkOperationRunQuery" in query:
+                match = _BULK_RESOURCE.search(query.split("bulkOperationRunQuery", 1)[-1])
+                if not match:
+                    error = {"field": ["query"], "message": "Unsupported bulk query"}
+                    return {"data": {"bulkOperationRunQuery": {"bulkOperation": None, "userErrors": [error]}}}
+                operation_id = f"gid://shopify/BulkOperation/{len(self._bulk_operations) + 1}"
+                self._bulk_operations[operation_id] = {"resource": match.group(1), "polls": 0}
+                self._current_bulk = operation_id
+                return {
+                    "data": {
+                        "bulkOperationRunQuery": {
+                            "bulkOperation": {"id": operation_id, "status": "CREATED"},
+                            "userErrors": [],
+                        }
+                    }
+                }
+            if "currentBulkOperation" in query:
+                if self._current_bulk is None:
+                    return {"data": {"currentBulkOperation": None}}
+                operation = self._bulk_operations[self._current_bulk]
+                operation["polls"] += 1
+                done = operation["polls"] > self.bulk_polls
+                number = self._current_bulk.rsplit("/", 1)[-1]
+                return {
+                    "data": {
+                        "currentBulkOperation": {
+                            "id": self._current_bulk,
+                            "status": "COMPLETED" if done else "RUNNING",
+                            "errorCode": None,
+                            "objectCount": str(len(self.dataset[operation["resource"]])) if done else "0",
+                            "url": f"http://{host}/bulk/{number}.jsonl" if done else None,
+                        }
+                    }
+                }
+        return {"errors": [{"message": "Unsupported query for mock server"}]}
+
+    def _delay(self) -> None:
+        if self.latency_ms or self.jitter_ms:
+            delay = self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms)
+            time.sleep(max(0.0, delay) / 1000)
+
+    def _count_bytes(self, size: int) -> None:
+        with self._count_lock:
+            self.bytes_sent += size
+
+    def stats(self) -> dict[str, int]:
+        with self._count_lock:
+            return {
+                "requests": self.request_count,
+                "throttled": self.throttled_count,
+                "bytes_sent": self.bytes_sent,
+            }
+
+    def _bulk_result(self, number: str) -> bytes | None:
+        operation = self._bulk_operations.get(f"gid://shopify/BulkOperation/{number}")
+        if operation is None:
+            return None
+        resource = operation["resource"]
+        lines = [
+            json.dumps(row)
+            for record in self.dataset[resource]
+            for row in to_bulk_rows(resource, record)
+        ]
+        return ("\n".join(lines) + "\n").encode() if lines else b""
+
+    def _handler_class(self) -> type[BaseHTTPRequestHandler]:
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format: str, *args: Any) -> None:
+                return
+
+            def _send_json(self, status: int, payload: Any, headers: dict[str, str] | None = None) -> None:
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(body)
+                mock._count_bytes(len(body))
+
+            def do_POST(self) -> None:
+                if urlparse(self.path).path != f"/admin/api/{mock.api_version}/graphql.json":
+                    self._send_json(404, {"errors": "Not Found"})
+                    return
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+                query = body.get("query", "")
+                variables = body.get("variables") or {}
+                if "query" in variables:
+                    query = f"{query}\n{variables['query']}"
+                mock._delay()
+                self._send_json(200, mock._graphql(query, self.headers.get("Host", "127.0.0.1")))
+
+            def do_GET(self) -> None:
+                parsed = urlparse(self.path)
+                if parsed.path == "/_mock/stats":
+                    self._send_json(200, mock.stats())
+                    return
+                mock._delay()
+                if parsed.path.startswith("/bulk/"):
+                    payload = mock._bulk_result(parsed.path[len("/bulk/") :].removesuffix(".jsonl"))
+                    if payload is None:
+                        self._send_json(404, {"errors": "Not Found"})
+                        return
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/jsonl")
+                    self.send_header("Content-Length", str(len(payload)))
+                    self.end_headers()
+                    self.wfile.write(payload)
+                    mock._count_bytes(len(payload))
+                    return
+
+                prefix = f"/admin/api/{mock.api_version}/"
+                resource = parsed.path[len(prefix) :].removesuffix(".json")
+                if not parsed.path.startswith(prefix) or resource not in RESOURCE_KEYS:
+                    self._send_json(404, {"errors": "Not Found"})
+                    return
+
+                with mock._count_lock:
+                    mock.request_count += 1
+                    forced = mock.fail_every and mock.request_count % mock.fail_every == 0
+                allowed, used = mock.bucket.take()
+                if forced or not allowed:
+                    with mock._count_lock:
+                        mock.throttled_count += 1
+                    self._send_json(
+                        429,
+                        {"errors": "Exceeded 2 calls per second for api client. Reduce request rates to resume uninterrupted service."},
+                        {"Retry-After": f"{mock.retry_after:.1f}"},
+                    )
+                    return
+
+                query = {key: values[-1] for key, values in parse_qs(parsed.query).items()}
+                page, next_query = mock._page(resource, query)
+                headers = {"X-Shopify-Shop-Api-Call-Limit": f"{used}/{mock.bucket.capacity}"}
+                if next_query:
+                    host = self.headers.get("Host", "127.0.0.1")
+                    headers["Link"] = f'<http://{host}{parsed.path}?{next_query}>; rel="next"'
+                self._send_json(200, {resource: page}, headers)
+
+        return Handler
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run a local mock of the Shopify Admin REST API.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--orders", type=int, default=500)
+    parser.add_argument("--products", type=int, default=50)
+    parser.add_argument("--customers", type=int, default=200)
+    parser.add_argument("--bucket-size", type=int, default=40)
+    parser.add_argument("--leak-rate", type=float, default=2.0, help="Calls per second drained from the bucket")
+    parser.add_argument("--fail-every", type=int, default=0, help="Answer every Nth request with a 429")
+    parser.add_argument("--bulk-polls", type=int, default=2, help="Status polls before a bulk operation completes")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Delay added to every response")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="Random +/- variation of the delay")
+    args = parser.parse_args()
+
+    dataset = generate_dataset(orders=args.orders, products=args.products, customers=args.customers)
+    mock = MockShopify(
+        dataset,
+        port=args.port,
+        bucket_size=args.bucket_size,
+        leak_rate=args.leak_rate,
+        fail_every=args.fail_every,
+        bulk_polls=args.bulk_polls,
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+    )
+    print(f"Mock Shopify listening on {mock.base_url}")
+    print(f"Point the sync at it with SHOPIFY_API_BASE_URL={mock.base_url} SHOPIFY_ACCESS_TOKEN=mock")
+    mock._server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,347 @@
+from __future__ import annotations
+
+import argparse
+import os
+import platform
+import sys
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Iterable, Iterator, TypeVar
+
+import json_codec
+
+try:
+    import resource
+except ImportError:  # POSIX only; Windows falls back to psutil
+    resource = None
+
+try:
+    import psutil
+except ImportError:  # optional: peak RSS on Windows
+    psutil = None
+
+# Bump when the run-log layout changes; older logs are then not compared against.
+RUN_LOG_VERSION = 1
+DEFAULT_LOG_DIR = Path("data") / "profiles"
+# A stage is flagged when it got this much slower (or bigger) than in the previous run...
+REGRESSION_RATIO = 1.2
+# ...and by at least this much, so millisecond stages do not flag on noise.
+MIN_REGRESSION_SECONDS = 0.05
+MIN_REGRESSION_MB = 16.0
+# Linux lets a process reset its own peak RSS (VmHWM), which gives per-stage peaks.
+_PROC_STATUS = Path("/proc/self/status")
+_PROC_CLEAR_REFS = Path("/proc/self/clear_refs")
+
+T = TypeVar("T")
+
+
+@dataclass
+class StageRecord:
+    name: str
+    depth: int
+    wall_s: float = 0.0
+    cpu_s: float = 0.0
+    peak_rss_mb: float = 0.0
+    rows: int | None = None
+    calls: int = 0
+
+    def add_rows(self, count: int) -> None:
+        self.rows = (self.rows or 0) + count
+
+    @property
+    def rows_per_s(self) -> float | None:
+        if self.rows is None or not self.wall_s:
+            return None
+        return self.rows / self.wall_s
+
+    def as_dict(self) -> dict[str, Any]:
+        rate = self.rows_per_s
+        return {
+            "name": self.name,
+            "depth": self.depth,
+            "wall_s": round(self.wall_s, 4),
+            "cpu_s": round(self.cpu_s, 4),
+            "peak_rss_mb": round(self.peak_rss_mb, 1),
+            "rows": self.rows,
+            "rows_per_s": round(rate, 1) if rate is not None else None,
+            "calls": self.calls,
+        }
+
+
+def _cpu_seconds() -> float:
+    # Includes finished child processes, so sharded builds (--workers) are counted.
+    times = os.times()
+    return times.user + times.system + times.children_user + times.children_system
+
+
+def _peak_rss_mb() -> float | None:
+    """The process's peak RSS, or None where it cannot be read (Windows without psutil)."""
+    try:
+        for line in _PROC_STATUS.read_text().splitlines():
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    if resource is not None:
+        # ru_maxrss is KiB on Linux and bytes on macOS.
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 1_048_576 if sys.platform == "darwin" else peak / 1024
+    if psutil is not None:
+        memory = psutil.Process().memory_info()
+        # peak_wset is the Windows peak working set; other platforms only report the current RSS.
+        return getattr(memory, "peak_wset", memory.rss) / 1_048_576
+    return None
+
+
+def _reset_peak_rss() -> bool:
+    try:
+        _PROC_CLEAR_REFS.write_text("5")
+    except OSError:
+        return False
+    return True
+
+
+class Profiler:
+    """Records wall time, CPU time, peak RSS and rows for nested pipeline stages.
+
+    Stage names are joined with `/` under their parent (`build/orders/flatten`).
+    Entering a stage with a name already recorded adds to that record, so a
+    stage timed once per chunk ends up as one row with `calls` > 1.
+    """
+
+    def __init__(self, command: str, options: dict[str, Any] | None = None) -> None:
+        self.command = command
+        self.options = options or {}
+        self.started_at = datetime.now(timezone.utc)
+        self.records: dict[str, StageRecord] = {}
+        self._open: list[StageRecord] = []
+        self.stage_peaks = _reset_peak_rss()
+        self.measures_rss = _peak_rss_mb() is not None
+
+    def _fold_peak(self) -> None:
+        peak = _peak_rss_mb()
+        if peak is None:
+            return
+        for record in self._open:
+            record.peak_rss_mb = max(record.peak_rss_mb, peak)
+
+    @contextmanager
+    def stage(self, name: str, rows: int | None = None) -> Iterator[StageRecord]:
+        path = "/".join([*(record.name for record in self._open[-1:]), name])
+        record = self.records.get(path)
+        if record is None:
+            record = self.records[path] = StageRecord(path, len(self._open))
+        if rows is not None:
+            record.add_rows(rows)
+
+        # The peak so far belongs to the enclosing stages; reset it so this one starts from the current RSS.
+        self._fold_peak()
+        if self.stage_peaks:
+            _reset_peak_rss()
+        self._open.append(record)
+        wall_started, cpu_started = time.perf_counter(), _cpu_seconds()
+        try:
+            yield record
+        finally:
+            record.wall_s += time.perf_counter() - wall_started
+            record.cpu_s += _cpu_seconds() - cpu_started
+            record.calls += 1
+            self._fold_peak()
+            self._open.pop()
+
+    def run_log(self) -> dict[str, Any]:
+        return {
+            "version": RUN_LOG_VERSION,
+            "command": self.command,
+            "options": self.options,
+            "started_at": self.started_at.isoformat(),
+            "host": {
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "cpus": os.cpu_count(),
+            },
+            "peak_rss_scope": "stage" if self.stage_peaks else "process" if self.measures_rss else "none",
+            "stages": [record.as_dict() for record in self.records.values()],
+        }
+
+    def save(self, log_dir: Path) -> Path:
+        log_dir.mkdir(parents=True, exist_ok=True)
+        path = log_dir / f"{self.command}-{self.started_at.strftime('%Y%m%d-%H%M%S-%f')}.json"
+        path.write_bytes(json_codec.dumps(self.run_log(), indent=True))
+        return path
+
+
+_active: Profiler | None = None
+
+
+@contextmanager
+def active(profiler: Profiler) -> Iterator[Profiler]:
+    """Send the stages run inside the block to `profiler`."""
+    global _active
+    previous, _active = _active, profiler
+    try:
+        yield profiler
+    finally:
+        _active = previous
+
+
+@contextmanager
+def stage(name: str, rows: int | None = None) -> Iterator[StageRecord]:
+    """Time a stage under the active profiler; a no-op when the run is not profiled."""
+    if _active is None:
+        yield StageRecord(name, 0)
+        return
+    with _active.stage(name, rows) as record:
+        yield record
+
+
+_DONE: Any = object()
+
+
+def profile_iter(name: str, items: Iterable[T], rows: Callable[[T], int] | None = None) -> Iterator[T]:
+    """Yield from `items`, timing each fetch as stage `name` (e.g. parsing the next chunk of an export)."""
+    iterator = iter(items)
+    while True:
+        with stage(name) as record:
+            item = next(iterator, _DONE)
+            if item is not _DONE and rows is not None:
+                record.add_rows(rows(item))
+        if item is _DONE:
+            return
+        yield item
+
+
+def log_files(log_dir: Path, command: str) -> list[Path]:
+    # Timestamped names sort chronologically.
+    return sorted(log_dir.glob(f"{command}-*.json"))
+
+
+def load_run_log(path: Path) -> dict[str, Any]:
+    return json_codec.loads(path.read_bytes())
+
+
+def compare_runs(current: dict[str, Any], previous: dict[str, Any]) -> dict[str, dict[str, Any]]:
+    """Per stage: wall/peak change against `previous`, and whether it counts as a regression."""
+    earlier = {entry["name"]: entry for entry in previous.get("stages", [])}
+    comparison = {}
+    for entry in current["stages"]:
+        before = earlier.get(entry["name"])
+        if before is None:
+            continue
+        wall_change = entry["wall_s"] / before["wall_s"] if before["wall_s"] else None
+        slower = (
+            wall_change is not None
+            and wall_change > REGRESSION_RATIO
+            and entry["wall_s"] - before["wall_s"] > MIN_REGRESSION_SECONDS
+        )
+        # A nested stage's peak includes whatever its parents still hold, so memory is judged at the top.
+        bigger = (
+            entry["depth"] == 0
+            and entry["peak_rss_mb"] > before["peak_rss_mb"] * REGRESSION_RATIO
+            and entry["peak_rss_mb"] - before["peak_rss_mb"] > MIN_REGRESSION_MB
+        )
+        comparison[entry["name"]] = {
+            "previous_wall_s": before["wall_s"],
+            "wall_change": wall_change,
+            "previous_peak_rss_mb": before["peak_rss_mb"],
+            "regression": slower or bigger,
+        }
+    return comparison
+
+
+def _cell(value: float | int | None, spec: str) -> str:
+    return "-" if value is None else format(value, spec)
+
+
+def format_summary(run: dict[str, Any], previous: dict[str, Any] | None = None) -> str:
+    comparison = compare_runs(run, previous) if previous else {}
+    lines = [
+        f"{'stage':<34} {'wall s':>8} {'cpu s':>8} {'peak MB':>8} {'rows':>10} {'rows/s':>10} {'vs prev':>9}"
+    ]
+    for entry in run["stages"]:
+        label = "  " * entry["depth"] + entry["name"].rsplit("/", 1)[-1]
+        if entry["calls"] > 1:
+            label += f" x{entry['calls']}"
+        change = comparison.get(entry["name"], {})
+        delta = ""
+        if change.get("wall_change") is not None:
+            delta = f"{(change['wall_change'] - 1) * 100:+.0f}%"
+        if change.get("regression"):
+            delta += " !"
+        lines.append(
+            f"{label:<34.34} {entry['wall_s']:>8.3f} {entry['cpu_s']:>8.3f} {entry['peak_rss_mb']:>8.1f} "
+            f"{_cell(entry['rows'], ','):>10} {_cell(entry['rows_per_s'], ',.0f'):>10} {delta:>9}"
+        )
+    regressions = [name for name, change in comparison.items() if change["regression"]]
+    if previous:
+        lines.append(f"Compared with the run of {previous['started_at']}.")
+        if previous.get("options") != run.get("options"):
+            lines.append("Note: that run used different options, so the numbers may not be comparable.")
+        if regressions:
+            lines.append(f"Regressions (! above): {', '.join(regressions)}")
+    if run.get("peak_rss_scope") == "none":
+        lines.append("Peak RSS was not measured (on Windows it needs `pip install psutil`).")
+    elif run.get("peak_rss_scope") != "stage":
+        lines.append("Peak RSS is the process high-water mark (per-stage peaks need Linux).")
+    return "\n".join(lines)
+
+
+def _previous_run(log_dir: Path, command: str, options: dict[str, Any]) -> dict[str, Any] | None:
+    """The latest earlier run with the same options, else the latest earlier run."""
+    runs = [load_run_log(path) for path in reversed(log_files(log_dir, command))]
+    runs = [run for run in runs if run.get("version") == RUN_LOG_VERSION]
+    same_options = [run for run in runs if run.get("options") == options]
+    return (same_options or runs or [None])[0]
+
+
+@contextmanager
+def profiling(
+    command: str, log_dir: Path, options: dict[str, Any] | None = None, enabled: bool = True
+) -> Iterator[None]:
+    """Profile the stages run inside the block, then save a run log and print the summary.
+
+    The summary compares every stage with the previous run log of `command` in
+    `log_dir`. With `enabled=False` the stages inside the block are no-ops.
+    """
+    if not enabled:
+        yield
+        return
+    profiler = Profiler(command, options)
+    previous = _previous_run(log_dir, command, profiler.options)
+    try:
+        with active(profiler):
+            yield
+    finally:
+        path = profiler.save(log_dir)
+        print(f"\n=== PIPELINE PROFILE ({command}) ===")
+        print(format_summary(profiler.run_log(), previous))
+        print(f"Run log: {path}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Print and compare pipeline run logs written by --profile.")
+    parser.add_argument(
+        "logs",
+        nargs="*",
+        type=Path,
+        help="A run log to print, optionally followed by an older one to compare it with. "
+        "Default: the latest two logs of --command in --log-dir",
+    )
+    parser.add_argument("--log-dir", type=Path, default=DEFAULT_LOG_DIR, help="Directory with the run logs")
+    parser.add_argument("--command", default="run_local_analytics", help="Which runner's logs to compare")
+    args = parser.parse_args()
+
+    paths = args.logs or list(reversed(log_files(args.log_dir, args.command)[-2:]))
+    if not paths:
+        raise SystemExit(f"No {args.command} run logs in {args.log_dir}. Run it with --profile first.")
+    run = load_run_log(paths[0])
+    previous = load_run_log(paths[1]) if len(paths) > 1 else None
+    print(f"=== PIPELINE PROFILE ({run['command']}, {run['started_at']}) ===")
+    print(format_summary(run, previous))
+
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,8 @@ import sys
 from pathlib import Path
 
 from data_quality_check import run_quality_checks
+from export_io import ParsedExports
+from pipeline_profile import profiling, stage
 
 BASE_DIR = Path(__file__).parent
 
@@ -38,7 +40,35 @@ def main() -> None:
         action="store_true",
         help="Skip all data quality checks and use already-downloaded data as-is.",
     )
+    parser.add_argument(
+        "--full-checks",
+        action="store_true",
+        help="Recount every record in the quality checks instead of only those changed since the last run",
+    )
     parser.add_argument("--build-only", action="store_true", help="Only run mart build")
+    parser.add_argument("--csv", action="store_true", help="Also export the marts as CSV")
+    parser.add_argument(
+        "--full-rebuild",
+        action="store_true",
+        help="Rebuild every order-month partition instead of only those with changed orders",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Processes to shard a full orders build across. Default: 1",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Rebuild the marts even if the exports have not changed since the last build",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Time each stage (wall, CPU, peak RSS, rows/sec), save a run log to data/profiles "
+        "and compare it with the previous one",
+    )
     parser.add_argument(
         "--dashboard-only",
         action="store_true",
@@ -53,24 +83,37 @@ def main() -> None:
 
     data_dir = BASE_DIR / args.data_dir
 
-    if not args.no_checks and not args.dashboard_only and not args.build_only:
-        results, all_passed = run_quality_checks(data_dir, check_freshness=False)
-        for result in results:
-            icon = "PASS" if result.passed else "FAIL"
-            print(f"[{icon}] {result.name}: {result.details}")
-        if not all_passed:
-            raise SystemExit("Data quality checks failed.")
-
-    if args.checks_only:
-        return
-
-    if not args.dashboard_only:
-        from build_analytics_marts import build_marts
-
-        stats = build_marts(data_dir)
-        print(f"Built marts: {stats}")
-
-    if not args.build_only:
+    # Each export is decoded once: the checks keep the records and the build reuses them.
+    exports = ParsedExports()
+    # The dashboard runs until stopped, so the profile covers the stages before it.
+    with profiling("run_local_analytics", data_dir / "profiles", vars(args), enabled=args.profile):
+        if not args.no_checks and not args.dashboard_only and not args.build_only:
+            with stage("checks"):
+                results, all_passed = run_quality_checks(
+                    data_dir, check_freshness=False, exports=exports, incremental=not args.full_checks
+                )
+            for result in results:
+                print(f"[{result.label}] {result.name}: {result.details}")
+            if not all_passed:
+                raise SystemExit("Data quality checks failed.")
+
+        if not args.checks_only and not args.dashboard_only:
+            from build_analytics_marts import build_marts
+
+            with stage("build") as build:
+                stats = build_marts(
+                    data_dir,
+                    write_csv=args.csv,
+                    incremental=not args.full_rebuild,
+                    workers=args.workers,
+                    force=args.force or args.full_rebuild,
+                    exports=exports,
+                )
+                build.add_rows(stats["fact_order_lines"])
+            print(f"Built marts: {stats}")
+        exports.clear()
+
+    if not args.build_only and not args.checks_only:
         launch_dashboard()
 
 
@@ -5,6 +5,7 @@ import subprocess
 import sys
 from pathlib import Path
 
+from pipeline_profile import profiling, stage
 from shopify_sync import sync_shopify_data
 
 BASE_DIR = Path(__file__).parent
@@ -26,6 +27,17 @@ def main() -> None:
     parser.add_argument(
         "--dashboard-only", action="store_true", help="Launch dashboard without syncing first"
     )
+    parser.add_argument(
+        "--full-refresh",
+        action="store_true",
+        help="Re-download every record instead of only those updated since the last sync",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Time the sync (wall, CPU, peak RSS, records/sec), save a run log to data/profiles "
+        "and compare it with the previous one",
+    )
     args = parser.parse_args()
 
     if args.sync_only and args.dashboard_only:
@@ -34,7 +46,10 @@ def main() -> None:
     data_dir = BASE_DIR / "data"
 
     if not args.dashboard_only:
-        sync_shopify_data(data_dir)
+        with profiling("run_qos_analytics", data_dir / "profiles", vars(args), enabled=args.profile):
+            with stage("sync") as sync:
+                stats = sync_shopify_data(data_dir, full_refresh=args.full_refresh)
+                sync.add_rows(sum(stats.values()))
 
     if not args.sync_only:
         launch_dashboard()
@@ -0,0 +1,302 @@
+from __future__ import annotations
+
+import os
+import statistics
+import threading
+import time
+from typing import Any, Iterator, Optional
+from urllib.parse import parse_qs, urlencode, urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import json_codec
+
+DEFAULT_API_VERSION = "2024-10"
+
+
+class CallLimitBucket:
+    """Client-side token bucket mirroring Shopify's REST leaky bucket.
+
+    One instance is shared by every fetch thread. Tokens refill at the
+    bucket's leak rate, are resynced from `X-Shopify-Shop-Api-Call-Limit`
+    after each response, and a 429 `Retry-After` blocks all callers.
+    """
+
+    def __init__(self, capacity: int = 40, leak_rate: Optional[float] = None) -> None:
+        self.capacity = capacity
+        # Shopify leaks 2 calls/s on a 40-call bucket and 20/s on Plus (400).
+        self._derive_leak_rate = leak_rate is None
+        self.leak_rate = capacity / 20 if leak_rate is None else leak_rate
+        self._available = float(capacity)
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self._updated
+        self._available = min(float(self.capacity), self._available + elapsed * self.leak_rate)
+        self._updated = now
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                wait = self._blocked_until - now
+                if wait <= 0:
+                    if self._available >= 1:
+                        self._available -= 1
+                        return
+                    wait = (1 - self._available) / self.leak_rate
+            time.sleep(wait)
+
+    def update_from_headers(self, headers: Any) -> None:
+        header = headers.get("X-Shopify-Shop-Api-Call-Limit")
+        if not header:
+            return
+        try:
+            used, capacity = (int(part) for part in header.split("/", 1))
+        except ValueError:
+            return
+        with self._lock:
+            self._refill(time.monotonic())
+            if capacity != self.capacity:
+                self.capacity = capacity
+                if self._derive_leak_rate:
+                    self.leak_rate = capacity / 20
+            self._available = min(self._available, float(capacity - used))
+
+    def back_off(self, retry_after: float) -> None:
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._available = 0.0
+            self._blocked_until = max(self._blocked_until, now + retry_after)
+
+
+def _retry_after_seconds(response: requests.Response, default: float = 2.0) -> float:
+    try:
+        return float(response.headers.get("Retry-After", default))
+    except ValueError:
+        return default
+
+
+def _missing_params(url: str, params: dict[str, Any]) -> dict[str, Any]:
+    """The entries of `params` whose key is not in `url`'s query string yet."""
+    present = parse_qs(urlparse(url).query, keep_blank_values=True)
+    return {key: value for key, value in params.items() if key not in present}
+
+
+def next_page_url(link_header: str) -> Optional[str]:
+    for part in link_header.split(","):
+        if 'rel="next"' in part:
+            return part.split("<")[1].split(">", 1)[0]
+    return None
+
+
+class ClientMetrics:
+    """Thread-safe per-call latency log for a ShopifyClient."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._calls: list[tuple[str, str, int, float]] = []
+        self.throttled = 0
+
+    def record(self, method: str, url: str, status: int, seconds: float) -> None:
+        path = urlparse(url).path.split("/admin/api/", 1)[-1]
+        with self._lock:
+            self._calls.append((method, path, status, seconds))
+
+    def record_throttle(self) -> None:
+        with self._lock:
+            self.throttled += 1
+
+    @staticmethod
+    def _latency_stats(latencies: list[float]) -> dict[str, float]:
+        ordered = sorted(latencies)
+        return {
+            "calls": len(ordered),
+            "total_s": round(sum(ordered), 3),
+            "p50_ms": round(statistics.median(ordered) * 1000, 1),
+            "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 1),
+            "max_ms": round(ordered[-1] * 1000, 1),
+        }
+
+    def summary(self) -> dict[str, Any]:
+        with self._lock:
+            calls = list(self._calls)
+            throttled = self.throttled
+        if not calls:
+            return {"calls": 0, "throttled": throttled}
+
+        by_endpoint: dict[str, list[float]] = {}
+        for method, path, _, seconds in calls:
+            endpoint = path.split("/", 1)[-1] if "/" in path else path
+            by_endpoint.setdefault(f"{method} {endpoint}", []).append(seconds)
+        return {
+            **self._latency_stats([seconds for *_, seconds in calls]),
+            "errors": sum(1 for _, _, status, _ in calls if status >= 400),
+            "throttled": throttled,
+            "by_endpoint": {name: self._latency_stats(values) for name, values in by_endpoint.items()},
+        }
+
+
+class ShopifyClient:
+    """Pooled Shopify Admin API client for the analytics app and the Shopify Sync scripts.
+
+    One keep-alive `requests.Session` (gzip, urllib3 retry with backoff on
+    5xx/connection errors) is reused for every call, all calls pass through a
+    shared `CallLimitBucket`, and each call's latency is recorded in `metrics`.
+    """
+
+    def __init__(
+        self,
+        shop_domain: Optional[str] = None,
+        access_token: Optional[str] = None,
+        api_version: str = DEFAULT_API_VERSION,
+        base_url: Optional[str] = None,
+        limiter: Optional[CallLimitBucket] = None,
+        pool_size: int = 10,
+        max_retries: int = 3,
+        backoff_factor: float = 0.5,
+        timeout: float = 30,
+        max_throttle_retries: int = 10,
+    ) -> None:
+        if not access_token or not (shop_domain or base_url):
+            raise ValueError("Missing SHOP_DOMAIN or SHOPIFY_ACCESS_TOKEN in .env file")
+        self.base_url = (base_url or f"https://{shop_domain}/admin/api/{api_version}").rstrip("/")
+        self.limiter = limiter or CallLimitBucket()
+        self.metrics = ClientMetrics()
+        self.timeout = timeout
+        self.max_throttle_retries = max_throttle_retries
+
+        # 429s are left to the limiter: Shopify sends fractional Retry-After
+        # values ("2.0") that urllib3 rejects, and the wait must be shared.
+        retry = Retry(
+            total=max_retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=(500, 502, 503, 504),
+            respect_retry_after_header=False,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update(
+            {
+                "X-Shopify-Access-Token": access_token,
+                "Content-Type": "application/json",
+                "Accept-Encoding": "gzip, deflate",
+            }
+        )
+
+    @classmethod
+    def from_env(
+        cls, domain_vars: tuple[str, ...] = ("SHOP_DOMAIN", "SHOPIFY_STORE_DOMAIN"), **kwargs: Any
+    ) -> "ShopifyClient":
+        """Build a client from the first set of `domain_vars`, SHOPIFY_ACCESS_TOKEN, API_VERSION
+        and the optional SHOPIFY_API_BASE_URL override (e.g. mock_shopify_server.py)."""
+        return cls(
+            shop_domain=next((os.environ[name] for name in domain_vars if os.getenv(name)), None),
+            access_token=os.getenv("SHOPIFY_ACCESS_TOKEN"),
+            api_version=os.getenv("API_VERSION", DEFAULT_API_VERSION),
+            base_url=os.getenv("SHOPIFY_API_BASE_URL"),
+            **kwargs,
+        )
+
+    def url(self, path: str, params: Optional[dict[str, Any]] = None) -> str:
+        url = path if path.startswith(("http://", "https://")) else f"{self.base_url}/{path.lstrip('/')}"
+        if params:
+            url = f"{url}{'&' if '?' in url else '?'}{urlencode(params)}"
+        return url
+
+    def request(
+        self, method: str, path: str, params: Optional[dict[str, Any]] = None, **kwargs: Any
+    ) -> requests.Response:
+        """Send one rate-limited call, waiting out up to `max_throttle_retries` 429s in a row.
+
+        Raises RuntimeError when the store is still throttling after that; other
+        errors are left to the caller.
+        """
+        url = self.url(path, params)
+        kwargs.setdefault("timeout", self.timeout)
+        for _ in range(self.max_throttle_retries + 1):
+            self.limiter.acquire()
+            started = time.perf_counter()
+            response = self.session.request(method, url, **kwargs)
+            self.metrics.record(method, url, response.status_code, time.perf_counter() - started)
+            if response.status_code != 429:
+                self.limiter.update_from_headers(response.headers)
+                return response
+            self.metrics.record_throttle()
+            self.limiter.back_off(_retry_after_seconds(response))
+        raise RuntimeError(f"Shopify still throttling {method} {url} after {self.max_throttle_retries} retries")
+
+    def get(self, path: str, params: Optional[dict[str, Any]] = None, **kwargs: Any) -> requests.Response:
+        return self.request("GET", path, params=params, **kwargs)
+
+    def post(self, path: str, json: Any = None, **kwargs: Any) -> requests.Response:
+        return self.request("POST", path, json=json, **kwargs)
+
+    def get_json(self, path: str, params: Optional[dict[str, Any]] = None) -> Any:
+        response = self.get(path, params=params)
+        response.raise_for_status()
+        return json_codec.loads(response.content)
+
+    def iter_pages(
+        self,
+        path: str,
+        params: Optional[dict[str, Any]] = None,
+        sticky_params: Optional[dict[str, Any]] = None,
+    ) -> Iterator[tuple[Any, Optional[str]]]:
+        """Yield `(payload, next_url)` for each page of a cursor-paginated REST endpoint.
+
+        `sticky_params` (e.g. `fields`) are sent with every page, since
+        Shopify's `page_info` links do not carry them. They are only added
+        where missing, so `path` can be a saved next link that already has them.
+        """
+        url: Optional[str] = self.url(path, params)
+        url = self.url(url, _missing_params(url, sticky_params or {}))
+        while url:
+            response = self.get(url)
+            response.raise_for_status()
+            url = next_page_url(response.headers.get("Link", ""))
+            if url and sticky_params:
+                url = self.url(url, _missing_params(url, sticky_params))
+            yield json_codec.loads(response.content), url
+
+    def graphql(self, query: str, variables: Optional[dict[str, Any]] = None) -> dict[str, Any]:
+        for _ in range(self.max_throttle_retries + 1):
+            response = self.post("graphql.json", json={"query": query, "variables": variables or {}})
+            response.raise_for_status()
+            payload = json_codec.loads(response.content)
+            errors = payload.get("errors") or []
+            if any((error.get("extensions") or {}).get("code") == "THROTTLED" for error in errors):
+                self.metrics.record_throttle()
+                time.sleep(1.0)
+                continue
+            if errors:
+                raise RuntimeError(f"Shopify GraphQL error: {errors}")
+            return payload["data"]
+        raise RuntimeError(f"Shopify GraphQL still throttled after {self.max_throttle_retries} retries")
+
+    def stream_url(self, url: str) -> requests.Response:
+        """GET an external URL (e.g. a bulk result) on the pool without the Shopify token."""
+        started = time.perf_counter()
+        response = self.session.get(
+            url, stream=True, timeout=self.timeout * 2, headers={"X-Shopify-Access-Token": None}
+        )
+        self.metrics.record("GET", url, response.status_code, time.perf_counter() - started)
+        return response
+
+    def close(self) -> None:
+        self.session.close()
+
+    def __enter__(self) -> "ShopifyClient":
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
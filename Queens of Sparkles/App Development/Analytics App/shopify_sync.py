@@ -1,88 +1,775 @@
 from __future__ import annotations
 
 import argparse
-import json
-import os
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+from urllib.parse import urlencode
 
 import requests
 from dotenv import load_dotenv
 
+import json_codec
+from export_io import COMPRESSIONS, ExportWriter, iter_records, load_records, resolve_export
+from shopify_client import ShopifyClient
+
 load_dotenv()
 
-SHOP = os.getenv("SHOP_DOMAIN")
-ACCESS_TOKEN = os.getenv("SHOPIFY_ACCESS_TOKEN")
-API_VERSION = os.getenv("API_VERSION", "2024-10")
+STATE_FILE_NAME = "sync_state.json"
+
+# resource -> (REST endpoint, local export file stem)
+RESOURCES: Dict[str, tuple[str, str]] = {
+    "orders": ("orders.json?status=any", "orders_full"),
+    "products": ("products.json", "products_full"),
+    "customers": ("customers.json", "customers_full"),
+}
+EXPORT_FORMATS = ("json", "ndjson")
+SYNC_ENGINES = ("rest", "bulk")
+# The next sync asks for records updated since this long before the current one
+# started, in case our clock is ahead of Shopify's. The overlap is upserted by id.
+WATERMARK_MARGIN = timedelta(minutes=5)
+
+# Fields build_marts, the quality checks and inventory_check.py read. Top-level
+# keys go to Shopify's `fields=` parameter; nested objects are trimmed locally.
+ANALYTICS_FIELDS: Dict[str, Dict[str, Optional[tuple[str, ...]]]] = {
+    "orders": {
+        "id": None,
+        "created_at": None,
+        "updated_at": None,
+        "financial_status": None,
+        "fulfillment_status": None,
+        "customer": ("id", "email"),
+        "line_items": ("id", "product_id", "variant_id", "sku", "name", "variant_title", "quantity", "price"),
+    },
+    "products": {
+        "id": None,
+        "title": None,
+        "product_type": None,
+        "vendor": None,
+        "updated_at": None,
+        "variants": ("id", "product_id", "title", "sku", "price", "inventory_quantity", "inventory_item_id"),
+    },
+    "customers": {
+        "id": None,
+        "email": None,
+        "first_name": None,
+        "last_name": None,
+        "orders_count": None,
+        "total_spent": None,
+        "state": None,
+        "created_at": None,
+        "updated_at": None,
+    },
+}
+FIELD_PROFILES: Dict[str, Optional[Dict[str, Dict[str, Optional[tuple[str, ...]]]]]] = {
+    "full": None,
+    "analytics": ANALYTICS_FIELDS,
+}
+
+
+@dataclass
+class SyncOptions:
+    full_refresh: bool = False
+    export_format: str = "json"
+    compression: str = "none"
+    field_profile: str = "full"
+    resume: bool = True
+    order_windows: int = 0
+    backfill_workers: int = 4
+
+    @property
+    def export_suffix(self) -> str:
+        return f".{self.export_format}{COMPRESSIONS[self.compression]}"
+
 
-def _config() -> tuple[str, dict[str, str]]:
-    if not SHOP or not ACCESS_TOKEN:
-        raise ValueError("Missing SHOP_DOMAIN or SHOPIFY_ACCESS_TOKEN in .env file")
+def _pick(value: Any, keys: tuple[str, ...]) -> Any:
+    if isinstance(value, list):
+        return [_pick(item, keys) for item in value]
+    if isinstance(value, dict):
+        return {key: value.get(key) for key in keys}
+    return value
 
-    base_url = f"https://{SHOP}/admin/api/{API_VERSION}"
-    headers = {
-        "X-Shopify-Access-Token": ACCESS_TOKEN,
-        "Content-Type": "application/json",
+
+def project_record(resource: str, record: Dict[str, Any], field_profile: str) -> Dict[str, Any]:
+    """Trim a record to the fields of `field_profile` (the "full" profile keeps everything)."""
+    profile = FIELD_PROFILES[field_profile]
+    if profile is None:
+        return record
+    return {
+        key: record.get(key) if nested is None else _pick(record.get(key), nested)
+        for key, nested in profile[resource].items()
     }
-    return base_url, headers
 
 
-def _paginate_endpoint(base_url: str, endpoint: str) -> str:
+def _fields_param(resource: str, field_profile: str) -> Dict[str, str]:
+    profile = FIELD_PROFILES[field_profile]
+    return {"fields": ",".join(profile[resource])} if profile else {}
+
+
+def _paginate_endpoint(endpoint: str, params: Optional[Dict[str, str]] = None) -> str:
     join = "&" if "?" in endpoint else "?"
-    return f"{base_url}/{endpoint}{join}limit=250"
+    query = urlencode({"limit": 250, **(params or {})})
+    return f"{endpoint}{join}{query}"
 
 
-def fetch_all(endpoint: str, pause_seconds: float = 0.35) -> List[Dict[str, Any]]:
+def iter_pages(
+    endpoint: str,
+    params: Optional[Dict[str, str]] = None,
+    client: Optional[ShopifyClient] = None,
+) -> Iterator[List[Dict[str, Any]]]:
+    """Yield one page of records at a time from a Shopify REST endpoint."""
+    client = client or ShopifyClient.from_env()
+    for payload, _ in client.iter_pages(_paginate_endpoint(endpoint, params)):
+        root_key = next(iter(payload.keys()))
+        yield payload[root_key]
+
+
+def fetch_all(
+    endpoint: str,
+    params: Optional[Dict[str, str]] = None,
+    client: Optional[ShopifyClient] = None,
+) -> List[Dict[str, Any]]:
     """Fetch all records from a Shopify REST endpoint using pagination links."""
-    base_url, headers = _config()
-    url = _paginate_endpoint(base_url, endpoint)
     results: List[Dict[str, Any]] = []
+    for page in iter_pages(endpoint, params=params, client=client):
+        results.extend(page)
+    return results
 
-    while url:
-        response = requests.get(url, headers=headers, timeout=30)
-        response.raise_for_status()
 
-        payload = response.json()
-        root_key = next(iter(payload.keys()))
-        results.extend(payload[root_key])
+def _parse_timestamp(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
 
-        link_header = response.headers.get("Link", "")
-        next_link = None
-        for part in link_header.split(","):
-            if 'rel="next"' in part:
-                next_link = part.split("<")[1].split(">", 1)[0]
-                break
 
-        url = next_link
-        if url:
-            time.sleep(pause_seconds)
+def _watermark(started_at: datetime) -> str:
+    """The `updated_at_min` for the next sync after a fetch that started at `started_at`.
 
-    return results
+    Not the newest `updated_at` fetched: a record edited mid-sync on a page
+    already fetched can be older than that, and the next sync would skip it.
+    """
+    return (started_at - WATERMARK_MARGIN).isoformat(timespec="seconds")
 
 
-def sync_shopify_data(output_dir: Path) -> Dict[str, int]:
-    output_dir.mkdir(parents=True, exist_ok=True)
+def _load_state(output_dir: Path) -> Dict[str, Dict[str, str]]:
+    path = output_dir / STATE_FILE_NAME
+    if not path.exists():
+        return {}
+    return json_codec.loads(path.read_bytes())
+
+
+def _save_state(output_dir: Path, state: Dict[str, Dict[str, str]]) -> None:
+    (output_dir / STATE_FILE_NAME).write_bytes(json_codec.dumps(state, indent=True))
+
+
+def _merge_by_id(
+    existing: Iterable[Dict[str, Any]], changed: List[Dict[str, Any]]
+) -> Iterator[Dict[str, Any]]:
+    """Stream existing records with changed ones replaced by id, then the new ones."""
+    pending = {record.get("id"): record for record in changed}
+    for record in existing:
+        yield pending.pop(record.get("id"), record)
+    yield from pending.values()
+
+
+def _checkpoint_path(output_dir: Path, stem: str) -> Path:
+    return output_dir / f"{stem}.checkpoint.json"
+
+
+def _load_checkpoint(path: Path, key: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Return a saved checkpoint if it belongs to the same kind of fetch and its spool survives."""
+    if not path.exists():
+        return None
+    checkpoint = json_codec.loads(path.read_bytes())
+    if checkpoint.get("key") != key or not Path(checkpoint["spool"]["temp_path"]).exists():
+        return None
+    return checkpoint
+
+
+def _discard_checkpoint(path: Path) -> None:
+    if path.exists():
+        Path(json_codec.loads(path.read_bytes())["spool"]["temp_path"]).unlink(missing_ok=True)
+        path.unlink()
+
+
+def _save_checkpoint(path: Path, checkpoint: Dict[str, Any]) -> None:
+    temp_path = path.with_name(f"{path.name}.tmp")
+    temp_path.write_bytes(json_codec.dumps(checkpoint, indent=True))
+    temp_path.replace(path)
+
+
+def _fetch_resumable(
+    client: ShopifyClient,
+    resource: str,
+    first_url: str,
+    spool_path: Path,
+    checkpoint_path: Path,
+    checkpoint_key: Dict[str, Any],
+    resume: bool,
+    field_profile: str = "full",
+) -> tuple[int, Optional[str]]:
+    """Page through `first_url` into `spool_path`, checkpointing the cursor after every page.
+
+    The checkpoint holds the next `page_info` URL and the durable length of the
+    spool's temp file, so a crashed run continues from the last good page.
+    Returns the number of records spooled and the watermark for the next sync,
+    taken from when the first page was requested (before any resume).
+    """
+    checkpoint = _load_checkpoint(checkpoint_path, checkpoint_key) if resume else None
+    if checkpoint:
+        print(f"  Resuming {resource} after {checkpoint['spool']['records']} records")
+        writer = ExportWriter.resume(spool_path, checkpoint["spool"])
+        # Checkpoints from before the watermark change hold the newest updated_at fetched so far.
+        url, watermark = checkpoint["next_url"], checkpoint.get("watermark") or checkpoint.get("updated_at")
+    else:
+        _discard_checkpoint(checkpoint_path)
+        writer = ExportWriter(spool_path, keep_partial=True)
+        url, watermark = first_url, _watermark(datetime.now(timezone.utc))
+
+    pages = 0
+    fields = _fields_param(resource, field_profile)
+    try:
+        with writer:
+            for payload, next_url in client.iter_pages(url, sticky_params=fields):
+                page = payload[next(iter(payload.keys()))]
+                if fields:
+                    page = [project_record(resource, record, field_profile) for record in page]
+                writer.write_page(page)
+                pages += 1
+                if next_url:
+                    _save_checkpoint(
+                        checkpoint_path,
+                        {
+                            "key": checkpoint_key,
+                            "next_url": next_url,
+                            "watermark": watermark,
+                            "spool": writer.checkpoint(),
+                        },
+                    )
+    except requests.HTTPError as error:
+        status = error.response.status_code if error.response is not None else None
+        if not (checkpoint and pages == 0 and status is not None and 400 <= status < 500):
+            raise
+        # The saved page_info cursor was rejected (e.g. expired); start over.
+        print(f"  Checkpoint for {resource} rejected ({status}); restarting from page 1")
+        return _fetch_resumable(
+            client, resource, first_url, spool_path, checkpoint_path, checkpoint_key, False, field_profile
+        )
+    checkpoint_path.unlink(missing_ok=True)
+    return writer.records_written, watermark
+
+
+def _unique_by_id(records: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+    seen: set[Any] = set()
+    for record in records:
+        record_id = record.get("id")
+        if record_id in seen:
+            continue
+        seen.add(record_id)
+        yield record
+
+
+def _oldest_created_at(client: ShopifyClient, endpoint: str) -> Optional[datetime]:
+    url = _paginate_endpoint(endpoint, {"limit": 1, "order": "created_at asc", "fields": "id,created_at"})
+    records = client.get_json(url).get("orders") or []
+    return _parse_timestamp(records[0].get("created_at")) if records else None
+
+
+def _plan_windows(start: datetime, end: datetime, count: int) -> List[List[Optional[str]]]:
+    """Split [start, end] into `count` equal created_at windows.
+
+    The first window has no lower bound and the last no upper bound, so orders
+    outside the probed range are still covered. Shopify's bounds are inclusive,
+    so neighbouring windows share their boundary second; the merge dedupes it.
+    """
+    step = max((end - start) / count, timedelta(seconds=1))
+    edges: List[Optional[str]] = [
+        (start + step * index).isoformat(timespec="seconds") for index in range(1, count)
+    ]
+    bounds = [None, *edges, None]
+    return [[bounds[index], bounds[index + 1]] for index in range(count)]
+
+
+def _backfill_orders(
+    output_dir: Path,
+    export_path: Path,
+    client: ShopifyClient,
+    options: SyncOptions,
+) -> tuple[int, Optional[str]]:
+    """Full orders download split into created_at windows fetched concurrently.
+
+    Each window pages its own cursor chain into a spool with its own
+    checkpoint, so throughput scales with the workers the shared call-limit
+    bucket allows instead of with one chain's round trips. The window plan is
+    saved in `<stem>.backfill.json` so an interrupted backfill skips finished
+    windows and resumes the others. Spools are merged in window order and
+    deduped by order id.
+    """
+    endpoint, stem = RESOURCES["orders"]
+    plan_path = output_dir / f"{stem}.backfill.json"
+    plan_key = {"windows": options.order_windows, "suffix": options.export_suffix, "fields": options.field_profile}
+    plan = json_codec.loads(plan_path.read_bytes()) if plan_path.exists() else None
+    if not (options.resume and plan and plan.get("key") == plan_key):
+        oldest = _oldest_created_at(client, endpoint)
+        if oldest is None:
+            plan = {"key": plan_key, "windows": [[None, None]], "done": {}}
+        else:
+            now = datetime.now(timezone.utc).replace(microsecond=0)
+            plan = {"key": plan_key, "windows": _plan_windows(oldest, now, options.order_windows), "done": {}}
+        _save_checkpoint(plan_path, plan)
+    plan_lock = threading.Lock()
+
+    def fetch_window(index: int) -> None:
+        created_min, created_max = plan["windows"][index]
+        spool_path = output_dir / f"{stem}.window-{index:03d}.ndjson"
+        with plan_lock:
+            if str(index) in plan["done"] and spool_path.exists():
+                return
+        params = {}
+        if created_min:
+            params["created_at_min"] = created_min
+        if created_max:
+            params["created_at_max"] = created_max
+        _, watermark = _fetch_resumable(
+            client,
+            "orders",
+            _paginate_endpoint(endpoint, params),
+            spool_path,
+            output_dir / f"{stem}.window-{index:03d}.checkpoint.json",
+            {"mode": "window", **params, "fields": options.field_profile},
+            options.resume,
+            options.field_profile,
+        )
+        with plan_lock:
+            plan["done"][str(index)] = watermark
+            _save_checkpoint(plan_path, plan)
+
+    windows = range(len(plan["windows"]))
+    print(f"  {len(windows)} created_at windows, {options.backfill_workers} at a time")
+    with ThreadPoolExecutor(max_workers=options.backfill_workers) as pool:
+        for future in [pool.submit(fetch_window, index) for index in windows]:
+            future.result()
+
+    spools = [output_dir / f"{stem}.window-{index:03d}.ndjson" for index in windows]
+    with ExportWriter(export_path) as writer:
+        writer.write_page(_unique_by_id(record for spool in spools for record in iter_records(spool)))
+    for spool in spools:
+        spool.unlink()
+    plan_path.unlink()
+
+    # The earliest window's watermark, so edits made while any window was fetched are picked up.
+    watermarks = [value for value in plan["done"].values() if _parse_timestamp(value)]
+    return writer.records_written, min(watermarks, key=_parse_timestamp, default=None)
+
+
+def _sync_resource(
+    resource: str,
+    output_dir: Path,
+    state: Dict[str, Dict[str, str]],
+    state_lock: threading.Lock,
+    client: ShopifyClient,
+    options: SyncOptions,
+) -> int:
+    endpoint, stem = RESOURCES[resource]
+    existing_path = resolve_export(output_dir, stem)
+    export_path = output_dir / f"{stem}{options.export_suffix}"
+    checkpoint_path = _checkpoint_path(output_dir, stem)
+    with state_lock:
+        watermark = state.get(resource, {}).get("updated_at")
+    incremental = not options.full_refresh and watermark is not None and existing_path.exists()
+
+    if incremental:
+        print(f"Downloading {resource} updated since {watermark}...")
+        delta_path = output_dir / f"{stem}.delta.ndjson"
+        changed_count, next_watermark = _fetch_resumable(
+            client,
+            resource,
+            _paginate_endpoint(endpoint, {"updated_at_min": watermark}),
+            delta_path,
+            checkpoint_path,
+            {"mode": "incremental", "updated_at_min": watermark, "fields": options.field_profile},
+            options.resume,
+            options.field_profile,
+        )
+        changed = load_records(delta_path)
+        with ExportWriter(export_path) as writer:
+            writer.write_page(_merge_by_id(iter_records(existing_path), changed))
+        delta_path.unlink()
+        print(f"  {changed_count} changed {resource} merged into {export_path.name}")
+        records_written = writer.records_written
+    elif resource == "orders" and options.order_windows > 1:
+        print(f"Downloading ALL {resource} in parallel created_at windows...")
+        records_written, next_watermark = _backfill_orders(output_dir, export_path, client, options)
+    else:
+        print(f"Downloading ALL {resource}...")
+        records_written, next_watermark = _fetch_resumable(
+            client,
+            resource,
+            _paginate_endpoint(endpoint),
+            export_path,
+            checkpoint_path,
+            {"mode": "full", "suffix": options.export_suffix, "fields": options.field_profile},
+            options.resume,
+            options.field_profile,
+        )
+
+    with state_lock:
+        state[resource] = {
+            "updated_at": next_watermark or watermark,
+            "synced_at": datetime.now(timezone.utc).isoformat(),
+        }
+        _save_state(output_dir, state)
+    return records_written
+
+
+BULK_QUERIES: Dict[str, str] = {
+    "orders": """
+{
+  orders {
+    edges {
+      node {
+        id
+        createdAt
+        updatedAt
+        displayFinancialStatus
+        displayFulfillmentStatus
+        customer { id email }
+        lineItems {
+          edges {
+            node {
+              id
+              sku
+              name
+              variantTitle
+              quantity
+              originalUnitPriceSet { shopMoney { amount } }
+              product { id }
+              variant { id }
+            }
+          }
+        }
+      }
+    }
+  }
+}
+""",
+    "products": """
+{
+  products {
+    edges {
+      node {
+        id
+        title
+        productType
+        vendor
+        updatedAt
+        variants {
+          edges {
+            node {
+              id
+              title
+              sku
+              price
+              inventoryQuantity
+              inventoryItem { id }
+            }
+          }
+        }
+      }
+    }
+  }
+}
+""",
+    "customers": """
+{
+  customers {
+    edges {
+      node {
+        id
+        email
+        firstName
+        lastName
+        numberOfOrders
+        amountSpent { amount }
+        state
+        createdAt
+        updatedAt
+      }
+    }
+  }
+}
+""",
+}
+
+BULK_RUN_MUTATION = """
+mutation bulkOperationRunQuery($query: String!) {
+  bulkOperationRunQuery(query: $query) {
+    bulkOperation { id status }
+    userErrors { field message }
+  }
+}
+"""
+
+BULK_STATUS_QUERY = """
+{
+  currentBulkOperation { id status errorCode objectCount url }
+}
+"""
+
+# GraphQL display statuses that REST reports differently.
+_FULFILLMENT_STATUS = {"FULFILLED": "fulfilled", "PARTIALLY_FULFILLED": "partial", "UNFULFILLED": None}
+
+
+def _gid_to_id(gid: Optional[str]) -> Optional[int]:
+    """Turn `gid://shopify/Order/123` into the REST id `123`."""
+    if not gid:
+        return None
+    return int(gid.rsplit("/", 1)[-1])
+
+
+def _nested_id(node: Dict[str, Any], key: str) -> Optional[int]:
+    return _gid_to_id((node.get(key) or {}).get("id"))
+
+
+def _lower(value: Optional[str]) -> Optional[str]:
+    return value.lower() if value else None
+
+
+def _bulk_order_to_rest(node: Dict[str, Any], children: List[Dict[str, Any]]) -> Dict[str, Any]:
+    customer = node.get("customer")
+    fulfillment = node.get("displayFulfillmentStatus")
+    return {
+        "id": _gid_to_id(node["id"]),
+        "created_at": node.get("createdAt"),
+        "updated_at": node.get("updatedAt"),
+        "financial_status": _lower(node.get("displayFinancialStatus")),
+        "fulfillment_status": _FULFILLMENT_STATUS.get(fulfillment, _lower(fulfillment)),
+        "customer": {"id": _gid_to_id(customer.get("id")), "email": customer.get("email")} if customer else None,
+        "line_items": [
+            {
+                "id": _gid_to_id(line["id"]),
+                "product_id": _nested_id(line, "product"),
+                "variant_id": _nested_id(line, "variant"),
+                "sku": line.get("sku"),
+                "name": line.get("name"),
+                "variant_title": line.get("variantTitle"),
+                "quantity": line.get("quantity"),
+                "price": ((line.get("originalUnitPriceSet") or {}).get("shopMoney") or {}).get("amount"),
+            }
+            for line in children
+        ],
+    }
+
+
+def _bulk_product_to_rest(node: Dict[str, Any], children: List[Dict[str, Any]]) -> Dict[str, Any]:
+    product_id = _gid_to_id(node["id"])
+    return {
+        "id": product_id,
+        "title": node.get("title"),
+        "product_type": node.get("productType"),
+        "vendor": node.get("vendor"),
+        "updated_at": node.get("updatedAt"),
+        "variants": [
+            {
+                "id": _gid_to_id(variant["id"]),
+                "product_id": product_id,
+                "title": variant.get("title"),
+                "sku": variant.get("sku"),
+                "price": variant.get("price"),
+                "inventory_quantity": variant.get("inventoryQuantity"),
+                "inventory_item_id": _nested_id(variant, "inventoryItem"),
+            }
+            for variant in children
+        ],
+    }
+
+
+def _bulk_customer_to_rest(node: Dict[str, Any], children: List[Dict[str, Any]]) -> Dict[str, Any]:
+    return {
+        "id": _gid_to_id(node["id"]),
+        "email": node.get("email"),
+        "first_name": node.get("firstName"),
+        "last_name": node.get("lastName"),
+        "orders_count": int(node.get("numberOfOrders") or 0),
+        "total_spent": (node.get("amountSpent") or {}).get("amount"),
+        "state": _lower(node.get("state")),
+        "created_at": node.get("createdAt"),
+        "updated_at": node.get("updatedAt"),
+    }
+
+
+BULK_CONVERTERS = {
+    "orders": _bulk_order_to_rest,
+    "products": _bulk_product_to_rest,
+    "customers": _bulk_customer_to_rest,
+}
+
+
+def _assemble_bulk_records(resource: str, nodes: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+    """Fold bulk JSONL rows (children carry `__parentId`) back into REST-shaped records.
+
+    Shopify writes each child row right after its parent, so only the current
+    parent is held in memory.
+    """
+    convert = BULK_CONVERTERS[resource]
+    parent: Optional[Dict[str, Any]] = None
+    children: List[Dict[str, Any]] = []
+    for node in nodes:
+        parent_id = node.get("__parentId")
+        if parent_id is None:
+            if parent is not None:
+                yield convert(parent, children)
+            parent, children = node, []
+        elif parent is not None and parent_id == parent["id"]:
+            children.append(node)
+        else:
+            raise ValueError(f"Bulk row {node.get('id')} does not follow its parent {parent_id}")
+    if parent is not None:
+        yield convert(parent, children)
+
 
-    print("Downloading ALL orders...")
-    orders = fetch_all("orders.json?status=any")
+def iter_bulk_records(
+    resource: str,
+    client: Optional[ShopifyClient] = None,
+    poll_seconds: float = 2.0,
+) -> Iterator[Dict[str, Any]]:
+    """Run a GraphQL bulk operation for `resource` and stream its REST-shaped records."""
+    client = client or ShopifyClient.from_env()
+    data = client.graphql(BULK_RUN_MUTATION, {"query": BULK_QUERIES[resource]})
+    result = data["bulkOperationRunQuery"]
+    if result["userErrors"]:
+        raise RuntimeError(f"Bulk operation rejected: {result['userErrors']}")
+    operation_id = result["bulkOperation"]["id"]
 
-    print("Downloading ALL products...")
-    products = fetch_all("products.json")
+    while True:
+        operation = client.graphql(BULK_STATUS_QUERY)["currentBulkOperation"]
+        if operation is None or operation["id"] != operation_id:
+            raise RuntimeError(f"Bulk operation {operation_id} is no longer the current operation")
+        if operation["status"] == "COMPLETED":
+            break
+        if operation["status"] in {"FAILED", "CANCELED", "EXPIRED"}:
+            raise RuntimeError(f"Bulk operation {operation_id} {operation['status']}: {operation['errorCode']}")
+        time.sleep(poll_seconds)
+
+    if not operation["url"]:
+        return
+    with client.stream_url(operation["url"]) as response:
+        response.raise_for_status()
+        nodes = (json_codec.loads(line) for line in response.iter_lines() if line)
+        yield from _assemble_bulk_records(resource, nodes)
 
-    print("Downloading ALL customers...")
-    customers = fetch_all("customers.json")
 
-    (output_dir / "orders_full.json").write_text(json.dumps(orders, indent=2))
-    (output_dir / "products_full.json").write_text(json.dumps(products, indent=2))
-    (output_dir / "customers_full.json").write_text(json.dumps(customers, indent=2))
+def _bulk_sync_resource(
+    resource: str,
+    output_dir: Path,
+    state: Dict[str, Dict[str, str]],
+    client: ShopifyClient,
+    options: SyncOptions,
+    poll_seconds: float,
+) -> int:
+    _, stem = RESOURCES[resource]
+    print(f"Exporting ALL {resource} with a bulk operation...")
+    # Taken before the operation runs: edits made meanwhile may be missing from its result.
+    next_watermark = _watermark(datetime.now(timezone.utc))
+    with ExportWriter(output_dir / f"{stem}{options.export_suffix}") as writer:
+        for record in iter_bulk_records(resource, client=client, poll_seconds=poll_seconds):
+            writer.write_page([record])
 
-    stats = {
-        "orders": len(orders),
-        "products": len(products),
-        "customers": len(customers),
+    state[resource] = {
+        "updated_at": next_watermark,
+        "synced_at": datetime.now(timezone.utc).isoformat(),
     }
+    _save_state(output_dir, state)
+    return writer.records_written
+
+
+def sync_shopify_data(
+    output_dir: Path,
+    full_refresh: bool = False,
+    client: Optional[ShopifyClient] = None,
+    export_format: str = "json",
+    engine: str = "rest",
+    bulk_poll_seconds: float = 2.0,
+    resume: bool = True,
+    compression: str = "none",
+    field_profile: str = "full",
+    order_windows: int = 0,
+    backfill_workers: int = 4,
+) -> Dict[str, int]:
+    """Sync orders/products/customers into `output_dir`.
+
+    By default only records updated since the last successful sync are fetched
+    (per-resource `updated_at` watermark in `sync_state.json`) and merged into
+    the existing exports by id. `full_refresh=True` re-downloads everything.
+    The resources are fetched concurrently through one shared call-limit bucket,
+    and each page is streamed to disk as it arrives (`export_format` is
+    "json" for a JSON array or "ndjson" for one record per line).
+    After every page the pagination cursor is checkpointed next to the export;
+    an interrupted REST sync resumes from there unless `resume=False`.
+    `compression` ("gzip"/"zstd") compresses the stored exports, and
+    `field_profile="analytics"` only requests the fields the marts use.
+    A full orders download with `order_windows > 1` is split into that many
+    created_at windows, fetched `backfill_workers` at a time.
+
+    `engine="bulk"` instead exports every resource through a GraphQL bulk
+    operation (one at a time, as Shopify allows) and writes the same
+    REST-shaped records; it always does a full export.
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format: {export_format}")
+    if engine not in SYNC_ENGINES:
+        raise ValueError(f"Unsupported sync engine: {engine}")
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"Unsupported compression: {compression}")
+    if field_profile not in FIELD_PROFILES:
+        raise ValueError(f"Unsupported field profile: {field_profile}")
+    if order_windows > 1 and backfill_workers < 1:
+        raise ValueError("backfill_workers must be at least 1")
+    options = SyncOptions(
+        full_refresh, export_format, compression, field_profile, resume, order_windows, backfill_workers
+    )
+    output_dir.mkdir(parents=True, exist_ok=True)
+    state = _load_state(output_dir)
+    client = client or ShopifyClient.from_env()
+
+    if engine == "bulk":
+        stats = {
+            resource: _bulk_sync_resource(
+                resource, output_dir, state, client, options, bulk_poll_seconds
+            )
+            for resource in RESOURCES
+        }
+    else:
+        state_lock = threading.Lock()
+        with ThreadPoolExecutor(max_workers=len(RESOURCES)) as pool:
+            futures = {
+                resource: pool.submit(
+                    _sync_resource,
+                    resource,
+                    output_dir,
+                    state,
+                    state_lock,
+                    client,
+                    options,
+                )
+                for resource in RESOURCES
+            }
+            stats = {resource: future.result() for resource, future in futures.items()}
+
     print(f"DONE — Saved data to {output_dir.resolve()} :: {stats}")
+    metrics = client.metrics.summary()
+    if metrics["calls"]:
+        print(
+            f"API calls: {metrics['calls']} (p50 {metrics['p50_ms']} ms, p95 {metrics['p95_ms']} ms, "
+            f"throttled {metrics['throttled']})"
+        )
     return stats
 
 
@@ -93,9 +780,65 @@ def main() -> None:
         default="data",
         help="Directory for synced JSON files (default: data)",
     )
+    parser.add_argument(
+        "--full-refresh",
+        action="store_true",
+        help="Ignore saved updated_at watermarks and re-download every record",
+    )
+    parser.add_argument(
+        "--format",
+        choices=EXPORT_FORMATS,
+        default="json",
+        help="Export format: json array or ndjson (one record per line). Default: json",
+    )
+    parser.add_argument(
+        "--compress",
+        choices=tuple(COMPRESSIONS),
+        default="none",
+        help="Compress stored exports (zstd needs the zstandard package). Default: none",
+    )
+    parser.add_argument(
+        "--field-profile",
+        choices=tuple(FIELD_PROFILES),
+        default="full",
+        help="analytics: request only the fields the marts and quality checks read. Default: full",
+    )
+    parser.add_argument(
+        "--engine",
+        choices=SYNC_ENGINES,
+        default="rest",
+        help="rest: paginated REST (incremental by default); bulk: full export via GraphQL bulk operations",
+    )
+    parser.add_argument(
+        "--order-windows",
+        type=int,
+        default=0,
+        help="Split a full orders download into N created_at windows fetched concurrently. Default: off",
+    )
+    parser.add_argument(
+        "--backfill-workers",
+        type=int,
+        default=4,
+        help="Windows fetched at the same time with --order-windows. Default: 4",
+    )
+    parser.add_argument(
+        "--no-resume",
+        action="store_true",
+        help="Ignore checkpoints left by an interrupted sync and start each resource from page 1",
+    )
     args = parser.parse_args()
 
-    sync_shopify_data(Path(args.output_dir))
+    sync_shopify_data(
+        Path(args.output_dir),
+        full_refresh=args.full_refresh,
+        export_format=args.format,
+        engine=args.engine,
+        resume=not args.no_resume,
+        compression=args.compress,
+        field_profile=args.field_profile,
+        order_windows=args.order_windows,
+        backfill_workers=args.backfill_workers,
+    )
 
 
 if __name__ == "__main__":
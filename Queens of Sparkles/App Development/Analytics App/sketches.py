@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+import math
+
+import numpy as np
+import pandas as pd
+
+# Fixed-size summaries of id columns for the quality checks: a Bloom filter
+# to spot possible duplicates and a HyperLogLog to estimate distinct counts.
+# Both work on the 64-bit hashes from `hash_values`, a batch at a time.
+
+LN2 = math.log(2)
+
+
+def hash_values(values: np.ndarray) -> np.ndarray:
+    """64-bit hashes of an object array without nulls. Pass ids as strings so `1` and `"1"` hash alike."""
+    return pd.util.hash_array(values, categorize=False)
+
+
+class BloomFilter:
+    """Bit array with `hashes` probes per value; it can report false positives, never false negatives.
+
+    Sized for `capacity` values at `error_rate`, but never above `max_bytes`. A
+    capped filter only reports more false positives.
+    """
+
+    def __init__(self, capacity: int, error_rate: float, max_bytes: int | None = None) -> None:
+        if not 0 < error_rate < 1:
+            raise ValueError(f"error_rate must be between 0 and 1, got {error_rate}")
+        bits = math.ceil(-max(capacity, 1) * math.log(error_rate) / LN2**2)
+        if max_bytes is not None:
+            bits = min(bits, max_bytes * 8)
+        self.size = max(bits, 64)
+        self.hashes = max(1, round(self.size / max(capacity, 1) * LN2))
+        self.bits = np.zeros((self.size + 7) // 8, dtype=np.uint8)
+
+    @property
+    def nbytes(self) -> int:
+        return self.bits.nbytes
+
+    def _positions(self, hashes: np.ndarray) -> np.ndarray:
+        # Kirsch-Mitzenmacher: probe i is h1 + i * h2, from the two halves of one 64-bit hash.
+        low = hashes & np.uint64(0xFFFFFFFF)
+        high = (hashes >> np.uint64(32)) | np.uint64(1)
+        probes = np.arange(self.hashes, dtype=np.uint64)
+        return (low[:, None] + probes[None, :] * high[:, None]) % np.uint64(self.size)
+
+    def add(self, hashes: np.ndarray) -> np.ndarray:
+        """Add a batch; True where the value may have been added before (this batch included)."""
+        positions = self._positions(hashes)
+        byte, mask = positions >> np.uint64(3), np.left_shift(1, positions & np.uint64(7)).astype(np.uint8)
+        seen = ((self.bits[byte] & mask) != 0).all(axis=1)
+        _, first = np.unique(hashes, return_index=True)
+        repeated = np.ones(len(hashes), dtype=bool)
+        repeated[first] = False
+        np.bitwise_or.at(self.bits, byte.ravel(), mask.ravel())
+        return seen | repeated
+
+
+class HyperLogLog:
+    """Distinct-count estimate with a relative standard error of about `error_rate`."""
+
+    def __init__(self, error_rate: float) -> None:
+        if not 0 < error_rate < 1:
+            raise ValueError(f"error_rate must be between 0 and 1, got {error_rate}")
+        # The standard error is 1.04 / sqrt(registers); registers are a power of two.
+        self.precision = min(max(math.ceil(math.log2((1.04 / error_rate) ** 2)), 4), 18)
+        self.registers = np.zeros(1 << self.precision, dtype=np.uint8)
+
+    @property
+    def nbytes(self) -> int:
+        return self.registers.nbytes
+
+    def add(self, hashes: np.ndarray) -> None:
+        width = 64 - self.precision
+        index = (hashes >> np.uint64(width)).astype(np.intp)
+        rest = hashes & np.uint64((1 << width) - 1)
+        # Rank = leading zeros in the remaining bits + 1; frexp's exponent is the bit length.
+        rank = (width + 1 - np.frexp(rest.astype(np.float64))[1]).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+
+    def count(self) -> int:
+        registers = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / registers)
+        estimate = alpha * registers**2 / np.ldexp(1.0, -self.registers.astype(np.int64)).sum()
+        empty = int((self.registers == 0).sum())
+        if estimate <= 2.5 * registers and empty:
+            # Linear counting is more accurate while many registers are still empty.
+            estimate = registers * math.log(registers / empty)
+        return round(estimate)
@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+import argparse
+from contextlib import ExitStack
+from pathlib import Path
+from typing import Any
+
+from export_io import COMPRESSIONS, ExportWriter
+from mock_shopify_server import RESOURCE_KEYS, iter_dataset
+from shopify_sync import EXPORT_FORMATS
+
+
+def write_synthetic_exports(
+    data_dir: Path,
+    export_format: str = "json",
+    compression: str = "none",
+    **dataset: Any,
+) -> dict[str, int]:
+    """Write `<resource>_full.<format>` exports of a synthetic store into `data_dir`.
+
+    `dataset` takes `mock_shopify_server.iter_dataset`'s arguments (orders,
+    products, customers, seed, max_lines_per_order, days, skew). Records are
+    streamed to disk, so the size is not limited by memory. Returns the records
+    written per resource.
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format: {export_format}")
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"Unsupported compression: {compression}")
+    suffix = f".{export_format}{COMPRESSIONS[compression]}"
+    with ExitStack() as stack:
+        writers = {
+            resource: stack.enter_context(ExportWriter(data_dir / f"{resource}_full{suffix}"))
+            for resource in RESOURCE_KEYS
+        }
+        for resource, record in iter_dataset(**dataset):
+            writers[resource].write_page([record])
+    return {resource: writer.records_written for resource, writer in writers.items()}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Write orders/products/customers exports of a synthetic store for load testing."
+    )
+    parser.add_argument("--data-dir", default="synthetic_data", help="Where to write the exports")
+    parser.add_argument("--orders", type=int, default=100_000)
+    parser.add_argument("--products", type=int, default=500, help="Products; each has 3 size variants (SKUs)")
+    parser.add_argument("--customers", type=int, default=20_000)
+    parser.add_argument("--max-lines-per-order", type=int, default=4, help="Lines per order are 1 to this")
+    parser.add_argument("--days", type=int, default=700, help="Days of order history, from 2023-01-01")
+    parser.add_argument(
+        "--skew",
+        type=float,
+        default=1.0,
+        help="Zipf exponent for SKU and customer popularity; 0 picks uniformly. Default: 1.0",
+    )
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default="json", help="Default: json")
+    parser.add_argument("--compress", choices=tuple(COMPRESSIONS), default="none", help="Default: none")
+    args = parser.parse_args()
+
+    counts = write_synthetic_exports(
+        Path(args.data_dir),
+        export_format=args.format,
+        compression=args.compress,
+        orders=args.orders,
+        products=args.products,
+        customers=args.customers,
+        seed=args.seed,
+        max_lines_per_order=args.max_lines_per_order,
+        days=args.days,
+        skew=args.skew,
+    )
+    print(f"Wrote synthetic exports to {Path(args.data_dir).resolve()}: {counts}")
+
+
+if __name__ == "__main__":
+    main()